@@ -1,26 +1,72 @@
+import logging
+import tempfile
+import zipfile
+
 from django.contrib import admin, messages
 from django.urls import path, reverse
 from django.utils.html import format_html
+from django.utils.text import slugify
 from django.utils.safestring import mark_safe
-from django.http import HttpResponse, HttpResponseRedirect
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
 from django.conf import settings
-from django.db.models import Count, Avg
+from django.db.models import Avg, Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.template.response import TemplateResponse
 
-from .models import (Cliente, Curso, Certificado, CursoAgendamento, Inscricao, Instrutor,
-                     Questionario, Pergunta, OpcaoResposta, RespostaUsuario, ItemRespostaUsuario)
-from .services import montar_url_inscricao, gerar_qr_code_base64_png, gerar_certificado_pdf_bytes, enviar_certificado_email
+from .models import (Cliente, Curso, Certificado, CursoAgendamento, EnvioCertificado, Inscricao, Instrutor,
+                     ModeloCertificado, Questionario, Pergunta, OpcaoResposta, RespostaUsuario, ItemRespostaUsuario)
+from .envios import enviar_certificado
+from .autocomplete import ClienteAutocompleteSelect, ClienteAutocompleteView
+from .forms import ClienteAdminForm, ImportarParticipantesForm
+from .importacao import importar_participantes, ler_participantes
+from .renderizacao import gerar_pdfs, gerar_pdfs_em_arquivos
+from .services import montar_url_inscricao, gerar_qr_code_base64_png, gerar_certificado_pdf_bytes
+from .transportes import obter_transporte
+from core.db_router import leitura_replica
+
+logger = logging.getLogger(__name__)
+
+
+class AgendamentoListFilter(admin.RelatedFieldListFilter):
+    """Filtro por agendamento sem uma consulta ao curso por opção (__str__ usa self.curso)"""
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        agendamentos = field.remote_field.model._default_manager.select_related('curso')
+        if ordering:
+            agendamentos = agendamentos.order_by(*ordering)
+        return [(agendamento.pk, str(agendamento)) for agendamento in agendamentos]
 
 
 @admin.register(Cliente)
 class ClienteAdmin(admin.ModelAdmin):
+    form = ClienteAdminForm
     list_display = ('nome', 'cpf', 'email', 'telefone')
     search_fields = ('nome', 'cpf', 'email')
 
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                'autocomplete/',
+                self.admin_site.admin_view(ClienteAutocompleteView.as_view(admin_site=self.admin_site)),
+                name='certificados_cliente_autocomplete',
+            ),
+        ]
+        return custom_urls + urls
+
+
+@admin.register(ModeloCertificado)
+class ModeloCertificadoAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'imagem_fundo', 'atualizado_em')
+    search_fields = ('nome',)
+
 
 @admin.register(Curso)
 class CursoAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'carga_horaria_padrao')
+    list_display = ('nome', 'carga_horaria_padrao', 'modelo_certificado')
+    list_select_related = ('modelo_certificado',)
     search_fields = ('nome',)
 
 
@@ -46,15 +92,23 @@ class InscricaoInline(admin.TabularInline):
 
     btn_gerar_certificado.short_description = 'Certificado'
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # Busca por prefixo indexada em vez do icontains do autocomplete padrão
+        if db_field.name == 'cliente':
+            kwargs['widget'] = ClienteAutocompleteSelect(db_field, self.admin_site, using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
 
 @admin.register(CursoAgendamento)
 class CursoAgendamentoAdmin(admin.ModelAdmin):
     list_display = ('curso', 'instrutor', 'data', 'id', 'qrcode_link')
+    list_select_related = ('curso', 'instrutor')
     list_filter = ('curso', 'instrutor', 'data')
     search_fields = ('curso__nome', 'instrutor__nome', 'id')
-    readonly_fields = ('id', 'qrcode_preview', 'url_inscricao')
-    fields = ('id', 'curso', 'instrutor', 'data', 'url_inscricao', 'qrcode_preview')
+    readonly_fields = ('id', 'qrcode_preview', 'url_inscricao', 'importar_participantes_link')
+    fields = ('id', 'curso', 'instrutor', 'data', 'url_inscricao', 'qrcode_preview', 'importar_participantes_link')
     inlines = [InscricaoInline]
+    actions = ['baixar_certificados_zip']
 
     def get_urls(self):
         urls = super().get_urls()
@@ -69,6 +123,11 @@ class CursoAgendamentoAdmin(admin.ModelAdmin):
                 self.admin_site.admin_view(self.gerar_certificado_view),
                 name='certificados_cursoagendamento_gerar_certificado',
             ),
+            path(
+                '<uuid:agendamento_id>/importar-participantes/',
+                self.admin_site.admin_view(self.importar_participantes_view),
+                name='certificados_cursoagendamento_importar_participantes',
+            ),
         ]
         return custom_urls + urls
 
@@ -110,6 +169,36 @@ class CursoAgendamentoAdmin(admin.ModelAdmin):
 
     qrcode_link.short_description = 'Link'
 
+    def importar_participantes_link(self, obj):
+        if not obj or not obj.pk:
+            return '-'
+        url = reverse('admin:certificados_cursoagendamento_importar_participantes', args=[str(obj.id)])
+        return format_html('<a class="button" href="{}">Importar lista (CSV/XLSX)</a>', url)
+
+    importar_participantes_link.short_description = 'Importar participantes'
+
+    def baixar_certificados_zip(self, request, queryset):
+        certificados = (
+            Certificado.objects.filter(agendamento__in=queryset)
+            .select_related('cliente', 'curso__modelo_certificado', 'agendamento')
+            .order_by('agendamento__data', 'cliente__nome')
+        )
+        if not certificados.exists():
+            messages.warning(request, 'Nenhum certificado emitido para os agendamentos selecionados.')
+            return None
+
+        arquivo_zip = tempfile.TemporaryFile()
+        with tempfile.TemporaryDirectory() as diretorio, \
+                zipfile.ZipFile(arquivo_zip, 'w', zipfile.ZIP_STORED) as zip_saida:
+            # PDFs gerados em paralelo pelo pool; já são comprimidos (ZIP_STORED)
+            for certificado, caminho in gerar_pdfs_em_arquivos(certificados, diretorio):
+                nome = slugify(certificado.cliente.nome) or 'aluno'
+                zip_saida.write(caminho, f'{certificado.agendamento.data:%Y-%m-%d}/{nome}_{certificado.pk}.pdf')
+        arquivo_zip.seek(0)
+        return FileResponse(arquivo_zip, as_attachment=True, filename='certificados.zip', content_type='application/zip')
+
+    baixar_certificados_zip.short_description = 'Baixar certificados (ZIP)'
+
     def qrcode_download_view(self, request, agendamento_id):
         agendamento = CursoAgendamento.objects.get(pk=agendamento_id)
         url = montar_url_inscricao(agendamento.id)
@@ -134,8 +223,11 @@ class CursoAgendamentoAdmin(admin.ModelAdmin):
         pdf_bytes = gerar_certificado_pdf_bytes(certificado)
 
         try:
-            enviar_certificado_email(certificado, pdf_bytes)
-            messages.success(request, f'Certificado enviado para {cliente.email}.')
+            _, enviado = enviar_certificado(certificado, lambda: pdf_bytes, reenvio=True)
+            if enviado:
+                messages.success(request, f'Certificado enviado para {cliente.email}.')
+            else:
+                messages.warning(request, f'O envio para {cliente.email} já está em andamento.')
         except Exception as exc:
             messages.error(request, f'Falha ao enviar e-mail: {exc}')
 
@@ -143,35 +235,100 @@ class CursoAgendamentoAdmin(admin.ModelAdmin):
         response['Content-Disposition'] = f'inline; filename="certificado_{certificado.codigo}.pdf"'
         return response
 
+    def importar_participantes_view(self, request, agendamento_id):
+        agendamento = CursoAgendamento.objects.select_related('curso').get(pk=agendamento_id)
+        if not self.has_change_permission(request, agendamento):
+            raise PermissionDenied
+
+        resultado = None
+        if request.method == 'POST':
+            form = ImportarParticipantesForm(request.POST, request.FILES)
+            if form.is_valid():
+                arquivo = form.cleaned_data['arquivo']
+                try:
+                    resultado = importar_participantes(
+                        agendamento,
+                        ler_participantes(arquivo, arquivo.name, encoding=form.cleaned_data['encoding']),
+                        empresa_padrao=form.cleaned_data['empresa_padrao'],
+                    )
+                except ValidationError as exc:
+                    form.add_error('arquivo', exc)
+                except UnicodeDecodeError:
+                    form.add_error('encoding', 'Não foi possível ler o arquivo com esta codificação.')
+                else:
+                    messages.success(
+                        request,
+                        f'{resultado.inscricoes_criadas} inscrição(ões) criada(s), '
+                        f'{resultado.clientes_criados} aluno(s) novo(s).',
+                    )
+        else:
+            form = ImportarParticipantesForm()
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f'Importar participantes - {agendamento}',
+            'opts': self.model._meta,
+            'original': agendamento,
+            'form': form,
+            'resultado': resultado,
+        }
+        return TemplateResponse(request, 'admin/certificados/cursoagendamento/importar_participantes.html', context)
+
 
 @admin.register(Certificado)
 class CertificadoAdmin(admin.ModelAdmin):
     list_display = ('cliente', 'curso', 'agendamento', 'data_emissao', 'codigo')
+    list_select_related = ('cliente', 'curso', 'agendamento__curso')
     list_filter = ('curso', 'data_emissao')
     search_fields = ('cliente__nome', 'cliente__cpf', 'cliente__email', 'curso__nome', 'codigo')
     actions = ['reenviar_certificados']
 
     def reenviar_certificados(self, request, queryset):
         enviados = 0
+        ignorados = 0
         erros = 0
 
-        for certificado in queryset:
-            try:
-                pdf_bytes = gerar_certificado_pdf_bytes(certificado)
-                enviar_certificado_email(certificado, pdf_bytes)
-                enviados += 1
-            except Exception as exc:
-                print(f"ERRO AO REENVIAR CERTIFICADO {certificado.id}: {repr(exc)}")
-                erros += 1
+        # PDFs renderizados em paralelo no pool; o envio segue em ordem, com
+        # uma única conexão/sessão do transporte para o lote todo. Cada
+        # certificado é um reenvio novo, mas cliques simultâneos disputam a
+        # mesma chave em EnvioCertificado e só um deles envia.
+        certificados = queryset.select_related('cliente', 'curso__modelo_certificado', 'agendamento')
+        with obter_transporte() as transporte:
+            for certificado, obter_pdf in gerar_pdfs(certificados):
+                try:
+                    _, enviado = enviar_certificado(certificado, obter_pdf, transporte, reenvio=True)
+                    if enviado:
+                        enviados += 1
+                    else:
+                        ignorados += 1
+                except Exception:
+                    logger.exception("Erro ao reenviar certificado %s", certificado.id)
+                    erros += 1
 
         if enviados:
             messages.success(request, f"{enviados} certificado(s) reenviado(s) com sucesso.")
+        if ignorados:
+            messages.warning(request, f"{ignorados} certificado(s) já estavam sendo reenviados por outra requisição.")
         if erros:
             messages.error(request, f"{erros} certificado(s) não puderam ser reenviados. Verifique o log do servidor.")
 
     reenviar_certificados.short_description = "Reenviar certificados selecionados"
 
 
+@admin.register(EnvioCertificado)
+class EnvioCertificadoAdmin(admin.ModelAdmin):
+    list_display = ('certificado', 'status', 'transporte', 'tentativas', 'latencia_ms', 'criado_em', 'enviado_em')
+    list_select_related = ('certificado__cliente', 'certificado__curso')
+    list_filter = ('status', 'transporte', 'criado_em')
+    search_fields = ('certificado__cliente__nome', 'certificado__cliente__email', 'certificado__codigo',
+                     'chave_idempotencia', 'id_mensagem_provedor')
+    readonly_fields = ('certificado', 'chave_idempotencia', 'transporte', 'status', 'tentativas', 'latencia_ms',
+                       'id_mensagem_provedor', 'erro', 'criado_em', 'atualizado_em', 'enviado_em')
+
+    def has_add_permission(self, request):
+        return False
+
+
 # ========== Questionário e Avaliações ==========
 
 class OpcaoRespostaInline(admin.TabularInline):
@@ -186,6 +343,13 @@ class PerguntaInline(admin.TabularInline):
     fields = ('numero', 'texto', 'tipo', 'obrigatoria', 'ordem')
 
 
+def _contagem(modelo):
+    """COUNT das linhas de `modelo` do questionário da linha externa."""
+    contagem = (modelo.objects.filter(questionario=OuterRef('pk')).order_by()
+                .values('questionario').annotate(c=Count('pk')).values('c'))
+    return Coalesce(Subquery(contagem, output_field=IntegerField()), Value(0))
+
+
 @admin.register(Questionario)
 class QuestionarioAdmin(admin.ModelAdmin):
     list_display = ('titulo', 'curso', 'ativo', 'total_perguntas', 'total_respostas')
@@ -193,20 +357,36 @@ class QuestionarioAdmin(admin.ModelAdmin):
     search_fields = ('titulo', 'descricao', 'curso__nome')
     readonly_fields = ('criado_em', 'atualizado_em', 'total_respostas')
     fields = ('titulo', 'descricao', 'curso', 'ativo', 'criado_em', 'atualizado_em', 'total_respostas')
+    list_select_related = ('curso',)
     inlines = [PerguntaInline]
+
+    def get_queryset(self, request):
+        # Contagens em subconsultas correlacionadas: dois JOINs com COUNT(DISTINCT)
+        # multiplicariam perguntas x respostas antes de agrupar
+        return super().get_queryset(request).annotate(
+            num_perguntas=_contagem(Pergunta),
+            num_respostas=_contagem(RespostaUsuario),
+        )
     
     def total_perguntas(self, obj):
+        if hasattr(obj, 'num_perguntas'):
+            return obj.num_perguntas
         return obj.perguntas.count()
     total_perguntas.short_description = 'Total de Perguntas'
+    total_perguntas.admin_order_field = 'num_perguntas'
     
     def total_respostas(self, obj):
+        if hasattr(obj, 'num_respostas'):
+            return obj.num_respostas
         return obj.respostas_usuarios.count()
     total_respostas.short_description = 'Total de Respostas'
+    total_respostas.admin_order_field = 'num_respostas'
 
 
 @admin.register(Pergunta)
 class PerguntaAdmin(admin.ModelAdmin):
     list_display = ('numero', 'questionario', 'tipo', 'obrigatoria', 'ordem')
+    list_select_related = ('questionario',)
     list_filter = ('tipo', 'obrigatoria', 'questionario')
     search_fields = ('texto', 'questionario__titulo')
     readonly_fields = ('questionario',)
@@ -217,6 +397,7 @@ class PerguntaAdmin(admin.ModelAdmin):
 @admin.register(OpcaoResposta)
 class OpcaoRespostaAdmin(admin.ModelAdmin):
     list_display = ('pergunta', 'rotulo', 'valor', 'pontuacao', 'ordem')
+    list_select_related = ('pergunta',)
     list_filter = ('pergunta__questionario', 'pergunta')
     search_fields = ('rotulo', 'valor', 'pergunta__texto')
     readonly_fields = ('pergunta',)
@@ -230,19 +411,36 @@ class ItemRespostaUsuarioInline(admin.TabularInline):
     fields = ('pergunta', 'opcao_resposta', 'resposta_texto')
     can_delete = False
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('pergunta', 'opcao_resposta__pergunta')
+
 
 @admin.register(RespostaUsuario)
 class RespostaUsuarioAdmin(admin.ModelAdmin):
     list_display = ('cliente', 'questionario', 'agendamento', 'media_geral', 'respondido_em')
-    list_filter = ('questionario', 'agendamento', 'respondido_em')
+    list_select_related = ('cliente', 'questionario', 'agendamento__curso')
+    list_filter = ('questionario', ('agendamento', AgendamentoListFilter), 'respondido_em')
     search_fields = ('cliente__nome', 'cliente__email', 'cliente__cpf', 'questionario__titulo')
     readonly_fields = ('questionario', 'cliente', 'certificado', 'agendamento', 'respondido_em', 'media_display')
     fields = ('questionario', 'cliente', 'certificado', 'agendamento', 'respondido_em', 'media_display')
     inlines = [ItemRespostaUsuarioInline]
     can_delete = False
+
+    def get_queryset(self, request):
+        # Mesma regra de RespostaUsuario.media_geral, calculada na consulta da listagem
+        return super().get_queryset(request).annotate(
+            media_anotada=Avg('itens__opcao_resposta__pontuacao', filter=Q(itens__opcao_resposta__pontuacao__gt=0)),
+        )
+
+    def media_geral(self, obj):
+        if not hasattr(obj, 'media_anotada'):
+            return obj.media_geral
+        return round(obj.media_anotada, 2) if obj.media_anotada is not None else 0
+    media_geral.short_description = 'Média geral'
+    media_geral.admin_order_field = 'media_anotada'
     
     def media_display(self, obj):
-        media = obj.media_geral
+        media = self.media_geral(obj)
         if media == 0:
             return "Questionário com respostas abertas apenas"
         return format_html('<strong style="color: green; font-size: 1.2em;">{:.2f}</strong>', media)
@@ -252,6 +450,7 @@ class RespostaUsuarioAdmin(admin.ModelAdmin):
 @admin.register(ItemRespostaUsuario)
 class ItemRespostaUsuarioAdmin(admin.ModelAdmin):
     list_display = ('resposta_usuario', 'pergunta', 'opcao_resposta', 'resposta_texto_preview')
+    list_select_related = ('resposta_usuario__cliente', 'resposta_usuario__questionario', 'pergunta', 'opcao_resposta__pergunta')
     list_filter = ('pergunta__questionario', 'resposta_usuario__respondido_em')
     search_fields = ('resposta_usuario__cliente__nome', 'pergunta__texto', 'resposta_texto')
     readonly_fields = ('resposta_usuario', 'pergunta', 'opcao_resposta', 'resposta_texto')
@@ -274,7 +473,7 @@ class DashboardQuestionarioAdmin(admin.AdminSite):
     site_title = "Dashboard"
     index_title = "Painel de Controle"
     
-    def index(self, request, extra_context=None):
+    def _index(self, request, extra_context=None):
         """Exibe o dashboard customizado"""
         # Estatísticas gerais
         total_questionarios = Questionario.objects.count()
@@ -319,6 +518,14 @@ class DashboardQuestionarioAdmin(admin.AdminSite):
         
         return super().index(request, extra_context=extra_context)
 
+    def index(self, request, extra_context=None):
+        # Agregações do dashboard podem ser lidas da réplica
+        with leitura_replica():
+            response = self._index(request, extra_context)
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+
 
 # Registrar sites customizados
 questionnaire_admin_site = DashboardQuestionarioAdmin(name='dashboard')
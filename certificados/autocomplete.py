@@ -0,0 +1,136 @@
+"""
+Autocomplete de Cliente para o admin (InscricaoInline).
+
+Substitui o icontains em nome/cpf/email do AutocompleteJsonView padrão por
+busca por prefixo em colunas indexadas (nome_busca, cpf_digitos), com
+paginação por chave (keyset) em vez de COUNT + OFFSET.
+
+Buscar o termo no meio do nome (sobrenome) ou no e-mail não tem índice que
+ajude (varre a tabela). Fica desligado; com CERTIFICADOS_AUTOCOMPLETE_CONTEM
+esses resultados vêm depois dos prefixos, só para termos com pelo menos
+CERTIFICADOS_AUTOCOMPLETE_CONTEM_MINIMO caracteres.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.admin.views.autocomplete import AutocompleteJsonView
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db.models import Q
+from django.http import JsonResponse
+
+from .models import Cliente, normalizar_busca
+
+
+ITENS_POR_PAGINA = 20
+# Prefixos curtos ("a", "ma", "123") casam com muitos clientes: guarda em cache
+TAMANHO_PREFIXO_CACHE = 3
+CACHE_SEGUNDOS = 60
+CONTEM_MINIMO_PADRAO = 4
+
+
+def _fases(termo):
+    """
+    [(fase, filtro, campo de ordenação)], na ordem em que os resultados
+    aparecem: CPF (só dígitos, pontos e traço) por prefixo; nome por prefixo
+    e, se ativado, nome ou e-mail contendo o termo.
+    """
+    sem_mascara = termo.replace('.', '').replace('-', '').strip()
+    if sem_mascara.isdigit():
+        return [('cpf', Q(cpf_digitos__startswith=sem_mascara), 'cpf_digitos')]
+    nome = normalizar_busca(termo)
+    prefixo = Q(nome_busca__startswith=nome)
+    fases = [('prefixo', prefixo, 'nome_busca')]
+    minimo = getattr(settings, 'CERTIFICADOS_AUTOCOMPLETE_CONTEM_MINIMO', CONTEM_MINIMO_PADRAO)
+    if getattr(settings, 'CERTIFICADOS_AUTOCOMPLETE_CONTEM', False) and len(nome) >= minimo:
+        contem = (Q(nome_busca__contains=nome) | Q(email__icontains=termo.strip())) & ~prefixo
+        fases.append(('contem', contem, 'nome_busca'))
+    return fases
+
+
+def buscar_clientes(termo, apos=None, limite=ITENS_POR_PAGINA, queryset=None):
+    """
+    Retorna (clientes, cursor_proxima_pagina). O cursor é a tupla
+    (fase, chave, id) do último item, ou None quando não há mais resultados.
+    """
+    queryset = Cliente.objects.all() if queryset is None else queryset
+    fases = _fases(termo)
+    inicio = 0
+    if apos:
+        inicio = next(i for i, (fase, *_) in enumerate(fases) if fase == apos[0])
+
+    encontrados = []
+    for indice, (fase, filtro, campo) in enumerate(fases[inicio:], start=inicio):
+        pagina = queryset.filter(filtro).order_by(campo, 'id')
+        if apos and indice == inicio:
+            _, chave, pk = apos
+            pagina = pagina.filter(Q(**{f'{campo}__gt': chave}) | Q(**{campo: chave, 'id__gt': pk}))
+        encontrados += [(fase, campo, cliente) for cliente in pagina[:limite + 1 - len(encontrados)]]
+        if len(encontrados) > limite:
+            break
+
+    clientes = [cliente for _, _, cliente in encontrados[:limite]]
+    if len(encontrados) <= limite:
+        return clientes, None
+    fase, campo, ultimo = encontrados[limite - 1]
+    return clientes, (fase, getattr(ultimo, campo), ultimo.pk)
+
+
+def _chave(tipo, termo, pagina):
+    digest = hashlib.sha256(termo.encode()).hexdigest()
+    return f'cliente-autocomplete:{tipo}:{digest}:{pagina}'
+
+
+class ClienteAutocompleteView(AutocompleteJsonView):
+    """
+    Mesmo contrato JSON do select2 do admin ({results, pagination.more}).
+    O select2 só envia o número da página; o cursor de cada página seguinte
+    fica no cache, e na falta dele cai para OFFSET.
+    """
+
+    def get(self, request, *args, **kwargs):
+        self.term, self.model_admin, self.source_field, to_field_name = self.process_request(request)
+        if not self.has_perm(request):
+            raise PermissionDenied
+
+        termo = self.term.strip()
+        try:
+            pagina = max(1, int(request.GET.get('page', 1)))
+        except ValueError:
+            pagina = 1
+
+        usar_cache = pagina == 1 and len(termo) <= TAMANHO_PREFIXO_CACHE
+        if usar_cache:
+            dados = cache.get(_chave('pagina', termo, 1))
+            if dados is not None:
+                return JsonResponse(dados)
+
+        queryset = self.model_admin.get_queryset(request).complex_filter(
+            self.source_field.get_limit_choices_to()
+        )
+
+        apos = None
+        if pagina > 1:
+            apos = cache.get(_chave('cursor', termo, pagina))
+            if apos is None:
+                # Cursor expirou: percorre as páginas anteriores de uma vez
+                _, apos = buscar_clientes(termo, queryset=queryset, limite=(pagina - 1) * ITENS_POR_PAGINA)
+                if apos is None:
+                    return JsonResponse({'results': [], 'pagination': {'more': False}})
+
+        clientes, proximo = buscar_clientes(termo, apos=apos, queryset=queryset)
+        if proximo:
+            cache.set(_chave('cursor', termo, pagina + 1), proximo, CACHE_SEGUNDOS)
+
+        dados = {
+            'results': [self.serialize_result(obj, to_field_name) for obj in clientes],
+            'pagination': {'more': proximo is not None},
+        }
+        if usar_cache:
+            cache.set(_chave('pagina', termo, 1), dados, CACHE_SEGUNDOS)
+        return JsonResponse(dados)
+
+
+class ClienteAutocompleteSelect(AutocompleteSelect):
+    url_name = '%s:certificados_cliente_autocomplete'
@@ -0,0 +1,283 @@
+"""
+Benchmarks do fluxo de certificados (usados por manage.py bench).
+
+gerar_dados_sinteticos() cria cursos, agendamentos, alunos, certificados e
+respostas de questionário em lote; cada caso mede uma etapa e devolve um
+dict serializável em JSON (tempos em ms).
+"""
+import datetime
+import math
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+
+from core.instrumentacao import Medicao, percentil
+
+from .models import (
+    Certificado, Cliente, Curso, CursoAgendamento, Instrutor, ItemRespostaUsuario, OpcaoResposta, Pergunta,
+    Questionario, RespostaUsuario, normalizar_busca,
+)
+from .renderizacao import PoolRenderizacao
+from .services import dados_renderizacao, gerar_certificado_pdf_bytes, gerar_qr_code_base64_png, montar_url_inscricao
+
+TAMANHO_LOTE = 1000
+PERGUNTAS_ESCALA = 8
+PERGUNTAS_ABERTAS = 2
+OPCOES_ESCALA = [('otimo', 'Ótimo', 4), ('bom', 'Bom', 3), ('regular', 'Regular', 2), ('fraco', 'Fraco', 1)]
+
+
+def estatisticas(duracoes):
+    ordenadas = sorted(duracoes)
+    total = sum(ordenadas)
+    return {
+        'n': len(ordenadas),
+        'media_ms': round(total / len(ordenadas) * 1000, 2) if ordenadas else 0,
+        'p50_ms': round(percentil(ordenadas, 50) * 1000, 2),
+        'p95_ms': round(percentil(ordenadas, 95) * 1000, 2),
+        'por_segundo': round(len(ordenadas) / total, 2) if total else 0,
+    }
+
+
+def medir(funcao, repeticoes):
+    duracoes = []
+    for i in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(i)
+        duracoes.append(time.perf_counter() - inicio)
+    return duracoes
+
+
+def gerar_dados_sinteticos(respostas=10000, sem_resposta=50):
+    """
+    Um questionário (escala + abertas) e `respostas` alunos que já o
+    responderam, mais `sem_resposta` alunos com certificado ainda sem resposta.
+    """
+    instrutor = Instrutor.objects.create(nome='Instrutor Bench')
+    curso = Curso.objects.create(nome='Curso Bench', carga_horaria_padrao=8)
+    agendamentos = CursoAgendamento.objects.bulk_create([
+        CursoAgendamento(curso=curso, instrutor=instrutor, data=datetime.date(2025, 1, 1) + datetime.timedelta(days=i))
+        for i in range(20)
+    ])
+
+    questionario = Questionario.objects.create(titulo='Questionário Bench', curso=curso)
+    Pergunta.objects.bulk_create(
+        [Pergunta(questionario=questionario, numero=n, ordem=n, texto=f'Pergunta {n}', tipo=Pergunta.TIPO_ESCALA)
+         for n in range(1, PERGUNTAS_ESCALA + 1)]
+        + [Pergunta(questionario=questionario, numero=n, ordem=n, texto=f'Pergunta {n}', tipo=Pergunta.TIPO_CAMPO_ABERTO)
+           for n in range(PERGUNTAS_ESCALA + 1, PERGUNTAS_ESCALA + PERGUNTAS_ABERTAS + 1)]
+    )
+    perguntas = list(questionario.perguntas.order_by('numero'))
+    OpcaoResposta.objects.bulk_create([
+        OpcaoResposta(pergunta=pergunta, valor=valor, rotulo=rotulo, pontuacao=pontos, ordem=ordem)
+        for pergunta in perguntas if pergunta.tipo == Pergunta.TIPO_ESCALA
+        for ordem, (valor, rotulo, pontos) in enumerate(OPCOES_ESCALA)
+    ])
+    opcoes = {(o.pergunta_id, o.valor): o.pk for o in OpcaoResposta.objects.filter(pergunta__questionario=questionario)}
+
+    total = respostas + sem_resposta
+    for inicio in range(0, total, TAMANHO_LOTE):
+        faixa = range(inicio, min(inicio + TAMANHO_LOTE, total))
+        Cliente.objects.bulk_create([
+            Cliente(cpf=f'{90000000000 + i}', nome=f'Aluno Bench {i}', nome_busca=normalizar_busca(f'Aluno Bench {i}'),
+                    email=f'aluno{i}@bench.invalid', data_nascimento=datetime.date(1990, 1, 1), empresa='Bench')
+            for i in faixa
+        ])
+    clientes = list(Cliente.objects.filter(email__endswith='@bench.invalid').order_by('pk').values_list('pk', flat=True))
+    Certificado.objects.bulk_create(
+        [Certificado(cliente_id=pk, curso=curso, agendamento=agendamentos[i % len(agendamentos)])
+         for i, pk in enumerate(clientes)],
+        batch_size=TAMANHO_LOTE,
+    )
+    certificados = list(Certificado.objects.filter(curso=curso).order_by('pk').values_list('pk', 'cliente_id', 'agendamento_id'))
+
+    respondidos = certificados[:respostas]
+    RespostaUsuario.objects.bulk_create(
+        [RespostaUsuario(questionario=questionario, cliente_id=cliente, certificado_id=pk, agendamento_id=agendamento)
+         for pk, cliente, agendamento in respondidos],
+        batch_size=TAMANHO_LOTE,
+    )
+    ids_respostas = list(RespostaUsuario.objects.filter(questionario=questionario).values_list('pk', flat=True))
+    for inicio in range(0, len(ids_respostas), TAMANHO_LOTE // 10):
+        ItemRespostaUsuario.objects.bulk_create([
+            ItemRespostaUsuario(
+                resposta_usuario_id=resposta,
+                pergunta=pergunta,
+                opcao_resposta_id=opcoes.get((pergunta.pk, OPCOES_ESCALA[(resposta + pergunta.numero) % 4][0])),
+                resposta_texto='' if pergunta.tipo == Pergunta.TIPO_ESCALA else 'Comentário',
+            )
+            for resposta in ids_respostas[inicio:inicio + TAMANHO_LOTE // 10]
+            for pergunta in perguntas
+        ])
+
+    return {
+        'questionario': questionario,
+        'perguntas': perguntas,
+        'agendamentos': agendamentos,
+        'pendentes': [pk for pk, _, _ in certificados[respostas:]],
+        'cpfs': list(Cliente.objects.filter(pk__in=clientes[:200]).values_list('cpf', flat=True)),
+    }
+
+
+def bench_pdf(dados, repeticoes=20):
+    certificados = list(
+        Certificado.objects.select_related('cliente', 'curso__modelo_certificado', 'agendamento')
+        .filter(pk__in=dados['pendentes'][:repeticoes])
+    )
+    tamanhos = []
+    duracoes = medir(lambda i: tamanhos.append(len(gerar_certificado_pdf_bytes(certificados[i % len(certificados)]))),
+                     repeticoes)
+    return {**estatisticas(duracoes), 'bytes_medio': round(sum(tamanhos) / len(tamanhos))}
+
+
+# Metadados que mudam a cada geração (data de criação e /ID do trailer)
+METADADOS_PDF = re.compile(rb'/(CreationDate|ModDate) \(D:[^)]*\)|/ID\s*\[<[0-9a-fA-F]+><[0-9a-fA-F]+>\]')
+
+
+def bench_pdf_paralelo(dados, repeticoes=20, threads=4):
+    """
+    Renderiza os mesmos certificados em série e num ThreadPoolExecutor e
+    exige PDFs idênticos (fora data de criação e /ID): nada na
+    renderização pode depender de estado global do processo.
+    """
+    certificados = list(
+        Certificado.objects.select_related('cliente', 'curso__modelo_certificado', 'agendamento')
+        .filter(pk__in=dados['pendentes'][:repeticoes])
+    )
+
+    def render(certificado):
+        return METADADOS_PDF.sub(b'', gerar_certificado_pdf_bytes(certificado))
+
+    esperado = [render(certificado) for certificado in certificados]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        obtido = list(executor.map(render, certificados * threads))
+    duracao = time.perf_counter() - inicio
+
+    divergentes = sum(1 for i, pdf in enumerate(obtido) if pdf != esperado[i % len(esperado)])
+    if divergentes:
+        raise RuntimeError(f'{divergentes} PDF(s) gerados em paralelo diferem da renderização em série')
+    return {'threads': threads, 'pdfs': len(obtido), 'por_segundo': round(len(obtido) / duracao, 2), 'divergentes': 0}
+
+
+def bench_pdf_pool(dados, repeticoes=40, processos=None):
+    """Lote de PDFs no PoolRenderizacao (processos já aquecidos antes de medir)."""
+    certificados = list(
+        Certificado.objects.select_related('cliente', 'curso__modelo_certificado', 'agendamento')
+        .filter(pk__in=dados['pendentes'][:repeticoes])
+    )
+    trabalhos = [dados_renderizacao(certificado) for certificado in certificados]
+    with PoolRenderizacao(processos) as pool:
+        list(pool.renderizar(trabalhos[:pool.processos]))
+        inicio = time.perf_counter()
+        total = sum(len(pdf) for pdf in pool.renderizar(trabalhos))
+        duracao = time.perf_counter() - inicio
+    return {'processos': pool.processos, 'pdfs': len(trabalhos), 'por_segundo': round(len(trabalhos) / duracao, 2),
+            'bytes_medio': round(total / len(trabalhos))}
+
+
+def bench_pdf_tamanho(dados, repeticoes=10):
+    """Bytes por certificado (PDF e anexo em base64) e tempo, com e sem a otimização do fundo."""
+    certificados = list(
+        Certificado.objects.select_related('cliente', 'curso__modelo_certificado', 'agendamento')
+        .filter(pk__in=dados['pendentes'][:repeticoes])
+    )
+    resultados = {}
+    for modo, otimizado in (('original', False), ('otimizado', True)):
+        with override_settings(CERTIFICADOS_PDF_OTIMIZADO=otimizado):
+            inicio = time.perf_counter()
+            gerar_certificado_pdf_bytes(certificados[0])  # compila o plano deste modo
+            compilacao = time.perf_counter() - inicio
+            tamanhos = []
+            duracoes = medir(lambda i: tamanhos.append(len(gerar_certificado_pdf_bytes(certificados[i % len(certificados)]))),
+                             repeticoes)
+        media = sum(tamanhos) / len(tamanhos)
+        resultados[modo] = {
+            **estatisticas(duracoes),
+            'compilacao_ms': round(compilacao * 1000, 2),
+            'bytes_medio': round(media),
+            'bytes_base64': round(4 * math.ceil(media / 3)),
+        }
+    resultados['reducao_bytes'] = round(1 - resultados['otimizado']['bytes_medio'] / resultados['original']['bytes_medio'], 3)
+    return resultados
+
+
+def bench_qrcode(dados, repeticoes=200):
+    urls = [montar_url_inscricao(agendamento.pk) for agendamento in dados['agendamentos']]
+    return estatisticas(medir(lambda i: gerar_qr_code_base64_png(urls[i % len(urls)]), repeticoes))
+
+
+def bench_questionario(dados, repeticoes=20):
+    """POST de respostas completas (PDF medido à parte; envio pelo transporte locmem)."""
+    post = {}
+    for pergunta in dados['perguntas']:
+        campo = f'pergunta_{pergunta.pk}'
+        post[campo] = OPCOES_ESCALA[0][0] if pergunta.tipo == Pergunta.TIPO_ESCALA else 'Muito bom'
+
+    client = Client()
+    consultas = []
+    duracoes = []
+    with mock.patch('certificados.views.gerar_certificado_pdf_bytes', return_value=b''), \
+            override_settings(CERTIFICADOS_TRANSPORTE_EMAIL='locmem'):
+        for pk in dados['pendentes'][:repeticoes]:
+            url = reverse('certificados:responder_questionario', args=[pk])
+            medicao = Medicao()
+            with connection.execute_wrapper(medicao):
+                resposta = client.post(url, post)
+            duracoes.append(medicao.tempo_total)
+            if resposta.status_code != 302:
+                raise RuntimeError(f'POST do questionário retornou {resposta.status_code}')
+            consultas.append(medicao.consultas)
+    return {**estatisticas(duracoes), 'consultas_media': round(sum(consultas) / len(consultas), 1),
+            'consultas_max': max(consultas)}
+
+
+def bench_dashboards(dados, repeticoes=1):
+    from .admin import questionnaire_admin_site
+    from .dashboard_admin import dashboard_admin_site
+
+    User = get_user_model()
+    usuario = User.objects.filter(username='bench').first() or User.objects.create_superuser('bench', '', None)
+    resultados = {'respostas': RespostaUsuario.objects.count()}
+    for nome, site in (('dashboard_admin', dashboard_admin_site), ('dashboard_questionario', questionnaire_admin_site)):
+        consultas = []
+
+        def carregar(_):
+            request = RequestFactory().get('/')
+            request.user = usuario
+            medicao = Medicao()
+            with connection.execute_wrapper(medicao):
+                site.index(request)
+            consultas.append(medicao.consultas)
+
+        resultados[nome] = {**estatisticas(medir(carregar, repeticoes)), 'consultas': max(consultas)}
+    return resultados
+
+
+def bench_cpf(dados, repeticoes=200):
+    client = Client()
+    url = reverse('aluno_por_cpf')
+    cpfs = dados['cpfs']
+    with override_settings(CPF_LOOKUP_BUCKET_CAPACITY=10 ** 9):
+        cache.clear()
+        frio = medir(lambda i: client.get(url, {'cpf': cpfs[i % len(cpfs)]}), min(repeticoes, len(cpfs)))
+        quente = medir(lambda i: client.get(url, {'cpf': cpfs[i % len(cpfs)]}), repeticoes)
+    return {'sem_cache': estatisticas(frio), 'com_cache': estatisticas(quente)}
+
+
+CASOS = {
+    'pdf': bench_pdf,
+    'pdf_paralelo': bench_pdf_paralelo,
+    'pdf_pool': bench_pdf_pool,
+    'pdf_tamanho': bench_pdf_tamanho,
+    'qrcode': bench_qrcode,
+    'questionario': bench_questionario,
+    'dashboards': bench_dashboards,
+    'cpf': bench_cpf,
+}
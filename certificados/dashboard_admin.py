@@ -8,6 +8,7 @@ from django.template.response import TemplateResponse
 from django.db.models import Count
 
 from .models import Questionario, RespostaUsuario, Pergunta
+from core.db_router import leitura_replica
 
 
 class QuestionarioDashboardAdminSite(admin.AdminSite):
@@ -17,7 +18,7 @@ class QuestionarioDashboardAdminSite(admin.AdminSite):
     site_title = "Dashboard"
     index_title = "Painel de Controle"
     
-    def index(self, request, extra_context=None):
+    def _index(self, request, extra_context=None):
         """Página inicial do dashboard"""
         # Estatísticas gerais
         total_questionarios = Questionario.objects.count()
@@ -62,6 +63,14 @@ class QuestionarioDashboardAdminSite(admin.AdminSite):
         
         return super().index(request, extra_context=extra_context)
 
+    def index(self, request, extra_context=None):
+        # Agregações do dashboard podem ser lidas da réplica
+        with leitura_replica():
+            response = self._index(request, extra_context)
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+
 
 # Criar instância do site customizado
 dashboard_admin_site = QuestionarioDashboardAdminSite(name='dashboard_questionnaires')
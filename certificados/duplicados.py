@@ -0,0 +1,105 @@
+"""
+Alunos com o mesmo CPF (só dígitos), cadastrados antes da constraint
+uniq_cliente_cpf_digitos. Nada aqui roda em migração: o comando
+mesclar_clientes_duplicados mostra o plano e só altera com --aplicar.
+
+Em cada grupo fica o cadastro mais antigo (o que registrar_inscricao
+atualizava); os demais passam para ele os certificados (com os envios, então
+os códigos já enviados continuam válidos), as respostas e as inscrições, e
+então são apagados. Nenhum certificado é apagado: grupos com nomes
+diferentes (CPF de outra pessoa digitado errado) ou com dois certificados do
+mesmo curso/agendamento ficam para revisão manual no admin.
+"""
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Count
+
+from core.services import somente_digitos
+
+from .models import Certificado, Cliente, Inscricao, RespostaUsuario, normalizar_busca
+
+
+@dataclass
+class GrupoDuplicado:
+    cpf: str
+    # Ordenados por pk: o primeiro é o cadastro mantido
+    clientes: list
+    conflitos: list = field(default_factory=list)
+    inscricoes_repetidas: int = 0
+    mesclado: bool = False
+
+    @property
+    def mantido(self):
+        return self.clientes[0]
+
+    @property
+    def mesclavel(self):
+        return not self.conflitos
+
+
+def cpfs_duplicados(cpfs=None):
+    """CPFs (só dígitos) com mais de um aluno, opcionalmente restritos a `cpfs`."""
+    repetidos = (
+        Cliente.objects.exclude(cpf_digitos='')
+        .values('cpf_digitos')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+    )
+    if cpfs:
+        repetidos = repetidos.filter(cpf_digitos__in=[somente_digitos(cpf) for cpf in cpfs])
+    return list(repetidos.order_by('cpf_digitos').values_list('cpf_digitos', flat=True))
+
+
+def analisar_grupo(cpf, aceitar_nomes_diferentes=False) -> GrupoDuplicado:
+    clientes = list(
+        Cliente.objects.filter(cpf_digitos=cpf).order_by('pk').annotate(
+            num_certificados=Count('certificados', distinct=True),
+            num_inscricoes=Count('inscricoes', distinct=True),
+            num_respostas=Count('respostas_questionario', distinct=True),
+        )
+    )
+    grupo = GrupoDuplicado(cpf=cpf, clientes=clientes)
+
+    nomes = {normalizar_busca(cliente.nome) for cliente in clientes}
+    if len(nomes) > 1 and not aceitar_nomes_diferentes:
+        grupo.conflitos.append('nomes diferentes')
+
+    repetidos = (
+        Certificado.objects.filter(cliente__in=clientes)
+        .values('curso_id', 'agendamento_id')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for chave in repetidos:
+        codigos = Certificado.objects.filter(
+            cliente__in=clientes, curso_id=chave['curso_id'], agendamento_id=chave['agendamento_id'],
+        ).order_by('pk').values_list('codigo', flat=True)
+        grupo.conflitos.append(f"certificados do mesmo curso/agendamento: {', '.join(map(str, codigos))}")
+
+    grupo.inscricoes_repetidas = sum(
+        linha['total'] - 1
+        for linha in Inscricao.objects.filter(cliente__in=clientes)
+        .values('agendamento_id').annotate(total=Count('id')).filter(total__gt=1)
+    )
+    return grupo
+
+
+def mesclar_grupo(cpf, aceitar_nomes_diferentes=False) -> GrupoDuplicado:
+    """Mescla o grupo se ele não tiver conflitos (reanalisado dentro da transação)."""
+    with transaction.atomic():
+        grupo = analisar_grupo(cpf, aceitar_nomes_diferentes)
+        if not grupo.mesclavel:
+            return grupo
+        manter = grupo.mantido.pk
+        remover = [cliente.pk for cliente in grupo.clientes[1:]]
+        Certificado.objects.filter(cliente_id__in=remover).update(cliente_id=manter)
+        RespostaUsuario.objects.filter(cliente_id__in=remover).update(cliente_id=manter)
+        for pk in remover:
+            # Mesma pessoa inscrita duas vezes no agendamento: a inscrição repetida não tem outros vínculos
+            inscritos = Inscricao.objects.filter(cliente_id=manter).values('agendamento_id')
+            Inscricao.objects.filter(cliente_id=pk, agendamento_id__in=inscritos).delete()
+            Inscricao.objects.filter(cliente_id=pk).update(cliente_id=manter)
+        Cliente.objects.filter(pk__in=remover).delete()
+        grupo.mesclado = True
+    return grupo
@@ -0,0 +1,249 @@
+"""
+Envio idempotente dos certificados, registrado em EnvioCertificado.
+
+A chave de idempotência é (certificado, versão do modelo, nº do reenvio):
+
+- o envio automático (questionário) usa o reenvio 0, então um POST repetido
+  não manda o e-mail de novo;
+- o reenvio pelo admin usa o número de envios já concluídos, então dois
+  cliques simultâneos disputam a mesma chave e só um envia;
+- trocar o layout do modelo gera outra versão e, portanto, outra chave.
+
+Antes de enviar, a linha passa para "enviando" num UPDATE condicional: só
+quem mudou o status envia. Uma linha presa em "enviando" (processo morto)
+volta a ser elegível após CERTIFICADOS_ENVIO_EXPIRA segundos.
+
+Envios falhos ganham proxima_tentativa com backoff exponencial;
+reenviar_pendentes (comando reenviar_certificados_pendentes) retoma os
+certificados com questionário respondido e sem e-mail entregue. Os
+respondidos antes de EnvioCertificado existir ganharam uma linha "enviado"
+(transporte "legado") na migração 0016.
+"""
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from .models import Certificado, EnvioCertificado, RespostaUsuario
+from .transportes import LimiteTransporte, mensagem_certificado, obter_transporte
+
+logger = logging.getLogger(__name__)
+
+EXPIRA_PADRAO = 15 * 60
+BACKOFF_PADRAO = 60
+BACKOFF_MAXIMO_PADRAO = 6 * 3600
+
+
+def versao_modelo(certificado) -> str:
+    modelo = certificado.curso.modelo_certificado
+    if modelo is None:
+        return 'padrao'
+    return f'{modelo.pk}@{modelo.atualizado_em:%Y%m%d%H%M%S}'
+
+
+def chave_envio(certificado, reenvio=0) -> str:
+    chave = f'{certificado.pk}:{versao_modelo(certificado)}'
+    return f'{chave}:r{reenvio}' if reenvio else chave
+
+
+def _proximo_reenvio(certificado) -> int:
+    return EnvioCertificado.objects.filter(
+        certificado=certificado,
+        chave_idempotencia__startswith=chave_envio(certificado),
+        status=EnvioCertificado.STATUS_ENVIADO,
+    ).count()
+
+
+def registrar_envio(certificado, reenvio=False) -> EnvioCertificado:
+    """Linha do envio (criada como pendente se ainda não existir)."""
+    chave = chave_envio(certificado, _proximo_reenvio(certificado) if reenvio else 0)
+    try:
+        with transaction.atomic():
+            return EnvioCertificado.objects.create(certificado=certificado, chave_idempotencia=chave)
+    except IntegrityError:
+        return EnvioCertificado.objects.get(chave_idempotencia=chave)
+
+
+def reservar_envio(envio, transporte) -> bool:
+    """Passa o envio para "enviando"; False se já foi enviado ou outro processo o reservou."""
+    agora = timezone.now()
+    expira = timedelta(seconds=getattr(settings, 'CERTIFICADOS_ENVIO_EXPIRA', EXPIRA_PADRAO))
+    reservado = EnvioCertificado.objects.filter(
+        Q(status__in=[EnvioCertificado.STATUS_PENDENTE, EnvioCertificado.STATUS_FALHOU])
+        | Q(status=EnvioCertificado.STATUS_ENVIANDO, atualizado_em__lt=agora - expira),
+        pk=envio.pk,
+    ).update(
+        status=EnvioCertificado.STATUS_ENVIANDO,
+        transporte=transporte.nome,
+        tentativas=F('tentativas') + 1,
+        atualizado_em=agora,
+    )
+    return reservado == 1
+
+
+def espera_backoff(tentativas, espera_minima=None) -> float:
+    """Segundos até a próxima tentativa após `tentativas` falhas."""
+    base = getattr(settings, 'CERTIFICADOS_ENVIO_BACKOFF', BACKOFF_PADRAO)
+    maximo = getattr(settings, 'CERTIFICADOS_ENVIO_BACKOFF_MAXIMO', BACKOFF_MAXIMO_PADRAO)
+    return max(min(base * 2 ** max(tentativas - 1, 0), maximo), espera_minima or 0)
+
+
+def _concluir(envio, status, inicio, **campos):
+    campos['latencia_ms'] = round((time.perf_counter() - inicio) * 1000)
+    campos['atualizado_em'] = timezone.now()
+    EnvioCertificado.objects.filter(pk=envio.pk).update(status=status, **campos)
+    envio.refresh_from_db()
+
+
+def enviar_registrado(envio, certificado, obter_pdf, transporte):
+    """
+    Envia um EnvioCertificado já registrado. Devolve (envio, enviado):
+    enviado é False se a chave já estava enviada ou reservada por outro
+    processo. Erros de PDF ou de transporte ficam em envio.erro (status
+    "falhou") e são relançados.
+    """
+    if not reservar_envio(envio, transporte):
+        envio.refresh_from_db()
+        return envio, False
+
+    inicio = time.perf_counter()
+    try:
+        id_mensagem = transporte.enviar(mensagem_certificado(certificado, obter_pdf()))
+    except Exception as exc:
+        envio.refresh_from_db(fields=['tentativas'])
+        espera = espera_backoff(envio.tentativas, getattr(exc, 'espera', None))
+        _concluir(envio, EnvioCertificado.STATUS_FALHOU, inicio, erro=f'{type(exc).__name__}: {exc}',
+                  proxima_tentativa=timezone.now() + timedelta(seconds=espera))
+        raise
+    _concluir(envio, EnvioCertificado.STATUS_ENVIADO, inicio, erro='', proxima_tentativa=None,
+              id_mensagem_provedor=id_mensagem or '', enviado_em=timezone.now())
+    return envio, True
+
+
+def enviar_certificado(certificado, obter_pdf, transporte=None, reenvio=False):
+    """
+    Envia o certificado uma vez por chave de idempotência. obter_pdf() só é
+    chamado se o envio for de fato feito. Ver enviar_registrado.
+    """
+    envio = registrar_envio(certificado, reenvio=reenvio)
+    if transporte is None:
+        with obter_transporte() as transporte:
+            return enviar_registrado(envio, certificado, obter_pdf, transporte)
+    return enviar_registrado(envio, certificado, obter_pdf, transporte)
+
+
+def status_email(certificado):
+    """'enviado', 'pendente' (há envio, nenhum concluído) ou None (nunca tentado)."""
+    status = set(certificado.envios.values_list('status', flat=True))
+    if not status:
+        return None
+    return 'enviado' if EnvioCertificado.STATUS_ENVIADO in status else 'pendente'
+
+
+def certificados_pendentes(horas, max_tentativas):
+    """
+    Certificados com questionário respondido nas últimas `horas` e sem e-mail
+    entregue, excluindo envios em andamento, em backoff ou que esgotaram
+    `max_tentativas`.
+    """
+    agora = timezone.now()
+    expira = timedelta(seconds=getattr(settings, 'CERTIFICADOS_ENVIO_EXPIRA', EXPIRA_PADRAO))
+    respondidos = RespostaUsuario.objects.filter(
+        respondido_em__gte=agora - timedelta(hours=horas), certificado__isnull=False,
+    ).values('certificado_id')
+    bloqueados = EnvioCertificado.objects.filter(certificado=OuterRef('pk')).filter(
+        Q(status=EnvioCertificado.STATUS_ENVIADO)
+        | Q(status=EnvioCertificado.STATUS_ENVIANDO, atualizado_em__gte=agora - expira)
+        | Q(proxima_tentativa__gt=agora)
+        | Q(tentativas__gte=max_tentativas)
+    )
+    return Certificado.objects.filter(pk__in=respondidos).filter(~Exists(bloqueados)).order_by('pk')
+
+
+@dataclass
+class ResultadoReenvio:
+    pendentes: int = 0
+    enviados: int = 0
+    ignorados: int = 0
+    falhas: int = 0
+    # LimiteTransporte que interrompeu a varredura, se houve
+    limite: Exception = None
+
+
+def _enviar_lote(pares, concorrencia, resultado, parar):
+    """Envia os pares (certificado, obter_pdf) com até `concorrencia` threads, um transporte por thread."""
+    fila = queue.SimpleQueue()
+    for par in pares:
+        fila.put(par)
+    lock = threading.Lock()
+
+    def trabalhador():
+        try:
+            with obter_transporte() as transporte:
+                while not parar.is_set():
+                    try:
+                        certificado, obter_pdf = fila.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        _, enviado = enviar_certificado(certificado, obter_pdf, transporte)
+                    except LimiteTransporte as exc:
+                        # O provedor está limitando: insistir só piora
+                        logger.warning("Limite do transporte no certificado %s: %s", certificado.pk, exc)
+                        parar.set()
+                        with lock:
+                            resultado.falhas += 1
+                            resultado.limite = exc
+                    except Exception:
+                        logger.exception("Erro ao reenviar certificado %s", certificado.pk)
+                        with lock:
+                            resultado.falhas += 1
+                    else:
+                        with lock:
+                            if enviado:
+                                resultado.enviados += 1
+                            else:
+                                resultado.ignorados += 1
+        except Exception:
+            # Falha ao abrir o transporte (conexão SMTP, sessão): as outras threads também falhariam
+            logger.exception("Erro no transporte de e-mail")
+            parar.set()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=trabalhador) for _ in range(max(1, min(concorrencia, len(pares))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def reenviar_pendentes(horas=72, tamanho_lote=50, concorrencia=4, max_tentativas=8, pool=None) -> ResultadoReenvio:
+    """
+    Envia os certificados de certificados_pendentes em lotes de
+    `tamanho_lote` (PDFs em `pool`, um PoolRenderizacao, se dado). Para no
+    primeiro LimiteTransporte; o que sobrou fica para a próxima execução.
+    """
+    from .renderizacao import gerar_pdfs
+
+    resultado = ResultadoReenvio()
+    parar = threading.Event()
+    pendentes = certificados_pendentes(horas, max_tentativas)
+    ultimo = 0
+    while not parar.is_set():
+        ids = list(pendentes.filter(pk__gt=ultimo).values_list('pk', flat=True)[:tamanho_lote])
+        if not ids:
+            break
+        ultimo = ids[-1]
+        resultado.pendentes += len(ids)
+        certificados = Certificado.objects.filter(pk__in=ids).order_by('pk').select_related(
+            'cliente', 'curso__modelo_certificado', 'agendamento')
+        _enviar_lote(gerar_pdfs(certificados, pool), concorrencia, resultado, parar)
+    return resultado
@@ -1,4 +1,6 @@
 from django import forms
+from core.services import somente_digitos
+from .importacao import normalizar_cpf
 from .models import Certificado, Curso, Cliente, ItemRespostaUsuario, RespostaUsuario
 
 
@@ -12,6 +14,21 @@ class CertificadoForm(forms.ModelForm):
         self.fields['curso'].queryset = Curso.objects.all().order_by('nome')
 
 
+class ClienteAdminForm(forms.ModelForm):
+    """O CPF é único sem máscara (cpf_digitos), que o ModelForm não valida sozinho."""
+
+    class Meta:
+        model = Cliente
+        fields = '__all__'
+
+    def clean_cpf(self):
+        cpf = self.cleaned_data['cpf']
+        duplicado = Cliente.objects.filter(cpf_digitos=somente_digitos(cpf)).exclude(pk=self.instance.pk)
+        if somente_digitos(cpf) and duplicado.exists():
+            raise forms.ValidationError('Já existe um aluno com este CPF.')
+        return cpf
+
+
 class InscricaoPublicaForm(forms.ModelForm):
     class Meta:
         model = Cliente
@@ -20,6 +37,12 @@ class InscricaoPublicaForm(forms.ModelForm):
             'data_nascimento': forms.DateInput(attrs={'type': 'date'}),
         }
 
+    def clean_cpf(self):
+        # O CPF identifica o aluno: vazio ou inválido atualizaria o cadastro de outra pessoa
+        cpf = self.cleaned_data['cpf']
+        normalizar_cpf(cpf)
+        return cpf
+
 
 class QuestionarioForm(forms.Form):
     """Formulário dinâmico para responder questionário"""
@@ -85,3 +108,26 @@ class QuestionarioForm(forms.Form):
         self.fields[field_name] = field
         self.pergunta_map = getattr(self, 'pergunta_map', {})
         self.pergunta_map[field_name] = pergunta
+
+
+class ImportarParticipantesForm(forms.Form):
+    """Upload da lista de participantes (CSV ou XLSX) de um agendamento"""
+    arquivo = forms.FileField(
+        label='Arquivo (CSV ou XLSX)',
+        help_text='Colunas: CPF, Nome, E-mail, Data de nascimento, Telefone, Empresa',
+    )
+    empresa_padrao = forms.CharField(
+        label='Empresa padrão', max_length=200, required=False,
+        help_text='Usada nas linhas sem a coluna Empresa preenchida',
+    )
+    encoding = forms.ChoiceField(
+        label='Codificação do CSV',
+        choices=[('utf-8-sig', 'UTF-8'), ('cp1252', 'Windows / Excel (cp1252)')],
+        initial='utf-8-sig',
+    )
+
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data['arquivo']
+        if not arquivo.name.lower().endswith(('.csv', '.txt', '.xlsx', '.xlsm')):
+            raise forms.ValidationError('Envie um arquivo .csv ou .xlsx')
+        return arquivo
@@ -0,0 +1,277 @@
+"""
+Importação em lote de participantes (CSV/XLSX) para um agendamento.
+
+Pensado para listas de empresas com milhares de linhas: o arquivo é lido em
+streaming, os clientes existentes são casados por um mapa CPF -> id buscado
+só para os CPFs do arquivo (cpf_digitos__in em lotes) e tudo o que é novo é
+gravado com bulk_create em lotes.
+"""
+import csv
+import io
+import unicodedata
+import zlib
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from zipfile import BadZipFile
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, connection, transaction
+
+from core.services import invalidar_cache_cpfs, somente_digitos
+
+from .models import Certificado, Cliente, Inscricao, normalizar_busca
+
+
+TAMANHO_LOTE = 1000
+# Gravação concorrente (inscrição pública) do mesmo aluno: relê e tenta de novo
+TENTATIVAS_GRAVACAO = 2
+
+# Cabeçalho normalizado -> campo do Cliente
+COLUNAS = {
+    'cpf': 'cpf',
+    'nome': 'nome',
+    'nome completo': 'nome',
+    'email': 'email',
+    'e-mail': 'email',
+    'data nascimento': 'data_nascimento',
+    'data de nascimento': 'data_nascimento',
+    'nascimento': 'data_nascimento',
+    'telefone': 'telefone',
+    'celular': 'telefone',
+    'empresa': 'empresa',
+    'endereco': 'endereco',
+}
+
+
+@dataclass
+class ResultadoImportacao:
+    linhas: int = 0
+    clientes_criados: int = 0
+    clientes_existentes: int = 0
+    inscricoes_criadas: int = 0
+    ja_inscritos: int = 0
+    certificados_criados: int = 0
+    duplicados: list = field(default_factory=list)   # [(linha, cpf)]
+    invalidos: list = field(default_factory=list)    # [(linha, motivo)]
+
+
+def _normalizar_cabecalho(valor) -> str:
+    texto = unicodedata.normalize('NFKD', str(valor or '')).encode('ascii', 'ignore').decode()
+    return ' '.join(texto.lower().replace('_', ' ').split())
+
+
+def normalizar_cpf(valor) -> str:
+    """Retorna os 11 dígitos do CPF ou levanta ValidationError."""
+    if isinstance(valor, (int, float)):
+        # Planilhas costumam transformar CPF em número e perder zeros à esquerda
+        valor = f'{int(valor):011d}'
+    cpf = somente_digitos(str(valor or ''))
+    if len(cpf) != 11 or cpf == cpf[0] * 11:
+        raise ValidationError('CPF inválido')
+
+    for tamanho in (9, 10):
+        soma = sum(int(d) * peso for d, peso in zip(cpf[:tamanho], range(tamanho + 1, 1, -1)))
+        digito = (soma * 10) % 11 % 10
+        if digito != int(cpf[tamanho]):
+            raise ValidationError('CPF inválido (dígito verificador)')
+    return cpf
+
+
+def _normalizar_data(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor or '').strip()
+    for formato in ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValidationError('Data de nascimento inválida')
+
+
+def _linhas_csv(arquivo, encoding):
+    texto = io.TextIOWrapper(arquivo, encoding=encoding, newline='')
+    try:
+        primeira = texto.readline()
+        # Excel em pt-BR exporta com ';'
+        delimitador = ';' if primeira.count(';') > primeira.count(',') else ','
+        yield next(csv.reader([primeira], delimiter=delimitador), [])
+        yield from csv.reader(texto, delimiter=delimitador)
+    except csv.Error as exc:
+        raise ValidationError(f'CSV inválido: {exc}') from exc
+    finally:
+        texto.detach()
+
+
+def _linhas_xlsx(arquivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as exc:
+        raise ValidationError('Instale o pacote "openpyxl" para importar arquivos .xlsx') from exc
+
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    # KeyError: zip válido sem as partes de uma planilha; zlib.error: dados corrompidos
+    erros = (BadZipFile, InvalidFileException, KeyError, zlib.error)
+    try:
+        planilha = load_workbook(arquivo, read_only=True, data_only=True)
+    except erros as exc:
+        raise ValidationError('Arquivo .xlsx inválido ou corrompido') from exc
+    try:
+        yield from planilha.active.iter_rows(values_only=True)
+    except erros as exc:
+        raise ValidationError('Arquivo .xlsx inválido ou corrompido') from exc
+    finally:
+        planilha.close()
+
+
+def ler_participantes(arquivo, nome_arquivo, encoding='utf-8-sig'):
+    """
+    Gera (numero_linha, dict) para cada linha do arquivo, com as colunas já
+    mapeadas para os campos do Cliente.
+    """
+    if Path(nome_arquivo).suffix.lower() in ('.xlsx', '.xlsm'):
+        linhas = _linhas_xlsx(arquivo)
+    else:
+        linhas = _linhas_csv(arquivo, encoding)
+
+    cabecalho = [COLUNAS.get(_normalizar_cabecalho(c)) for c in next(linhas, [])]
+    if 'cpf' not in cabecalho or 'nome' not in cabecalho:
+        raise ValidationError('O arquivo precisa ter ao menos as colunas CPF e Nome')
+
+    for numero, valores in enumerate(linhas, start=2):
+        if not any(v not in (None, '') for v in valores):
+            continue
+        yield numero, {
+            campo: valor
+            for campo, valor in zip(cabecalho, valores)
+            if campo
+        }
+
+
+def _validar_linha(dados, empresa_padrao):
+    cpf = normalizar_cpf(dados.get('cpf'))
+    nome = str(dados.get('nome') or '').strip()
+    if not nome:
+        raise ValidationError('Nome em branco')
+    email = str(dados.get('email') or '').strip()
+    validate_email(email)
+    return {
+        'cpf': cpf,
+        'nome': nome[:200],
+        'email': email,
+        'data_nascimento': _normalizar_data(dados.get('data_nascimento')),
+        'telefone': str(dados.get('telefone') or '').strip()[:20],
+        'endereco': str(dados.get('endereco') or '').strip()[:255],
+        'empresa': (str(dados.get('empresa') or '').strip() or empresa_padrao)[:200],
+    }
+
+
+def _criar_clientes(novos, cpf_para_id, tamanho_lote):
+    """bulk_create em lotes, preenchendo cpf_para_id com as PKs geradas."""
+    retorna_pk = connection.features.can_return_rows_from_bulk_insert
+    for inicio in range(0, len(novos), tamanho_lote):
+        # bulk_create não chama Cliente.save(); nome_busca e cpf_digitos são preenchidos aqui
+        lote = [
+            Cliente(nome_busca=normalizar_busca(dados['nome']), cpf_digitos=dados['cpf'], **dados)
+            for dados in novos[inicio:inicio + tamanho_lote]
+        ]
+        Cliente.objects.bulk_create(lote)
+        if retorna_pk:
+            cpf_para_id.update((c.cpf, c.pk) for c in lote)
+        else:
+            # SQL Server (mssql-django) não devolve as PKs do bulk insert
+            cpf_para_id.update(
+                Cliente.objects.filter(cpf_digitos__in=[c.cpf for c in lote]).values_list('cpf_digitos', 'pk')
+            )
+
+
+def _ids_existentes(cpfs, tamanho_lote):
+    """Mapa CPF -> id dos clientes já cadastrados, em lotes (limite de parâmetros do SQL Server)."""
+    cpf_para_id = {}
+    for inicio in range(0, len(cpfs), tamanho_lote):
+        cpf_para_id.update(
+            Cliente.objects.filter(cpf_digitos__in=cpfs[inicio:inicio + tamanho_lote])
+            .values_list('cpf_digitos', 'pk')
+        )
+    return cpf_para_id
+
+
+def _gravar(agendamento, validos, resultado, tamanho_lote):
+    """Grava clientes, inscrições e certificados; devolve os dados dos clientes criados."""
+    cpf_para_id = _ids_existentes(list(validos), tamanho_lote)
+
+    novos = [dados for cpf, dados in validos.items() if cpf not in cpf_para_id]
+    resultado.clientes_existentes = len(validos) - len(novos)
+    _criar_clientes(novos, cpf_para_id, tamanho_lote)
+    resultado.clientes_criados = len(novos)
+
+    cliente_ids = [cpf_para_id[cpf] for cpf in validos]
+
+    ja_inscritos = set(agendamento.inscricoes.values_list('cliente_id', flat=True))
+    inscricoes = [
+        Inscricao(agendamento=agendamento, cliente_id=cliente_id)
+        for cliente_id in cliente_ids
+        if cliente_id not in ja_inscritos
+    ]
+    Inscricao.objects.bulk_create(inscricoes, batch_size=tamanho_lote)
+    resultado.inscricoes_criadas = len(inscricoes)
+    resultado.ja_inscritos = len(cliente_ids) - len(inscricoes)
+
+    com_certificado = set(
+        Certificado.objects.filter(agendamento=agendamento, curso_id=agendamento.curso_id)
+        .values_list('cliente_id', flat=True)
+    )
+    certificados = [
+        Certificado(cliente_id=cliente_id, curso_id=agendamento.curso_id, agendamento=agendamento)
+        for cliente_id in cliente_ids
+        if cliente_id not in com_certificado
+    ]
+    Certificado.objects.bulk_create(certificados, batch_size=tamanho_lote)
+    resultado.certificados_criados = len(certificados)
+    return novos
+
+
+def importar_participantes(agendamento, linhas, empresa_padrao='', tamanho_lote=TAMANHO_LOTE) -> ResultadoImportacao:
+    """
+    Inscreve no agendamento os participantes de `linhas` (ver
+    ler_participantes), criando Cliente, Inscrição e Certificado em lote.
+    Clientes já cadastrados (mesmo CPF) são reaproveitados sem alteração.
+    Se uma inscrição pública gravar o mesmo aluno durante a importação, o
+    bulk insert viola uma constraint: a transação é refeita com os dados
+    relidos e, se falhar de novo, vira ValidationError.
+    """
+    resultado = ResultadoImportacao()
+    validos = {}
+
+    for numero, dados in linhas:
+        resultado.linhas += 1
+        try:
+            participante = _validar_linha(dados, empresa_padrao)
+        except ValidationError as exc:
+            resultado.invalidos.append((numero, '; '.join(exc.messages)))
+            continue
+        if participante['cpf'] in validos:
+            resultado.duplicados.append((numero, participante['cpf']))
+            continue
+        validos[participante['cpf']] = participante
+
+    for tentativa in range(1, TENTATIVAS_GRAVACAO + 1):
+        try:
+            with transaction.atomic():
+                novos = _gravar(agendamento, validos, resultado, tamanho_lote)
+            break
+        except IntegrityError as exc:
+            if tentativa == TENTATIVAS_GRAVACAO:
+                raise ValidationError(
+                    'Alguns participantes foram cadastrados por outro usuário durante a importação. '
+                    'Importe o arquivo novamente.'
+                ) from exc
+
+    # bulk_create não dispara post_save; limpa respostas "não encontrado" da API de CPF
+    invalidar_cache_cpfs(novo['cpf'] for novo in novos)
+    return resultado
@@ -0,0 +1,82 @@
+"""
+Benchmarks do fluxo de certificados num banco de teste descartável.
+Execute com: DJANGO_SETTINGS_MODULE=project.settings_local python manage.py bench --saida bench.json
+
+Os resultados (JSON) incluem o commit atual, para comparar execuções entre commits.
+"""
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from certificados.benchmark import CASOS, gerar_dados_sinteticos
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Mede PDF (em série e em threads), QR code, questionário, dashboards e API de CPF e grava os resultados em JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('casos', nargs='*', help=f"Casos a executar (padrão: {', '.join(CASOS)})")
+        parser.add_argument('--respostas', type=int, default=10000, help='Respostas de questionário geradas')
+        parser.add_argument('--repeticoes', type=int, help='Repetições por caso (padrão de cada caso)')
+        parser.add_argument('--saida', help='Arquivo JSON de saída (padrão: stdout)')
+
+    def handle(self, *args, **options):
+        casos = options['casos'] or list(CASOS)
+        desconhecidos = set(casos) - set(CASOS)
+        if desconhecidos:
+            raise CommandError(f"Caso(s) desconhecido(s): {', '.join(sorted(desconhecidos))}")
+        if connection.vendor != 'sqlite':
+            raise CommandError('O bench roda sobre SQLite: use DJANGO_SETTINGS_MODULE=project.settings_local')
+
+        setup_test_environment()
+        nome_original = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            inicio = time.perf_counter()
+            dados = gerar_dados_sinteticos(respostas=options['respostas'])
+            geracao = time.perf_counter() - inicio
+            self.stderr.write(f'Dados gerados em {geracao:.1f}s')
+
+            resultados = {}
+            for caso in casos:
+                kwargs = {'repeticoes': options['repeticoes']} if options['repeticoes'] else {}
+                self.stderr.write(f'Executando {caso}...')
+                resultados[caso] = CASOS[caso](dados, **kwargs)
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            teardown_test_environment()
+
+        relatorio = {
+            'commit': _commit_atual(),
+            'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'django': django.get_version(),
+            'plataforma': platform.platform(),
+            'respostas': options['respostas'],
+            'geracao_dados_s': round(geracao, 2),
+            'resultados': resultados,
+        }
+        texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(texto + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Resultados gravados em {options['saida']}"))
+        else:
+            self.stdout.write(texto)
@@ -0,0 +1,57 @@
+"""
+Importa uma lista de participantes (CSV/XLSX) para um agendamento.
+Execute com: python manage.py importar_participantes <agendamento_id> lista.xlsx
+"""
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from certificados.importacao import TAMANHO_LOTE, importar_participantes, ler_participantes
+from certificados.models import CursoAgendamento
+
+
+class Command(BaseCommand):
+    help = 'Importa participantes de um CSV/XLSX para um agendamento de curso'
+
+    def add_arguments(self, parser):
+        parser.add_argument('agendamento', help='UUID do agendamento')
+        parser.add_argument('arquivo', help='Caminho do arquivo .csv ou .xlsx')
+        parser.add_argument('--empresa', default='', help='Empresa para linhas sem a coluna Empresa')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Codificação do CSV (ex.: cp1252)')
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help='Tamanho dos lotes de bulk_create')
+
+    def handle(self, *args, **options):
+        try:
+            agendamento = CursoAgendamento.objects.select_related('curso').get(pk=options['agendamento'])
+        except (CursoAgendamento.DoesNotExist, ValidationError):
+            raise CommandError(f"Agendamento {options['agendamento']} não encontrado")
+
+        inicio = time.perf_counter()
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                resultado = importar_participantes(
+                    agendamento,
+                    ler_participantes(arquivo, options['arquivo'], encoding=options['encoding']),
+                    empresa_padrao=options['empresa'],
+                    tamanho_lote=options['lote'],
+                )
+        except (OSError, UnicodeDecodeError) as exc:
+            raise CommandError(str(exc))
+        except ValidationError as exc:
+            raise CommandError('; '.join(exc.messages))
+        duracao = time.perf_counter() - inicio
+
+        for linha, motivo in resultado.invalidos:
+            self.stdout.write(self.style.WARNING(f'Linha {linha}: {motivo}'))
+        for linha, cpf in resultado.duplicados:
+            self.stdout.write(self.style.WARNING(f'Linha {linha}: CPF {cpf} repetido no arquivo'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.linhas} linha(s) em {duracao:.2f}s: '
+            f'{resultado.clientes_criados} aluno(s) novo(s), '
+            f'{resultado.clientes_existentes} já cadastrado(s), '
+            f'{resultado.inscricoes_criadas} inscrição(ões), '
+            f'{resultado.certificados_criados} certificado(s), '
+            f'{len(resultado.invalidos)} inválida(s), {len(resultado.duplicados)} repetida(s)'
+        ))
@@ -0,0 +1,65 @@
+"""
+Relatório e mescla de alunos com o mesmo CPF (ver certificados.duplicados).
+A migração 0015 (CPF único) só roda depois que não houver mais repetidos.
+
+    python manage.py mesclar_clientes_duplicados             # só o relatório
+    python manage.py mesclar_clientes_duplicados --aplicar   # mescla os grupos sem conflito
+    python manage.py mesclar_clientes_duplicados --aplicar --cpf 123.456.789-09 --aceitar-nomes-diferentes
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from certificados.duplicados import analisar_grupo, cpfs_duplicados, mesclar_grupo
+
+
+class Command(BaseCommand):
+    help = 'Lista (e com --aplicar mescla) alunos cadastrados mais de uma vez com o mesmo CPF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aplicar', action='store_true', help='Mescla os grupos sem conflito (padrão: só relatório)')
+        parser.add_argument('--cpf', action='append', default=[], help='Restringe a este CPF (pode repetir)')
+        parser.add_argument('--aceitar-nomes-diferentes', action='store_true',
+                            help='Mescla mesmo com nomes diferentes (exige --cpf, após conferir o relatório)')
+
+    def handle(self, *args, **options):
+        if options['aceitar_nomes_diferentes'] and not options['cpf']:
+            raise CommandError('--aceitar-nomes-diferentes exige --cpf')
+
+        mesclados = revisao = 0
+        cpfs = cpfs_duplicados(options['cpf'])
+        for cpf in cpfs:
+            if options['aplicar']:
+                grupo = mesclar_grupo(cpf, options['aceitar_nomes_diferentes'])
+            else:
+                grupo = analisar_grupo(cpf, options['aceitar_nomes_diferentes'])
+            self._relatar(grupo)
+            if grupo.mesclado:
+                mesclados += 1
+            elif not grupo.mesclavel:
+                revisao += 1
+
+        resumo = f'{len(cpfs)} CPF(s) repetido(s), {revisao} para revisão manual'
+        if options['aplicar']:
+            self.stdout.write(self.style.SUCCESS(f'{resumo}, {mesclados} mesclado(s)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{resumo}. Nada foi alterado (use --aplicar)'))
+
+    def _relatar(self, grupo):
+        if grupo.mesclado:
+            situacao = self.style.SUCCESS('mesclado')
+        elif grupo.mesclavel:
+            situacao = 'mesclável'
+        else:
+            situacao = self.style.WARNING('revisão manual')
+        self.stdout.write(f'CPF {grupo.cpf}: {len(grupo.clientes)} cadastro(s) - {situacao}')
+        for i, cliente in enumerate(grupo.clientes):
+            papel = 'manter ' if i == 0 else 'mesclar'
+            self.stdout.write(
+                f'  {papel} #{cliente.pk} {cliente.nome} <{cliente.email}>: '
+                f'{cliente.num_certificados} certificado(s), {cliente.num_inscricoes} inscrição(ões), '
+                f'{cliente.num_respostas} resposta(s)'
+            )
+        if grupo.inscricoes_repetidas and grupo.mesclavel:
+            verbo = 'removida(s)' if grupo.mesclado else 'a remover'
+            self.stdout.write(f'  {grupo.inscricoes_repetidas} inscrição(ões) repetida(s) no mesmo agendamento {verbo}')
+        for conflito in grupo.conflitos:
+            self.stdout.write(self.style.WARNING(f'  {conflito}'))
@@ -0,0 +1,66 @@
+"""
+Reenvia os certificados com questionário respondido e e-mail não entregue
+(falha no envio ou processo interrompido). Feito para cron/systemd timer.
+Execute com: python manage.py reenviar_certificados_pendentes --horas 72
+
+Envios falhos esperam o backoff (CERTIFICADOS_ENVIO_BACKOFF, ou o
+Retry-After do provedor se for maior) antes de uma nova tentativa. No
+primeiro limite de taxa (429/503 no Graph, 421/451 no SMTP) a varredura
+para sem repetir a requisição: o envio fica "falhou" e o restante fica para
+a próxima execução.
+"""
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from certificados.envios import certificados_pendentes, reenviar_pendentes
+from certificados.renderizacao import PoolRenderizacao
+
+
+class Command(BaseCommand):
+    help = 'Reenvia certificados de questionários respondidos cujo e-mail não foi entregue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=72, help='Considera questionários respondidos nas últimas N horas')
+        parser.add_argument('--lote', type=int, default=50, help='Certificados renderizados e enviados por lote')
+        parser.add_argument('--concorrencia', type=int, default=4, help='Envios simultâneos')
+        parser.add_argument('--max-tentativas', type=int, default=8, help='Desiste de um envio após N tentativas')
+        parser.add_argument('--processos', type=int, default=None,
+                            help='Processos de renderização dos PDFs (padrão: um por CPU; 0 = no próprio processo)')
+        parser.add_argument('--simular', action='store_true', help='Só conta os certificados pendentes')
+
+    def handle(self, *args, **options):
+        for opcao in ('horas', 'lote', 'concorrencia', 'max_tentativas'):
+            if options[opcao] < 1:
+                raise CommandError(f"--{opcao.replace('_', '-')} deve ser maior que zero")
+
+        if options['simular']:
+            total = certificados_pendentes(options['horas'], options['max_tentativas']).count()
+            self.stdout.write(f'{total} certificado(s) pendente(s)')
+            return
+
+        if options['processos'] is not None and options['processos'] < 0:
+            raise CommandError('--processos não pode ser negativo')
+        # O pool só sobe processos no primeiro lote com PDFs a renderizar
+        pool = PoolRenderizacao(options['processos']) if options['processos'] != 0 else None
+
+        inicio = time.perf_counter()
+        with pool or nullcontext():
+            resultado = reenviar_pendentes(
+                horas=options['horas'],
+                tamanho_lote=options['lote'],
+                concorrencia=options['concorrencia'],
+                max_tentativas=options['max_tentativas'],
+                pool=pool,
+            )
+        duracao = time.perf_counter() - inicio
+
+        if resultado.limite is not None:
+            espera = f' (Retry-After: {resultado.limite.espera:.0f}s)' if resultado.limite.espera else ''
+            self.stdout.write(self.style.WARNING(f'Interrompido por limite do provedor{espera}: {resultado.limite}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.pendentes} pendente(s) encontrado(s) em {duracao:.2f}s: '
+            f'{resultado.enviados} enviado(s), {resultado.falhas} falha(s), '
+            f'{resultado.ignorados} já em andamento'
+        ))
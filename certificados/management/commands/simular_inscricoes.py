@@ -0,0 +1,121 @@
+"""
+Simula a chegada simultânea de uma turma no formulário público de inscrição,
+num banco de teste descartável (como o bench): nada é gravado no banco
+configurado.
+Execute com: python manage.py simular_inscricoes --alunos 200 --concorrencia 20
+
+Obs.: no SQLite (settings_local) só um escritor por vez é permitido; com
+concorrência > 1 parte dos envios falha com "database is locked". Para medir
+contenção real, rode contra o SQL Server (o banco test_<nome> é criado e
+apagado no mesmo servidor).
+"""
+import logging
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from certificados.models import Curso, CursoAgendamento
+
+
+def _percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def _cpf_aleatorio():
+    # Com dígitos verificadores válidos: o formulário recusa os outros
+    cpf = [random.randint(0, 9) for _ in range(9)]
+    for tamanho in (9, 10):
+        soma = sum(d * peso for d, peso in zip(cpf, range(tamanho + 1, 1, -1)))
+        cpf.append(soma * 10 % 11 % 10)
+    return ''.join(map(str, cpf))
+
+
+class Command(BaseCommand):
+    help = 'Load test: rajada de inscrições concorrentes para o mesmo agendamento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alunos', type=int, default=100)
+        parser.add_argument('--concorrencia', type=int, default=10)
+        parser.add_argument('--reenvios', type=float, default=0.1,
+                            help='Fração de alunos que enviam o formulário duas vezes')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        nome_original = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self._simular(options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            teardown_test_environment()
+
+    def _simular(self, options):
+        curso = Curso.objects.create(nome='Curso de teste (load test)')
+        agendamento = CursoAgendamento.objects.create(curso=curso, data=date.today())
+        url = reverse('certificados:inscricao')
+
+        cpfs = [_cpf_aleatorio() for _ in range(options['alunos'])]
+        reenvios = random.sample(cpfs, int(len(cpfs) * options['reenvios']))
+        envios = cpfs + reenvios
+        random.shuffle(envios)
+
+        def enviar(cpf):
+            client = Client(raise_request_exception=False)
+            dados = {
+                'agendamento': str(agendamento.pk),
+                'cpf': cpf,
+                'nome': f'Aluno {cpf}',
+                'email': f'{cpf}@example.com',
+                'data_nascimento': '1990-01-01',
+                'telefone': '',
+                'empresa': 'Load test',
+                'lgpd_consent': 'on',
+            }
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    inicio = time.perf_counter()
+                    response = client.post(url, dados)
+                    duracao = time.perf_counter() - inicio
+                return response.status_code, duracao, len(queries)
+            finally:
+                connection.close()
+
+        # Erros 500 são contabilizados no relatório em vez de poluir a saída
+        logger = logging.getLogger('django.request')
+        nivel_original = logger.level
+        logger.setLevel(logging.CRITICAL)
+        try:
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concorrencia']) as pool:
+                resultados = list(pool.map(enviar, envios))
+            total = time.perf_counter() - inicio
+        finally:
+            logger.setLevel(nivel_original)
+
+        ok = [r for r in resultados if r[0] == 302]
+        falhas = len(resultados) - len(ok)
+        latencias = sorted(r[1] * 1000 for r in ok) or [0]
+        queries = [r[2] for r in ok] or [0]
+
+        self.stdout.write(f'Envios: {len(resultados)} ({len(reenvios)} reenvios) em {total:.2f}s '
+                          f'-> {len(resultados) / total:.1f} inscrições/s')
+        self.stdout.write(f'Latência (ms): p50={statistics.median(latencias):.1f} '
+                          f'p95={_percentil(latencias, 0.95):.1f} '
+                          f'max={latencias[-1]:.1f}')
+        self.stdout.write(f'Queries por inscrição: média={statistics.mean(queries):.1f} max={max(queries)}')
+
+        inscritos = agendamento.inscricoes.filter(cliente__cpf__in=cpfs).count()
+        certificados = agendamento.certificados.filter(cliente__cpf__in=cpfs).count()
+        consistente = inscritos == certificados == len(set(cpfs))
+        estilo = self.style.SUCCESS if consistente and not falhas else self.style.ERROR
+        self.stdout.write(estilo(f'Inscrições: {inscritos}, certificados: {certificados}, '
+                                 f'alunos distintos: {len(set(cpfs))}, falhas: {falhas}'))
+
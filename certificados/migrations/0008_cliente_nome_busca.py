@@ -0,0 +1,42 @@
+# Generated by Django 4.2.15 on 2026-10-19 16:08
+
+from django.db import migrations, models
+import unicodedata
+
+
+def preencher_nome_busca(apps, schema_editor):
+    Cliente = apps.get_model('certificados', 'Cliente')
+    lote = []
+    for cliente in Cliente.objects.only('id', 'nome').iterator(chunk_size=2000):
+        sem_acento = unicodedata.normalize('NFKD', cliente.nome or '').encode('ascii', 'ignore').decode()
+        cliente.nome_busca = ' '.join(sem_acento.lower().split())
+        lote.append(cliente)
+        if len(lote) >= 2000:
+            Cliente.objects.bulk_update(lote, ['nome_busca'])
+            lote = []
+    if lote:
+        Cliente.objects.bulk_update(lote, ['nome_busca'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificados', '0007_instrutor_alter_itemrespostausuario_pergunta_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='nome_busca',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='Nome normalizado'),
+        ),
+        migrations.RunPython(preencher_nome_busca, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['nome_busca', 'id'], name='cliente_nome_busca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['cpf', 'id'], name='cliente_cpf_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.15 on 2026-10-19 16:34
+
+import certificados.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificados', '0008_cliente_nome_busca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModeloCertificado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=200, verbose_name='Nome')),
+                ('imagem_fundo', models.CharField(default='certificados/img/certificado_base.png', help_text='Caminho do arquivo estático, ex.: certificados/img/certificado_base_3.png', max_length=255, verbose_name='Imagem de fundo')),
+                ('blocos', models.JSONField(default=certificados.models.blocos_padrao, verbose_name='Blocos de texto')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Modelo de certificado',
+                'verbose_name_plural': 'Modelos de certificado',
+            },
+        ),
+        migrations.AddField(
+            model_name='curso',
+            name='modelo_certificado',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cursos', to='certificados.modelocertificado', verbose_name='Modelo de certificado'),
+        ),
+    ]
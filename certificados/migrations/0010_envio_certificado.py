@@ -0,0 +1,37 @@
+# Generated by Django 4.2.15 on 2026-10-19 16:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificados', '0009_modelo_certificado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnvioCertificado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave_idempotencia', models.CharField(max_length=100, unique=True, verbose_name='Chave de idempotência')),
+                ('transporte', models.CharField(blank=True, max_length=100, verbose_name='Transporte')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('enviando', 'Enviando'), ('enviado', 'Enviado'), ('falhou', 'Falhou')], default='pendente', max_length=10, verbose_name='Status')),
+                ('tentativas', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('latencia_ms', models.PositiveIntegerField(blank=True, null=True, verbose_name='Latência (ms)')),
+                ('id_mensagem_provedor', models.CharField(blank=True, max_length=255, verbose_name='ID da mensagem no provedor')),
+                ('erro', models.TextField(blank=True, verbose_name='Último erro')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('enviado_em', models.DateTimeField(blank=True, null=True, verbose_name='Enviado em')),
+                ('certificado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='envios', to='certificados.certificado', verbose_name='Certificado')),
+            ],
+            options={
+                'verbose_name': 'Envio de certificado',
+                'verbose_name_plural': 'Envios de certificado',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['status', 'atualizado_em'], name='envio_status_atualizado_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.15 on 2026-10-19 16:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificados', '0010_envio_certificado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enviocertificado',
+            name='proxima_tentativa',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Próxima tentativa'),
+        ),
+    ]
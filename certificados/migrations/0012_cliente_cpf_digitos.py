@@ -0,0 +1,36 @@
+# Generated by Django 4.2.15 on 2026-10-19 17:02
+
+from django.db import migrations, models
+
+
+def _somente_digitos(valor):
+    return ''.join(ch for ch in (valor or '') if ch.isdigit())
+
+
+def preencher_cpf_digitos(apps, schema_editor):
+    Cliente = apps.get_model('certificados', 'Cliente')
+    lote = []
+    for cliente in Cliente.objects.only('id', 'cpf').iterator(chunk_size=2000):
+        cliente.cpf_digitos = _somente_digitos(cliente.cpf)
+        lote.append(cliente)
+        if len(lote) >= 2000:
+            Cliente.objects.bulk_update(lote, ['cpf_digitos'])
+            lote = []
+    if lote:
+        Cliente.objects.bulk_update(lote, ['cpf_digitos'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificados', '0011_envio_proxima_tentativa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='cpf_digitos',
+            field=models.CharField(blank=True, editable=False, max_length=14, verbose_name='CPF (somente dígitos)'),
+        ),
+        migrations.RunPython(preencher_cpf_digitos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.15 on 2026-10-19 17:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificados', '0012_cliente_cpf_digitos'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='cliente',
+            name='cliente_cpf_idx',
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['cpf_digitos', 'id'], name='cliente_cpf_digitos_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.15 on 2026-10-19 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificados', '0013_cliente_cpf_digitos_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='respostausuario',
+            index=models.Index(fields=['respondido_em', 'certificado'], name='resposta_respondido_cert_idx'),
+        ),
+    ]
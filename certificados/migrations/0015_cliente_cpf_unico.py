@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def verificar_duplicados(apps, schema_editor):
+    """A constraint não pode ser criada com CPFs repetidos: a mescla é revisada por um operador."""
+    Cliente = apps.get_model('certificados', 'Cliente')
+    repetidos = (
+        Cliente.objects.exclude(cpf_digitos='')
+        .values('cpf_digitos')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .count()
+    )
+    if repetidos:
+        raise RuntimeError(
+            f'{repetidos} CPF(s) com mais de um aluno. Revise com '
+            f'"python manage.py mesclar_clientes_duplicados", aplique com --aplicar '
+            f'(e corrija no admin os grupos que pedem revisão manual) e rode o migrate de novo.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificados', '0014_resposta_respondido_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cliente',
+            constraint=models.UniqueConstraint(condition=models.Q(('cpf_digitos', ''), _negated=True), fields=('cpf_digitos',), name='uniq_cliente_cpf_digitos'),
+        ),
+    ]
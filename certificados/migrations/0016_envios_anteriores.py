@@ -0,0 +1,58 @@
+from django.db import migrations
+from django.db.models import Min
+
+# Marca as linhas criadas aqui (e desfeitas na reversão)
+TRANSPORTE_LEGADO = 'legado'
+
+
+def _chave(certificado):
+    # Mesma chave de certificados.envios.chave_envio (reenvio 0)
+    modelo = certificado.curso.modelo_certificado
+    versao = 'padrao' if modelo is None else f'{modelo.pk}@{modelo.atualizado_em:%Y%m%d%H%M%S}'
+    return f'{certificado.pk}:{versao}'
+
+
+def registrar_envios_anteriores(apps, schema_editor):
+    """
+    Certificados com questionário respondido antes de EnvioCertificado já
+    foram enviados pelo código antigo: sem uma linha "enviado", o
+    reenviar_certificados_pendentes os mandaria de novo.
+    """
+    Certificado = apps.get_model('certificados', 'Certificado')
+    EnvioCertificado = apps.get_model('certificados', 'EnvioCertificado')
+    certificados = (
+        Certificado.objects.filter(respostas_questionario__isnull=False, envios__isnull=True)
+        .annotate(respondido_em=Min('respostas_questionario__respondido_em'))
+        .select_related('curso__modelo_certificado')
+        .order_by('pk')
+    )
+    lote = []
+    for certificado in certificados.iterator(chunk_size=2000):
+        lote.append(EnvioCertificado(
+            certificado_id=certificado.pk,
+            chave_idempotencia=_chave(certificado),
+            transporte=TRANSPORTE_LEGADO,
+            status='enviado',
+            enviado_em=certificado.respondido_em,
+        ))
+        if len(lote) >= 2000:
+            EnvioCertificado.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        EnvioCertificado.objects.bulk_create(lote)
+
+
+def remover_envios_anteriores(apps, schema_editor):
+    EnvioCertificado = apps.get_model('certificados', 'EnvioCertificado')
+    EnvioCertificado.objects.filter(transporte=TRANSPORTE_LEGADO).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificados', '0015_cliente_cpf_unico'),
+    ]
+
+    operations = [
+        migrations.RunPython(registrar_envios_anteriores, remover_envios_anteriores),
+    ]
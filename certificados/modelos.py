@@ -0,0 +1,403 @@
+"""
+Planos de renderização dos modelos de certificado.
+
+Um ModeloCertificado (fundo + blocos de texto) é compilado uma vez num
+PlanoRender: fontes resolvidas/registradas, cores convertidas, posição dos
+textos fixos já medida e a imagem de fundo já convertida em XObject PDF
+(decodificar e comprimir o PNG era a parte cara de cada certificado). O
+plano fica em cache por (modelo, atualizado_em); renderizar um certificado
+é só desenhar o fundo pronto e preencher os textos variáveis.
+
+Com CERTIFICADOS_PDF_OTIMIZADO (desligado por padrão: o JPEG tem perdas),
+o fundo é reduzido a CERTIFICADOS_PDF_DPI e gravado em JPEG ou Flate, o que
+for menor, sem ASCII85; fontes TrueType são sempre embutidas como
+subconjunto (só os glifos usados) pelo próprio ReportLab.
+
+Textos que não cabem na largura do bloco são reduzidos (até
+tamanho_minimo) e, se o bloco permitir mais de uma linha, quebrados; ver
+ajustar_texto.
+"""
+import copy
+import dataclasses
+import hashlib
+import math
+import string
+import threading
+import zlib
+from dataclasses import dataclass
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from PIL import Image
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfdoc, pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+FUNDO_PADRAO = 'certificados/img/certificado_base.png'
+COR_PADRAO = '#13375f'
+CAMPOS = {'nome', 'curso', 'carga', 'data', 'data_extenso', 'codigo'}
+ALINHAMENTOS = {'centro', 'esquerda', 'direita'}
+MARGEM = 56  # pontos livres nas bordas da página
+PASSO_TAMANHO = 0.5
+ENTRELINHA = 1.2
+# Somar as larguras palavra a palavra erra no último bit em relação à medida
+# da linha inteira: sem folga, um texto do tamanho exato do bloco não caberia
+FOLGA_LARGURA = 1e-6
+
+# Tabela fixa em vez de locale.setlocale + %B: setlocale altera o processo
+# inteiro e não é seguro com renderização em threads
+MESES = (
+    'janeiro', 'fevereiro', 'março', 'abril', 'maio', 'junho',
+    'julho', 'agosto', 'setembro', 'outubro', 'novembro', 'dezembro',
+)
+
+# Layout histórico (coordenadas em pontos, origem no canto inferior esquerdo)
+BLOCOS_PADRAO = [
+    {'texto': '{nome}', 'y': 330, 'fonte': 'Helvetica-Bold', 'tamanho': 34, 'tamanho_minimo': 16},
+    {'texto': 'Participou do Workshop {curso}', 'y': 290, 'fonte': 'Helvetica', 'tamanho': 18},
+    {'texto': 'com carga horária de {carga} horas, realizado pela Lean Way Consulting', 'y': 266,
+     'fonte': 'Helvetica', 'tamanho': 18},
+    {'texto': '{data}', 'y': 226, 'fonte': 'Helvetica', 'tamanho': 14},
+]
+
+
+@dataclass(frozen=True)
+class BlocoCompilado:
+    texto: str
+    campos: frozenset
+    x: float
+    y: float
+    alinhamento: str
+    fonte: str
+    tamanho: float
+    tamanho_minimo: float
+    largura: float
+    linhas: int
+    cor: colors.Color
+    # Para textos sem campos: (tamanho, ((x, y, linha), ...)) já ajustados
+    fixo: tuple = None
+
+
+@dataclass(frozen=True)
+class FundoCompilado:
+    nome: str
+    xobject: pdfdoc.PDFImageXObject
+    smask: object
+
+
+@dataclass(frozen=True)
+class PlanoRender:
+    largura: float
+    altura: float
+    fundo: FundoCompilado
+    blocos: tuple
+
+
+def caminho_estatico(nome):
+    # O nome vem do admin (ModeloCertificado): nada de caminhos absolutos ou com ..
+    partes = PurePosixPath(nome.replace('\\', '/')).parts
+    if not partes or partes[0] == '/' or '..' in partes or ':' in partes[0]:
+        raise ValueError(f'Caminho inválido para arquivo estático: {nome}')
+    caminho = finders.find(nome)
+    if not caminho:
+        # Instalação sem finders configurados: procura dentro do app
+        raiz = Path(__file__).resolve().parent / 'static'
+        candidato = (raiz / nome).resolve()
+        caminho = str(candidato) if candidato.is_relative_to(raiz) and candidato.exists() else None
+    if not caminho:
+        raise FileNotFoundError(
+            f"Template não encontrado em static: {nome}. "
+            f"Verifique se o arquivo existe e se STATICFILES está configurado."
+        )
+    return caminho
+
+
+def _resolver_fonte(bloco):
+    fonte = bloco.get('fonte', 'Helvetica')
+    if fonte not in pdfmetrics.getRegisteredFontNames():
+        arquivo = bloco.get('arquivo_fonte')
+        if arquivo:
+            pdfmetrics.registerFont(TTFont(fonte, caminho_estatico(arquivo)))
+        else:
+            try:
+                pdfmetrics.getFont(fonte)  # fontes padrão do PDF
+            except KeyError:
+                raise ValueError(f'Fonte desconhecida: {fonte} (informe "arquivo_fonte" com o .ttf)') from None
+    return fonte
+
+
+def _largura_disponivel(x, alinhamento, largura_pagina):
+    if alinhamento == 'esquerda':
+        return largura_pagina - MARGEM - x
+    if alinhamento == 'direita':
+        return x - MARGEM
+    return 2 * (min(x, largura_pagina - x) - MARGEM)
+
+
+def _compilar_bloco(bloco, largura):
+    if not isinstance(bloco, dict) or 'texto' not in bloco or 'y' not in bloco:
+        raise ValueError(f'Cada bloco precisa de "texto" e "y": {bloco!r}')
+    texto = str(bloco['texto'])
+    campos = frozenset(nome for _, nome, _, _ in string.Formatter().parse(texto) if nome)
+    desconhecidos = campos - CAMPOS
+    if desconhecidos:
+        raise ValueError(f"Campo(s) desconhecido(s) em {texto!r}: {', '.join(sorted(desconhecidos))}")
+
+    alinhamento = bloco.get('alinhamento', 'centro')
+    if alinhamento not in ALINHAMENTOS:
+        raise ValueError(f'Alinhamento inválido: {alinhamento}')
+    x = float(bloco.get('x', largura / 2 if alinhamento == 'centro' else 0))
+    fonte = _resolver_fonte(bloco)
+    tamanho = float(bloco.get('tamanho', 18))
+    tamanho_minimo = float(bloco.get('tamanho_minimo', tamanho * 0.6))
+    largura_bloco = float(bloco.get('largura', _largura_disponivel(x, alinhamento, largura)))
+    linhas = int(bloco.get('linhas', 1))
+    if not 0 < tamanho_minimo <= tamanho or largura_bloco <= 0 or linhas < 1:
+        raise ValueError(f'Bloco {texto!r}: use 0 < tamanho_minimo <= tamanho, largura > 0 e linhas >= 1')
+
+    try:
+        cor = colors.HexColor(bloco.get('cor', COR_PADRAO))
+    except ValueError:
+        raise ValueError(f"Cor inválida: {bloco.get('cor')} (use #rrggbb)") from None
+
+    compilado = BlocoCompilado(
+        texto=texto, campos=campos, x=x, y=float(bloco['y']), alinhamento=alinhamento, fonte=fonte,
+        tamanho=tamanho, tamanho_minimo=tamanho_minimo, largura=largura_bloco, linhas=linhas, cor=cor,
+    )
+    if campos:
+        return compilado
+    texto = texto.replace('{{', '{').replace('}}', '}')
+    return dataclasses.replace(compilado, texto=texto, fixo=posicionar(compilado, texto))
+
+
+@dataclass(frozen=True)
+class OpcoesSaida:
+    """Modo de saída do PDF (settings CERTIFICADOS_PDF_*)."""
+    otimizado: bool = True
+    dpi: int = 150
+    qualidade_jpeg: int = 85
+
+
+def opcoes_saida():
+    return OpcoesSaida(
+        otimizado=getattr(settings, 'CERTIFICADOS_PDF_OTIMIZADO', False),
+        dpi=getattr(settings, 'CERTIFICADOS_PDF_DPI', 150),
+        qualidade_jpeg=getattr(settings, 'CERTIFICADOS_PDF_QUALIDADE_JPEG', 85),
+    )
+
+
+def _xobject_imagem(nome, dados, espaco_cor, filtro, largura, altura):
+    # Stream gravado como está: sem o ASCII85 que o ReportLab aplica por
+    # padrão (+25% de tamanho, e o anexo ainda vai em base64 para o Graph)
+    xobject = pdfdoc.PDFImageXObject(nome)
+    xobject.width, xobject.height = largura, altura
+    xobject.bitsPerComponent = 8
+    xobject.colorSpace = espaco_cor
+    xobject.streamContent = dados
+    xobject._filters = (filtro,)
+    xobject.mask = None
+    return xobject
+
+
+def _imagem_otimizada(nome, caminho, largura_pagina, opcoes):
+    """
+    XObject do fundo reduzido a `opcoes.dpi` na largura da página e gravado
+    em JPEG (DCT) ou Flate, o que ficar menor; a transparência, se houver,
+    vira uma SMask em Flate. Devolve (xobject, smask ou None).
+    """
+    with Image.open(caminho) as original:
+        original.load()
+    imagem = original
+    largura_alvo = round(largura_pagina / 72 * opcoes.dpi)
+    if imagem.width > largura_alvo:
+        altura_alvo = round(imagem.height * largura_alvo / imagem.width)
+        imagem = imagem.resize((largura_alvo, altura_alvo), Image.LANCZOS)
+
+    smask = None
+    if imagem.mode in ('RGBA', 'LA') or (imagem.mode == 'P' and 'transparency' in imagem.info):
+        imagem = imagem.convert('RGBA')
+        alfa = imagem.getchannel('A')
+        if alfa.getextrema() != (255, 255):
+            smask = _xobject_imagem(f'{nome}m', zlib.compress(alfa.tobytes(), 9), 'DeviceGray', 'FlateDecode',
+                                    *imagem.size)
+    rgb = imagem.convert('RGB')
+
+    jpeg = BytesIO()
+    rgb.save(jpeg, 'JPEG', quality=opcoes.qualidade_jpeg, optimize=True)
+    flate = zlib.compress(rgb.tobytes(), 9)
+    if len(jpeg.getvalue()) < len(flate):
+        xobject = _xobject_imagem(nome, jpeg.getvalue(), 'DeviceRGB', 'DCTDecode', *rgb.size)
+    else:
+        xobject = _xobject_imagem(nome, flate, 'DeviceRGB', 'FlateDecode', *rgb.size)
+    return xobject, smask
+
+
+def _compilar_fundo(arquivo, largura_pagina, opcoes):
+    caminho = caminho_estatico(arquivo)
+    # Nome do XObject no PDF: só caracteres válidos, como no drawImage
+    nome = 'fundo' + hashlib.md5(arquivo.encode()).hexdigest()
+    if opcoes.otimizado:
+        xobject, smask = _imagem_otimizada(nome, caminho, largura_pagina, opcoes)
+    else:
+        xobject = pdfdoc.PDFImageXObject(nome, ImageReader(caminho), mask='auto')
+        smask = getattr(xobject, '_smask', None)
+        if smask is not None:
+            del xobject._smask
+    xobject.name = nome
+    if smask is not None:
+        # O nome registrado da máscara é o mesmo em todo documento
+        xobject.smask = pdfdoc.PDFObjectReference(pdfdoc.PDFDocument().getXObjectName(smask.name))
+    return FundoCompilado(nome=nome, xobject=xobject, smask=smask)
+
+
+def compilar_plano(imagem_fundo, blocos, opcoes=None):
+    largura, altura = landscape(A4)
+    if not isinstance(blocos, list) or not blocos:
+        raise ValueError('Informe ao menos um bloco de texto (lista de objetos)')
+    return PlanoRender(
+        largura=largura,
+        altura=altura,
+        fundo=_compilar_fundo(imagem_fundo or FUNDO_PADRAO, largura, opcoes or opcoes_saida()),
+        blocos=tuple(_compilar_bloco(bloco, largura) for bloco in blocos),
+    )
+
+
+def data_por_extenso(data):
+    """Ex.: 4 de março de 2025."""
+    return f'{data.day} de {MESES[data.month - 1]} de {data.year}'
+
+
+@lru_cache(maxsize=8192)
+def largura_texto(texto, fonte, tamanho):
+    """pdfmetrics.stringWidth memoizado; chamado por palavra, então as
+    palavras fixas dos modelos são medidas uma vez por tamanho."""
+    return pdfmetrics.stringWidth(texto, fonte, tamanho)
+
+
+def _quebrar(palavras, fonte, tamanho, largura, max_linhas):
+    """Linhas [(texto, largura)] da quebra gulosa; com max_linhas = 1, uma só linha."""
+    espaco = largura_texto(' ', fonte, tamanho)
+    linhas, atual, ocupado = [], [], 0.0
+    for palavra in palavras:
+        medida = largura_texto(palavra, fonte, tamanho)
+        if atual and max_linhas > 1 and ocupado + espaco + medida > largura + FOLGA_LARGURA:
+            linhas.append((' '.join(atual), ocupado))
+            atual, ocupado = [], 0.0
+        ocupado += medida + (espaco if atual else 0)
+        atual.append(palavra)
+    if atual:
+        linhas.append((' '.join(atual), ocupado))
+    return linhas
+
+
+def ajustar_texto(texto, fonte, tamanho, largura, tamanho_minimo=None, max_linhas=1):
+    """
+    Maior tamanho entre tamanho_minimo e `tamanho` (passos de PASSO_TAMANHO)
+    em que `texto` cabe em `largura` com até `max_linhas` linhas, por busca
+    binária. Devolve (tamanho, [(linha, largura_linha), ...]); se nem o
+    mínimo couber, fica no mínimo.
+    """
+    palavras = texto.split()
+
+    def tentar(t):
+        linhas = _quebrar(palavras, fonte, t, largura, max_linhas)
+        return linhas, len(linhas) <= max_linhas and all(medida <= largura + FOLGA_LARGURA for _, medida in linhas)
+
+    linhas, cabe = tentar(tamanho)
+    minimo = tamanho_minimo or tamanho
+    if cabe or minimo >= tamanho:
+        return tamanho, linhas
+    linhas_minimo, cabe = tentar(minimo)
+    if not cabe:
+        return minimo, linhas_minimo
+
+    # Invariante: minimo + baixo * passo cabe, minimo + alto * passo não
+    baixo, alto = 0, max(1, math.ceil((tamanho - minimo) / PASSO_TAMANHO))
+    melhor = linhas_minimo
+    while alto - baixo > 1:
+        meio = (baixo + alto) // 2
+        linhas, cabe = tentar(minimo + meio * PASSO_TAMANHO)
+        if cabe:
+            baixo, melhor = meio, linhas
+        else:
+            alto = meio
+    return minimo + baixo * PASSO_TAMANHO, melhor
+
+
+def posicionar(bloco, texto):
+    """(tamanho, ((x, y, linha), ...)) de `texto` ajustado ao bloco."""
+    tamanho, linhas = ajustar_texto(texto, bloco.fonte, bloco.tamanho, bloco.largura, bloco.tamanho_minimo, bloco.linhas)
+    posicoes = []
+    for i, (linha, medida) in enumerate(linhas):
+        if bloco.alinhamento == 'esquerda':
+            x = bloco.x
+        elif bloco.alinhamento == 'centro':
+            x = bloco.x - medida / 2
+        else:
+            x = bloco.x - medida
+        posicoes.append((x, bloco.y - i * tamanho * ENTRELINHA, linha))
+    return tamanho, tuple(posicoes)
+
+
+_planos = {}
+_lock = threading.Lock()
+
+
+def plano_para(modelo=None):
+    """Plano compilado do modelo (ou do layout padrão), em cache no processo."""
+    opcoes = opcoes_saida()
+    if modelo is None:
+        chave = (None, None, opcoes)
+    else:
+        chave = (modelo.pk, modelo.atualizado_em, opcoes)
+    plano = _planos.get(chave)
+    if plano is None:
+        with _lock:
+            plano = _planos.get(chave)
+            if plano is None:
+                if modelo is None:
+                    plano = compilar_plano(FUNDO_PADRAO, BLOCOS_PADRAO, opcoes)
+                else:
+                    plano = compilar_plano(modelo.imagem_fundo, modelo.blocos, opcoes)
+                # Versões anteriores do mesmo modelo (ou outro modo de saída) não servem mais
+                for antiga in [k for k in _planos if k[0] == chave[0]]:
+                    del _planos[antiga]
+                _planos[chave] = plano
+    return plano
+
+
+def _desenhar_fundo(c, plano):
+    # Equivale a canvas.drawImage, mas reaproveita o XObject já comprimido
+    fundo = plano.fundo
+    doc = c._doc
+    registro = doc.getXObjectName(fundo.nome)
+    if doc.idToObject.get(registro) is None:
+        # O documento marca o objeto ao registrá-lo: cada PDF recebe uma cópia
+        # rasa, que compartilha o stream já comprimido
+        xobject = copy.copy(fundo.xobject)
+        doc.Reference(xobject, registro)
+        doc.addForm(fundo.nome, xobject)
+        if fundo.smask is not None:
+            doc.Reference(copy.copy(fundo.smask), doc.getXObjectName(fundo.smask.name))
+    c._currentPageHasImages = 1
+    c.saveState()
+    c.scale(plano.largura, plano.altura)
+    c._code.append(f'/{registro} Do')
+    c.restoreState()
+    c._formsinuse.append(fundo.nome)
+
+
+def desenhar(c, plano, valores):
+    """Desenha fundo e textos de `plano` no canvas, com `valores` para os campos."""
+    _desenhar_fundo(c, plano)
+    for bloco in plano.blocos:
+        tamanho, linhas = bloco.fixo or posicionar(bloco, bloco.texto.format(**valores))
+        c.setFillColor(bloco.cor)
+        c.setFont(bloco.fonte, tamanho)
+        for x, y, linha in linhas:
+            c.drawString(x, y, linha)
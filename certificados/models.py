@@ -1,11 +1,23 @@
 from django.db import models
 from django.utils import timezone
+import unicodedata
 import uuid
 
+from core.services import somente_digitos
+
+
+def normalizar_busca(texto) -> str:
+    """Minúsculas, sem acentos e com espaços simples (chave de busca por prefixo)"""
+    sem_acento = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode()
+    return ' '.join(sem_acento.lower().split())
+
 
 class Cliente(models.Model):
     cpf = models.CharField('CPF', max_length=14)
     nome = models.CharField('Nome', max_length=200)
+    nome_busca = models.CharField('Nome normalizado', max_length=200, blank=True, editable=False)
+    # CPF sem máscara: chave única do aluno (o campo cpf guarda o que foi digitado)
+    cpf_digitos = models.CharField('CPF (somente dígitos)', max_length=14, blank=True, editable=False)
     email = models.EmailField('E-mail', max_length=254)
     data_nascimento = models.DateField('Data de nascimento')
     telefone = models.CharField('Telefone', max_length=20, blank=True)
@@ -15,15 +27,77 @@ class Cliente(models.Model):
     class Meta:
         verbose_name = 'Cliente'
         verbose_name_plural = 'Clientes'
+        indexes = [
+            # Autocomplete: busca por prefixo + paginação por (chave, id)
+            models.Index(fields=['nome_busca', 'id'], name='cliente_nome_busca_idx'),
+            models.Index(fields=['cpf_digitos', 'id'], name='cliente_cpf_digitos_idx'),
+        ]
+        constraints = [
+            # Dois envios simultâneos da inscrição não criam alunos duplicados
+            models.UniqueConstraint(fields=['cpf_digitos'], condition=~models.Q(cpf_digitos=''),
+                                    name='uniq_cliente_cpf_digitos'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.nome} ({self.cpf})"
 
+    def save(self, *args, **kwargs):
+        self.nome_busca = normalizar_busca(self.nome)
+        self.cpf_digitos = somente_digitos(self.cpf)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            derivados = {'nome': 'nome_busca', 'cpf': 'cpf_digitos'}
+            kwargs['update_fields'] = {*update_fields, *(derivados[c] for c in update_fields if c in derivados)}
+        super().save(*args, **kwargs)
+
+
+def blocos_padrao():
+    from .modelos import BLOCOS_PADRAO
+
+    return [dict(bloco) for bloco in BLOCOS_PADRAO]
+
+
+class ModeloCertificado(models.Model):
+    """
+    Layout do PDF: imagem de fundo (arquivo estático) e blocos de texto.
+    Cada bloco é um dict {"texto", "y", "x"?, "alinhamento"?, "fonte"?,
+    "tamanho"?, "tamanho_minimo"?, "largura"?, "linhas"?, "cor"?,
+    "arquivo_fonte"?}; o texto aceita {nome}, {curso}, {carga}, {data},
+    {data_extenso} e {codigo}. Ver certificados.modelos.
+    """
+    nome = models.CharField('Nome', max_length=200)
+    imagem_fundo = models.CharField(
+        'Imagem de fundo', max_length=255, default='certificados/img/certificado_base.png',
+        help_text='Caminho do arquivo estático, ex.: certificados/img/certificado_base_3.png',
+    )
+    blocos = models.JSONField('Blocos de texto', default=blocos_padrao)
+    atualizado_em = models.DateTimeField('Atualizado em', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Modelo de certificado'
+        verbose_name_plural = 'Modelos de certificado'
+
+    def __str__(self) -> str:
+        return self.nome
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .modelos import compilar_plano
+
+        try:
+            compilar_plano(self.imagem_fundo, self.blocos)
+        except (ValueError, KeyError, TypeError, OSError) as exc:
+            raise ValidationError(str(exc))
+
 
 class Curso(models.Model):
     nome = models.CharField('Nome do curso', max_length=200)
     descricao = models.TextField('Descrição', blank=True)
     carga_horaria_padrao = models.PositiveIntegerField('Carga horária (horas)', null=True, blank=True)
+    modelo_certificado = models.ForeignKey(
+        ModeloCertificado, verbose_name='Modelo de certificado', on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='cursos',
+    )
 
     class Meta:
         verbose_name = 'Curso'
@@ -110,6 +184,51 @@ class Certificado(models.Model):
         return f"Certificado {self.curso} - {self.cliente}"
 
 
+class EnvioCertificado(models.Model):
+    """
+    Envio do certificado por e-mail. A chave de idempotência (certificado,
+    versão do modelo, nº do reenvio) é única: cliques repetidos e novas
+    tentativas reutilizam a mesma linha em vez de mandar outro e-mail.
+    Ver certificados.envios.
+    """
+    STATUS_PENDENTE = 'pendente'
+    STATUS_ENVIANDO = 'enviando'
+    STATUS_ENVIADO = 'enviado'
+    STATUS_FALHOU = 'falhou'
+
+    STATUS = [
+        (STATUS_PENDENTE, 'Pendente'),
+        (STATUS_ENVIANDO, 'Enviando'),
+        (STATUS_ENVIADO, 'Enviado'),
+        (STATUS_FALHOU, 'Falhou'),
+    ]
+
+    certificado = models.ForeignKey(Certificado, verbose_name='Certificado', on_delete=models.CASCADE, related_name='envios')
+    chave_idempotencia = models.CharField('Chave de idempotência', max_length=100, unique=True)
+    transporte = models.CharField('Transporte', max_length=100, blank=True)
+    status = models.CharField('Status', max_length=10, choices=STATUS, default=STATUS_PENDENTE)
+    tentativas = models.PositiveIntegerField('Tentativas', default=0)
+    latencia_ms = models.PositiveIntegerField('Latência (ms)', null=True, blank=True)
+    id_mensagem_provedor = models.CharField('ID da mensagem no provedor', max_length=255, blank=True)
+    erro = models.TextField('Último erro', blank=True)
+    criado_em = models.DateTimeField('Criado em', auto_now_add=True)
+    atualizado_em = models.DateTimeField('Atualizado em', auto_now=True)
+    enviado_em = models.DateTimeField('Enviado em', null=True, blank=True)
+    proxima_tentativa = models.DateTimeField('Próxima tentativa', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Envio de certificado'
+        verbose_name_plural = 'Envios de certificado'
+        ordering = ['-criado_em']
+        indexes = [
+            # Workers de reenvio: pendentes/falhos das últimas N horas
+            models.Index(fields=['status', 'atualizado_em'], name='envio_status_atualizado_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.certificado_id} - {self.get_status_display()}"
+
+
 class Questionario(models.Model):
     """Modelo para armazenar questionários"""
     TIPO_ESCALA = 'escala'
@@ -198,6 +317,10 @@ class RespostaUsuario(models.Model):
         verbose_name_plural = 'Respostas dos Usuários'
         ordering = ['-respondido_em']
         unique_together = ('questionario', 'cliente', 'certificado')
+        indexes = [
+            # certificados_pendentes: respostas das últimas N horas, só o certificado
+            models.Index(fields=['respondido_em', 'certificado'], name='resposta_respondido_cert_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.cliente} - {self.questionario.titulo}"
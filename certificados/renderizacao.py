@@ -0,0 +1,156 @@
+"""
+Renderização de PDFs em lote num pool de processos.
+
+O ReportLab é CPU-bound e preso ao GIL: threads não escalam. O
+PoolRenderizacao mantém N processos (spawn) que configuram o Django e
+compilam o plano padrão (fundo, fontes, layout) uma vez ao iniciar; os
+trabalhos são os dicts de services.dados_renderizacao (nada de instâncias
+de modelo nem acesso ao banco nos workers), e o retorno são os bytes do PDF
+ou o caminho do arquivo gravado pelo próprio worker.
+
+No processo web, pool_compartilhado só existe com
+CERTIFICADOS_RENDER_PROCESSOS > 0 (padrão 0: um pool por worker do gunicorn
+disputaria as CPUs com os outros workers); comandos criam o próprio
+PoolRenderizacao e o passam a gerar_pdfs. Lotes pequenos
+(< CERTIFICADOS_RENDER_MINIMO_LOTE) renderizam sempre no próprio processo.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MINIMO_LOTE_PADRAO = 4
+
+
+# Os workers importam este módulo antes do django.setup(): nada de modelos
+# (nem services) no nível do módulo.
+
+def _iniciar_worker(modulo_settings):
+    os.environ['DJANGO_SETTINGS_MODULE'] = modulo_settings
+    import django
+
+    django.setup()
+    from .modelos import plano_para
+
+    plano_para(None)
+
+
+def _renderizar(dados):
+    from .services import renderizar_pdf
+
+    return renderizar_pdf(dados)
+
+
+def _renderizar_em_arquivo(dados, diretorio):
+    caminho = Path(diretorio) / f"certificado_{dados['id']}.pdf"
+    caminho.write_bytes(_renderizar(dados))
+    return str(caminho)
+
+
+class PoolRenderizacao:
+    """Pool de processos aquecidos para renderizar certificados."""
+
+    def __init__(self, processos=None):
+        self.processos = processos or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processos,
+            # spawn: o processo web tem threads e conexões abertas, fork herdaria ambos
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_iniciar_worker,
+            initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'project.settings'),),
+        )
+
+    def _tamanho_bloco(self, total):
+        return max(1, total // (self.processos * 4))
+
+    def submeter(self, trabalho):
+        """Future com os bytes de um PDF."""
+        return self._executor.submit(_renderizar, trabalho)
+
+    def renderizar(self, trabalhos):
+        """Bytes dos PDFs, na ordem dos trabalhos."""
+        trabalhos = list(trabalhos)
+        return self._executor.map(_renderizar, trabalhos, chunksize=self._tamanho_bloco(len(trabalhos)))
+
+    def renderizar_em_arquivos(self, trabalhos, diretorio):
+        """Caminhos dos PDFs gravados em `diretorio` (evita trafegar os bytes entre processos)."""
+        trabalhos = list(trabalhos)
+        return list(self._executor.map(
+            _renderizar_em_arquivo, trabalhos, [str(diretorio)] * len(trabalhos),
+            chunksize=self._tamanho_bloco(len(trabalhos)),
+        ))
+
+    def fechar(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+_pool = None
+_lock = threading.Lock()
+
+
+def pool_compartilhado():
+    """Pool do processo (criado no primeiro uso) ou None se desativado."""
+    global _pool
+    processos = getattr(settings, 'CERTIFICADOS_RENDER_PROCESSOS', 0)
+    if not processos:
+        return None
+    with _lock:
+        if _pool is None:
+            _pool = PoolRenderizacao(processos)
+            atexit.register(_pool.fechar)
+        return _pool
+
+
+def _pool_do_lote(total, pool):
+    if total < getattr(settings, 'CERTIFICADOS_RENDER_MINIMO_LOTE', MINIMO_LOTE_PADRAO):
+        return None
+    return pool or pool_compartilhado()
+
+
+def gerar_pdfs(certificados, pool=None):
+    """
+    Pares (certificado, obter_pdf) de uma lista de certificados (com
+    cliente, curso__modelo_certificado e agendamento carregados).
+    obter_pdf() devolve os bytes ou levanta o erro daquele certificado; com
+    o pool (`pool` ou pool_compartilhado), todos já estão sendo renderizados
+    em paralelo.
+    """
+    from .services import dados_renderizacao, renderizar_pdf
+
+    certificados = list(certificados)
+    trabalhos = [dados_renderizacao(certificado) for certificado in certificados]
+    pool = _pool_do_lote(len(trabalhos), pool)
+    if pool is None:
+        return [(certificado, partial(renderizar_pdf, trabalho)) for certificado, trabalho in zip(certificados, trabalhos)]
+
+    logger.info('Renderizando %s certificado(s) em %s processo(s)', len(trabalhos), pool.processos)
+    return [(certificado, pool.submeter(trabalho).result) for certificado, trabalho in zip(certificados, trabalhos)]
+
+
+def gerar_pdfs_em_arquivos(certificados, diretorio):
+    """Pares (certificado, caminho do PDF gravado em `diretorio`)."""
+    from .services import dados_renderizacao
+
+    certificados = list(certificados)
+    trabalhos = [dados_renderizacao(certificado) for certificado in certificados]
+    pool = _pool_do_lote(len(trabalhos), None)
+    if pool is None:
+        caminhos = [_renderizar_em_arquivo(trabalho, diretorio) for trabalho in trabalhos]
+    else:
+        logger.info('Renderizando %s certificado(s) em %s processo(s)', len(trabalhos), pool.processos)
+        caminhos = pool.renderizar_em_arquivos(trabalhos, diretorio)
+    return list(zip(certificados, caminhos))
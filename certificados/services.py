@@ -1,28 +1,25 @@
 import base64
 from io import BytesIO
 from django.conf import settings
-from django.core.mail import EmailMessage
+from django.db import IntegrityError, connection, transaction
 from django.urls import reverse
 from reportlab.pdfbase import pdfmetrics
-from reportlab.lib.utils import simpleSplit
 from reportlab.pdfbase.ttfonts import TTFont
-from pathlib import Path
 
-from reportlab.lib.pagesizes import A4, landscape
 from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-from reportlab.lib import colors
-from django.contrib.staticfiles import finders
 
 import qrcode
-import requests
-import msal
 from datetime import date
-import locale
 
+from core.instrumentacao import span
 
+from .importacao import normalizar_cpf
+from .modelos import data_por_extenso, desenhar, plano_para
 
-from .models import Certificado
+
+
+from .models import Certificado, Cliente, Inscricao, ModeloCertificado
+from .transportes import mensagem_certificado, obter_transporte
 
 
 def montar_url_inscricao(agendamento_id):
@@ -30,6 +27,63 @@ def montar_url_inscricao(agendamento_id):
     return f"{base}{reverse('certificados:inscricao')}?agendamento={agendamento_id}"
 
 
+CAMPOS_CLIENTE_INSCRICAO = ('nome', 'email', 'data_nascimento', 'telefone', 'endereco', 'empresa')
+
+
+def registrar_inscricao(agendamento, dados) -> Certificado:
+    """
+    Cria/atualiza o Cliente, a Inscrição e o Certificado de uma inscrição
+    pública em uma única transação, sem select_for_update e com o mínimo de
+    idas ao banco (aluno novo: 1 SELECT + 3 INSERTs). O CPF sem máscara é
+    único: se outra requisição criar o aluno entre o SELECT e o INSERT, o
+    INSERT falha e a inscrição segue como atualização. CPF inválido (ou
+    vazio, que casaria com alunos sem CPF) levanta ValidationError.
+    """
+    cpf = dados['cpf']
+    cpf_digitos = normalizar_cpf(cpf)
+    campos = {campo: dados.get(campo) or '' for campo in CAMPOS_CLIENTE_INSCRICAO}
+    campos['data_nascimento'] = dados['data_nascimento']
+    por_cpf = Cliente.objects.filter(cpf_digitos=cpf_digitos).values_list('pk', flat=True)
+
+    with transaction.atomic():
+        cliente_id = por_cpf.first()
+
+        if cliente_id is None:
+            try:
+                with transaction.atomic():
+                    cliente = Cliente.objects.create(cpf=cpf, **campos)
+            except IntegrityError:
+                # Envio simultâneo do mesmo CPF: o outro INSERT venceu
+                cliente_id = por_cpf.get()
+            else:
+                # Aluno recém-criado não pode ter inscrição nem certificado
+                Inscricao.objects.create(agendamento=agendamento, cliente=cliente)
+                return Certificado.objects.create(
+                    cliente=cliente,
+                    curso=agendamento.curso,
+                    agendamento=agendamento,
+                )
+
+        # UPDATE direto pela PK (sem SELECT prévio); dispara post_save normalmente
+        cliente = Cliente(pk=cliente_id, cpf=cpf, **campos)
+        cliente.save(update_fields=list(campos))
+
+        if connection.features.supports_ignore_conflicts:
+            Inscricao.objects.bulk_create(
+                [Inscricao(agendamento=agendamento, cliente=cliente)],
+                ignore_conflicts=True,
+            )
+        else:
+            Inscricao.objects.get_or_create(agendamento=agendamento, cliente=cliente)
+
+        certificado, _ = Certificado.objects.get_or_create(
+            cliente=cliente,
+            curso=agendamento.curso,
+            agendamento=agendamento,
+        )
+        return certificado
+
+
 def gerar_qr_code_base64_png(texto, return_bytes=False):
     qr = qrcode.QRCode(box_size=8, border=2)
     qr.add_data(texto)
@@ -51,168 +105,57 @@ def gerar_certificado_pdf_bytes(certificado: Certificado) -> bytes:
     static/certificados/img/certificado_base.png
     e escreve SOMENTE: nome, curso e carga horária.
     """
-    buffer = BytesIO()
+    with span("certificado.pdf", certificado=certificado.pk) as atributos:
+        pdf_bytes = renderizar_pdf(dados_renderizacao(certificado))
+        atributos["bytes"] = len(pdf_bytes)
+    return pdf_bytes
 
-    # O template fornecido é horizontal (paisagem)
-    page_w, page_h = landscape(A4)
-    c = canvas.Canvas(buffer, pagesize=(page_w, page_h))
 
-    cliente = certificado.cliente
+def dados_renderizacao(certificado: Certificado) -> dict:
+    """
+    Tudo o que o PDF precisa, em tipos simples (picklable): o modelo de
+    certificado e os valores dos campos. Ver renderizar_pdf e
+    certificados.renderizacao.
+    """
     curso = certificado.curso
-    carga = curso.carga_horaria_padrao or 0
-    try:
-        locale.setlocale(locale.LC_TIME, "pt_BR.UTF-8")
-    except locale.Error:
-        pass
-
-    data_atual = certificado.agendamento.data
-    data_formatada = data_atual.strftime("%d/%m/%Y")
-
-    # 1) Background (template)
-    template_rel = "certificados/img/certificado_base.png"
-    template_path = finders.find(template_rel)
-
-    if not template_path:
-        base_dir = Path(__file__).resolve().parent
-        candidatos = [
-            base_dir / "static" / "certificados" / "img" / "certificado_base.png",
-            base_dir / "static" / "certificados" / "certificado_base.png",
-            base_dir / "static" / "certificados" / "certificados" / "img" / "certificado_base.png",
-        ]
-
-        for caminho in candidatos:
-            if caminho.exists():
-                template_path = str(caminho)
-                break
-
-    if not template_path:
-        raise FileNotFoundError(
-            f"Template não encontrado em static: {template_rel}. "
-            f"Verifique se o arquivo existe e se STATICFILES está configurado."
-        )
-
-    bg = ImageReader(template_path)
-    c.drawImage(bg, 0, 0, width=page_w, height=page_h, mask="auto")
-
-    # Registrar fonte japonesa
-    #fonte_japonesa_path = finders.find("certificados/certificados/fonts/NotoSansJP-Regular.ttf")
-    #if not fonte_japonesa_path:
-        #raise FileNotFoundError("Fonte japonesa não encontrada em certificados/fonts/NotoSansJP-Regular.ttf")
-
-    #if "NotoSansJP" not in pdfmetrics.getRegisteredFontNames():
-        #pdfmetrics.registerFont(TTFont("NotoSansJP", fonte_japonesa_path))
-
-
-    # 2) Textos por cima (AJUSTE FINO DE POSIÇÃO AQUI)
-    # Observação: (0,0) é canto inferior esquerdo.
-
-    # NOME (bem grande, centralizado)
-    c.setFillColor(colors.HexColor("#13375f"))
-
-    linha1_workshop = f"Participou do Workshop {curso.nome}"
-    linha2_workshop = f"com carga horária de {carga} horas, realizado pela Lean Way Consulting"
-
-    fonte_workshop = "Helvetica"
-    tamanho_workshop = 18
-
-    c.setFont("Helvetica-Bold", 34)
-    c.drawCentredString(page_w / 2, 330, cliente.nome)
-
-   # WORKSHOP
-    y_inicial = 290
-    c.setFont(fonte_workshop, tamanho_workshop)
-
-    c.drawCentredString(page_w / 2, y_inicial, linha1_workshop)
-    c.drawCentredString(page_w / 2, y_inicial - 24, linha2_workshop)
-
-    y_pos_final_workshop = y_inicial - 24
-
-    # DATA (abaixo do bloco do workshop, com espaçamento consistente)
-    y_data = y_pos_final_workshop - 40
+    modelo = curso.modelo_certificado
+    data_atual = certificado.agendamento.data if certificado.agendamento else certificado.data_emissao
+    return {
+        'id': certificado.pk,
+        'modelo': None if modelo is None else {
+            'pk': modelo.pk,
+            'atualizado_em': modelo.atualizado_em,
+            'imagem_fundo': modelo.imagem_fundo,
+            'blocos': modelo.blocos,
+        },
+        'valores': {
+            'nome': certificado.cliente.nome,
+            'curso': curso.nome,
+            'carga': curso.carga_horaria_padrao or 0,
+            'data': data_atual.strftime("%d/%m/%Y"),
+            'data_extenso': data_por_extenso(data_atual),
+            'codigo': str(certificado.codigo),
+        },
+    }
 
 
-    c.setFont("Helvetica", 14)
-    c.drawCentredString(page_w / 2, y_data, data_formatada)
+def renderizar_pdf(dados: dict) -> bytes:
+    """PDF a partir de dados_renderizacao(); não acessa o banco."""
+    modelo = dados['modelo']
+    plano = plano_para(ModeloCertificado(**modelo) if modelo else None)
 
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=(plano.largura, plano.altura))
+    desenhar(c, plano, dados['valores'])
     c.showPage()
     c.save()
     return buffer.getvalue()
 
 
-def _graph_get_token() -> str:
-    tenant_id = getattr(settings, "MS_GRAPH_TENANT_ID", None)
-    client_id = getattr(settings, "MS_GRAPH_CLIENT_ID", None)
-    client_secret = getattr(settings, "MS_GRAPH_CLIENT_SECRET", None)
-
-    if not all([tenant_id, client_id, client_secret]):
-        raise RuntimeError(
-            "Configure MS_GRAPH_TENANT_ID, MS_GRAPH_CLIENT_ID, MS_GRAPH_CLIENT_SECRET no settings.py"
-        )
-
-    app = msal.ConfidentialClientApplication(
-        client_id=client_id,
-        authority=f"https://login.microsoftonline.com/{tenant_id}",
-        client_credential=client_secret,
-    )
-
-    result = app.acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
-    if "access_token" not in result:
-        raise RuntimeError(f"Erro ao obter token Graph: {result}")
-    return result["access_token"]
-
-
 def enviar_certificado_email(certificado: Certificado, pdf_bytes: bytes) -> None:
     """
-    Envia e-mail via Microsoft Graph (OAuth2) com PDF anexado.
-    Requer permission: Microsoft Graph -> Application -> Mail.Send + admin consent.
+    Envia o certificado pelo transporte de CERTIFICADOS_TRANSPORTE_EMAIL
+    (Graph por padrão; ver certificados.transportes). Para lotes, use
+    obter_transporte() como gerenciador de contexto.
     """
-    cliente = certificado.cliente
-    curso = certificado.curso
-
-    sender = getattr(settings, "MS_GRAPH_SENDER", None) or getattr(settings, "DEFAULT_FROM_EMAIL", None)
-    if not sender:
-        raise RuntimeError("Configure MS_GRAPH_SENDER (ou DEFAULT_FROM_EMAIL) no settings.py")
-
-    assunto = f"Seu certificado - {curso.nome}"
-    corpo_texto = (
-        f"Olá, {cliente.nome}!\n\n"
-        f"Segue em anexo o seu certificado do curso {curso.nome}.\n"
-    )
-
-    token = _graph_get_token()
-
-    # Graph sendMail exige anexos em base64
-    attachment_b64 = base64.b64encode(pdf_bytes).decode("utf-8")
-    filename = f"certificado_{certificado.codigo}.pdf"
-
-    payload = {
-        "message": {
-            "subject": assunto,
-            "body": {
-                "contentType": "Text",
-                "content": corpo_texto,
-            },
-            "toRecipients": [
-                {"emailAddress": {"address": cliente.email}}
-            ],
-            "attachments": [
-                {
-                    "@odata.type": "#microsoft.graph.fileAttachment",
-                    "name": filename,
-                    "contentType": "application/pdf",
-                    "contentBytes": attachment_b64,
-                }
-            ],
-        },
-        "saveToSentItems": True,
-    }
-
-    url = f"https://graph.microsoft.com/v1.0/users/{sender}/sendMail"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-
-    r = requests.post(url, headers=headers, json=payload, timeout=30)
-
-    # 202 = OK (Accepted)
-    if r.status_code != 202:
-        raise RuntimeError(f"Graph sendMail falhou: {r.status_code} - {r.text}")
-
+    obter_transporte().enviar(mensagem_certificado(certificado, pdf_bytes))
@@ -0,0 +1,82 @@
+"""
+Storage de estáticos com nomes com hash (manifest), variantes otimizadas dos
+fundos de certificado e cópias .gz dos arquivos de texto.
+
+No collectstatic, cada imagem em IMAGENS_COM_VARIANTES ganha <nome>.webp,
+<nome>.avif (se o Pillow suportar) e <nome>.min.png (paleta de 256 cores).
+As variantes entram no manifest como qualquer outro arquivo, então também
+recebem hash e podem ser servidas com cache imutável pelo nginx.
+"""
+import fnmatch
+import gzip
+from io import BytesIO
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from PIL import Image, features
+
+IMAGENS_COM_VARIANTES = ('certificados/img/certificado_base*.png',)
+EXTENSOES_GZIP = ('.css', '.js', '.svg', '.json', '.txt', '.map')
+TAMANHO_MINIMO_GZIP = 1024
+
+# (sufixo, formato Pillow, opções de gravação, feature do Pillow exigida)
+VARIANTES = (
+    ('.avif', 'AVIF', {'quality': 60}, 'avif'),
+    ('.webp', 'WEBP', {'quality': 80, 'method': 6}, 'webp'),
+    ('.min.png', 'PNG', {'optimize': True}, None),
+)
+
+
+def nome_variante(nome, sufixo):
+    return nome.rsplit('.', 1)[0] + sufixo
+
+
+def gerar_variante(imagem, formato, opcoes):
+    buffer = BytesIO()
+    if formato == 'PNG':
+        imagem = imagem.convert('RGB').quantize(256)
+    imagem.save(buffer, formato, **opcoes)
+    return buffer.getvalue()
+
+
+class CertificadoStaticStorage(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            for nome in list(paths):
+                if any(fnmatch.fnmatch(nome, padrao) for padrao in IMAGENS_COM_VARIANTES):
+                    paths.update(self._gerar_variantes(nome))
+
+        yield from super().post_process(paths, dry_run, **options)
+
+        if not dry_run:
+            self._comprimir(set(self.hashed_files.values()))
+
+    def _gerar_variantes(self, nome):
+        """Grava as variantes em STATIC_ROOT e devolve-as no formato de `paths`."""
+        with self.open(nome) as arquivo:
+            imagem = Image.open(arquivo)
+            imagem.load()
+
+        geradas = {}
+        for sufixo, formato, opcoes, feature in VARIANTES:
+            if feature and not features.check(feature):
+                continue
+            variante = nome_variante(nome, sufixo)
+            if self.exists(variante):
+                self.delete(variante)
+            self._save(variante, ContentFile(gerar_variante(imagem, formato, opcoes)))
+            geradas[variante] = (self, variante)
+        return geradas
+
+    def _comprimir(self, nomes):
+        # Para o gzip_static do nginx
+        for nome in nomes:
+            if not nome.endswith(EXTENSOES_GZIP) or self.size(nome) < TAMANHO_MINIMO_GZIP:
+                continue
+            with self.open(nome) as arquivo:
+                conteudo = gzip.compress(arquivo.read(), mtime=0)
+            destino = f'{nome}.gz'
+            if self.exists(destino):
+                self.delete(destino)
+            self._save(destino, ContentFile(conteudo))
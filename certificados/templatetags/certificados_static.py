@@ -0,0 +1,68 @@
+"""
+Tags para servir a melhor variante (AVIF/WebP/PNG otimizado) das imagens
+processadas por certificados.storage.CertificadoStaticStorage.
+
+    {% load certificados_static %}
+    background-image: url("{% static_otimizado 'certificados/img/certificado_base.png' %}");
+    background-image: {% image_set 'certificados/img/certificado_base.png' %};
+"""
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+from django.templatetags.static import static
+from django.utils.safestring import mark_safe
+
+from ..storage import VARIANTES, nome_variante
+
+register = template.Library()
+
+TIPOS = {'.avif': 'image/avif', '.webp': 'image/webp', '.min.png': 'image/png'}
+
+
+def _url_se_existir(caminho):
+    if isinstance(staticfiles_storage, ManifestFilesMixin):
+        # Fora do manifest (sem collectstatic) url() levanta ValueError
+        try:
+            return staticfiles_storage.url(caminho)
+        except ValueError:
+            return None
+    if staticfiles_storage.exists(caminho) or finders.find(caminho):
+        return static(caminho)
+    return None
+
+
+@lru_cache(maxsize=None)
+def variantes(caminho):
+    """[(tipo, url)] da melhor para a pior, terminando no arquivo original."""
+    encontradas = []
+    for sufixo, _, _, _ in VARIANTES:
+        url = _url_se_existir(nome_variante(caminho, sufixo))
+        if url:
+            encontradas.append((TIPOS[sufixo], url))
+    encontradas.append((None, static(caminho)))
+    return tuple(encontradas)
+
+
+@register.simple_tag(takes_context=True)
+def static_otimizado(context, caminho):
+    """URL da melhor variante que o navegador declara aceitar (cabeçalho Accept)."""
+    request = context.get('request')
+    aceita = request.META.get('HTTP_ACCEPT', '') if request else ''
+    for tipo, url in variantes(caminho):
+        if tipo in (None, 'image/png') or tipo in aceita:
+            return url
+    return static(caminho)
+
+
+@register.simple_tag
+def image_set(caminho):
+    """Valor CSS image-set() com todas as variantes; o navegador escolhe o formato."""
+    opcoes = [
+        f'url("{url}") type("{tipo or "image/png"}")'
+        for tipo, url in variantes(caminho)
+        if tipo != 'image/png'
+    ]
+    # URLs geradas pelo storage, sem aspas: seguro para o CSS inline
+    return mark_safe('image-set(' + ', '.join(opcoes) + ')')
@@ -0,0 +1,683 @@
+import base64
+import math
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime
+from io import BytesIO, StringIO
+from unittest import mock
+
+import requests
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .autocomplete import buscar_clientes
+from .benchmark import METADADOS_PDF
+from .forms import InscricaoPublicaForm
+from .importacao import _ids_existentes, importar_participantes, ler_participantes, normalizar_cpf
+from .modelos import FOLGA_LARGURA, PASSO_TAMANHO, _quebrar, ajustar_texto, caminho_estatico, largura_texto
+from .envios import (certificados_pendentes, chave_envio, enviar_certificado, espera_backoff, reenviar_pendentes,
+                     registrar_envio)
+from .models import (Certificado, Cliente, Curso, CursoAgendamento, EnvioCertificado, Inscricao, ModeloCertificado,
+                     Questionario, RespostaUsuario)
+from .services import dados_renderizacao, gerar_certificado_pdf_bytes, registrar_inscricao
+from .transportes import (LimiteTransporte, TransporteEmail, _enviar_graph_upload, _graph_chamada, _retry_after,
+                          obter_transporte)
+
+
+class RetryAfterTests(SimpleTestCase):
+
+    def test_segundos(self):
+        self.assertEqual(_retry_after('120'), 120.0)
+        self.assertEqual(_retry_after('-5'), 0.0)
+
+    def test_data_http(self):
+        data = datetime.now(timezone.utc) + timedelta(seconds=90)
+        self.assertAlmostEqual(_retry_after(format_datetime(data, usegmt=True)), 90, delta=2)
+        self.assertEqual(_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+
+    def test_ausente_ou_invalido(self):
+        for valor in (None, '', 'amanhã', 'inf', 'nan'):
+            with self.subTest(valor=valor):
+                self.assertIsNone(_retry_after(valor))
+
+
+class GraphChamadaTests(SimpleTestCase):
+
+    def test_limite_levanta_sem_repetir(self):
+        resposta = mock.Mock(status_code=429, text='', headers={'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        sessao = mock.Mock(**{'request.return_value': resposta})
+        atributos = {}
+        with self.assertRaises(LimiteTransporte) as contexto:
+            _graph_chamada(sessao, 'POST', 'https://graph', atributos, (202,), 'sendMail')
+        self.assertEqual(contexto.exception.espera, 0.0)
+        self.assertEqual(sessao.request.call_count, 1)
+        self.assertEqual(atributos['http_status'], 429)
+
+
+@override_settings(MS_GRAPH_TAMANHO_PARTE_UPLOAD=4)
+class GraphUploadTests(SimpleTestCase):
+    BASE = 'https://graph/users/remetente'
+    MENSAGEM = f'{BASE}/messages/rascunho'
+    UPLOAD = 'https://upload/sessao'
+    PDF = b'%PDF-1.4\n%'
+
+    def sessao(self, falhar=None, status_falha=500, na_chamada=1):
+        """Sessão falsa; a `na_chamada`-ésima chamada a `falhar` (método, url) devolve `status_falha`."""
+        respostas = {
+            ('POST', f'{self.BASE}/messages'): (201, {'id': 'rascunho', 'internetMessageId': '<id@graph>'}),
+            ('POST', f'{self.MENSAGEM}/attachments/createUploadSession'): (201, {'uploadUrl': self.UPLOAD}),
+            ('PUT', self.UPLOAD): (200, {}),
+            ('POST', f'{self.MENSAGEM}/send'): (202, {}),
+        }
+        falhas = 0
+
+        def request(metodo, url, **kwargs):
+            nonlocal falhas
+            status, corpo = respostas[(metodo, url)]
+            if (metodo, url) == falhar:
+                falhas += 1
+                if falhas == na_chamada:
+                    status = status_falha
+            return mock.Mock(status_code=status, text='', headers={}, **{'json.return_value': corpo})
+
+        return mock.Mock(**{'request.side_effect': request})
+
+    def enviar(self, sessao, atributos=None):
+        return _enviar_graph_upload(sessao, self.BASE, {'subject': 'Certificado'}, 'certificado.pdf', self.PDF,
+                                    {} if atributos is None else atributos)
+
+    def chamadas(self, sessao, metodo):
+        return [chamada for chamada in sessao.request.call_args_list if chamada.args[0] == metodo]
+
+    def test_partes_e_content_range(self):
+        sessao, atributos = self.sessao(), {}
+        self.assertEqual(self.enviar(sessao, atributos), '<id@graph>')
+
+        puts = self.chamadas(sessao, 'PUT')
+        self.assertEqual([put.kwargs['headers']['Content-Range'] for put in puts],
+                         ['bytes 0-3/10', 'bytes 4-7/10', 'bytes 8-9/10'])
+        self.assertEqual(b''.join(put.kwargs['data'] for put in puts), self.PDF)
+        self.assertTrue(all(put.kwargs['headers']['Authorization'] is None for put in puts))
+        self.assertEqual(atributos['partes'], 3)
+        self.assertEqual(sessao.request.call_args_list[-1].args[:2], ('POST', f'{self.MENSAGEM}/send'))
+        sessao.delete.assert_not_called()
+
+    def test_falha_no_upload_apaga_o_rascunho(self):
+        sessao = self.sessao(falhar=('PUT', self.UPLOAD), na_chamada=2)
+        with self.assertRaisesMessage(RuntimeError, 'upload do anexo falhou: 500'):
+            self.enviar(sessao)
+        self.assertEqual(len(self.chamadas(sessao, 'PUT')), 2)
+        self.assertNotIn(('POST', f'{self.MENSAGEM}/send'), [c.args[:2] for c in sessao.request.call_args_list])
+        sessao.delete.assert_called_once_with(self.MENSAGEM, timeout=30)
+
+    def test_limite_no_send_apaga_o_rascunho(self):
+        sessao = self.sessao(falhar=('POST', f'{self.MENSAGEM}/send'), status_falha=429)
+        sessao.delete.side_effect = requests.ConnectionError('caiu')
+        with self.assertRaises(LimiteTransporte), self.assertLogs('certificados.transportes', 'WARNING'):
+            self.enviar(sessao)
+        sessao.delete.assert_called_once_with(self.MENSAGEM, timeout=30)
+
+    def test_falha_ao_criar_rascunho_nao_apaga_nada(self):
+        sessao = self.sessao(falhar=('POST', f'{self.BASE}/messages'))
+        with self.assertRaises(RuntimeError):
+            self.enviar(sessao)
+        sessao.delete.assert_not_called()
+
+
+class RenderizacaoParalelaTests(TestCase):
+    THREADS = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        modelo = ModeloCertificado.objects.create(nome='Com data', blocos=[
+            {'texto': '{nome}', 'y': 330, 'fonte': 'Helvetica-Bold', 'tamanho': 34, 'tamanho_minimo': 16},
+            {'texto': 'Workshop {curso}, {carga} horas', 'y': 290, 'tamanho': 18},
+            {'texto': 'São Paulo, {data_extenso}', 'y': 120, 'tamanho': 14},
+            {'texto': '{codigo}', 'y': 60, 'tamanho': 8},
+        ])
+        cursos = [Curso.objects.create(nome='Lean Office', carga_horaria_padrao=8, modelo_certificado=modelo),
+                  Curso.objects.create(nome='Kaizen', carga_horaria_padrao=16)]
+        nomes = ['Ana', 'José da Conceição', 'Maria ' + 'de Souza ' * 12, 'Ígor Ümlaut']
+        for i in range(12):
+            curso = cursos[i % 2]
+            agendamento = CursoAgendamento.objects.create(curso=curso, data=date(2025, i + 1, 4))
+            cliente = Cliente.objects.create(cpf=f'{i:011d}', nome=nomes[i % len(nomes)],
+                                             email=f'aluno{i}@example.com', data_nascimento=date(1990, 1, 1),
+                                             empresa='Empresa')
+            Certificado.objects.create(cliente=cliente, curso=curso, agendamento=agendamento)
+
+    def renderizar(self, certificado):
+        return METADADOS_PDF.sub(b'', gerar_certificado_pdf_bytes(certificado))
+
+    def test_threads_geram_os_mesmos_bytes_que_a_serie(self):
+        certificados = list(Certificado.objects.select_related('cliente', 'curso__modelo_certificado', 'agendamento')
+                            .order_by('pk'))
+        self.assertEqual(dados_renderizacao(certificados[2])['valores']['data_extenso'], '4 de março de 2025')
+
+        esperado = [self.renderizar(certificado) for certificado in certificados]
+        self.assertEqual(len(set(esperado)), len(esperado))
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            obtido = list(executor.map(self.renderizar, certificados * self.THREADS))
+        for i, pdf in enumerate(obtido):
+            self.assertEqual(pdf, esperado[i % len(esperado)], f'PDF {i} difere da renderização em série')
+
+
+def objetos_pdf(pdf):
+    """{número: (dicionário, stream decodificado ou None)} pela tabela xref do PDF."""
+    inicio_xref = int(re.search(rb'startxref\s+(\d+)\s+%%EOF\s*$', pdf).group(1))
+    assert pdf.startswith(b'xref', inicio_xref), 'startxref não aponta para a tabela xref'
+    objetos = {}
+    for numero, offset in enumerate(re.findall(rb'(\d{10}) \d{5} n', pdf[inicio_xref:]), 1):
+        offset = int(offset)
+        assert pdf.startswith(b'%d 0 obj' % numero, offset), f'xref do objeto {numero} fora do lugar'
+        fim_obj, inicio_stream = pdf.find(b'\nendobj', offset), pdf.find(b'\nstream\n', offset)
+        if inicio_stream == -1 or fim_obj < inicio_stream:
+            objetos[numero] = (pdf[offset:fim_obj], None)
+            continue
+        dicionario = pdf[offset:inicio_stream]
+        inicio_stream += len(b'\nstream\n')
+        fim_stream = inicio_stream + int(re.search(rb'/Length (\d+)', dicionario).group(1))
+        assert pdf[fim_stream:].lstrip().startswith(b'endstream'), f'/Length errado no objeto {numero}'
+        dados = pdf[inicio_stream:fim_stream]
+        filtros = re.search(rb'/Filter \[?([^\]>]*)', dicionario)
+        for filtro in (filtros.group(1).split() if filtros else []):
+            if filtro == b'/ASCII85Decode':
+                dados = base64.a85decode(dados.strip().removesuffix(b'~>'))
+            elif filtro == b'/FlateDecode':
+                dados = zlib.decompress(dados)
+        objetos[numero] = (dicionario, dados)
+    return objetos
+
+
+class AjustarTextoTests(SimpleTestCase):
+    FONTE = 'Helvetica'
+    TEXTO = 'Maria Aparecida de Souza Conceição Albuquerque'
+
+    def largura(self, texto, tamanho):
+        return largura_texto(texto, self.FONTE, tamanho)
+
+    def linear(self, texto, tamanho, largura, minimo, max_linhas):
+        # Referência: testa os tamanhos do maior para o menor, na mesma grade da busca binária
+        def cabe(t):
+            linhas = _quebrar(texto.split(), self.FONTE, t, largura, max_linhas)
+            return len(linhas) <= max_linhas and all(medida <= largura + FOLGA_LARGURA for _, medida in linhas)
+
+        if cabe(tamanho):
+            return tamanho
+        passos = math.ceil((tamanho - minimo) / PASSO_TAMANHO)
+        return next((minimo + k * PASSO_TAMANHO for k in range(passos - 1, -1, -1)
+                     if cabe(minimo + k * PASSO_TAMANHO)), minimo)
+
+    def test_cabe_exato_no_tamanho_maximo(self):
+        largura = self.largura(self.TEXTO, 20)
+        tamanho, [(linha, medida)] = ajustar_texto(self.TEXTO, self.FONTE, 20, largura, 10)
+        self.assertEqual((tamanho, linha), (20, self.TEXTO))
+        self.assertAlmostEqual(medida, largura)
+
+    def test_reduz_ate_o_minimo(self):
+        largura = self.largura(self.TEXTO, 12)
+        tamanho, linhas = ajustar_texto(self.TEXTO, self.FONTE, 20, largura, 12)
+        self.assertEqual(tamanho, 12)
+        self.assertEqual([linha for linha, _ in linhas], [self.TEXTO])
+
+    def test_nao_cabe_nem_no_minimo(self):
+        largura = self.largura(self.TEXTO, 12) - 1
+        tamanho, linhas = ajustar_texto(self.TEXTO, self.FONTE, 20, largura, 12)
+        self.assertEqual(tamanho, 12)
+        self.assertEqual(len(linhas), 1)
+        self.assertGreater(linhas[0][1], largura)
+
+    def test_quebra_em_varias_linhas(self):
+        largura = self.largura('Maria Aparecida de Souza', 20)
+        tamanho, linhas = ajustar_texto(self.TEXTO, self.FONTE, 20, largura, 10, max_linhas=2)
+        self.assertEqual(tamanho, 20)
+        self.assertEqual([linha for linha, _ in linhas], ['Maria Aparecida de Souza', 'Conceição Albuquerque'])
+        for linha, medida in linhas:
+            self.assertAlmostEqual(medida, self.largura(linha, 20))
+
+        # Com uma linha só não há quebra, mesmo que não caiba
+        self.assertEqual(len(_quebrar(self.TEXTO.split(), self.FONTE, 20, largura, 1)), 1)
+
+    def test_busca_binaria_igual_a_varredura_linear(self):
+        for tamanho, minimo in ((34, 16), (20, 7.25)):
+            for max_linhas in (1, 2, 3):
+                for largura in range(60, 700, 7):
+                    with self.subTest(tamanho=tamanho, minimo=minimo, max_linhas=max_linhas, largura=largura):
+                        obtido, _ = ajustar_texto(self.TEXTO, self.FONTE, tamanho, largura, minimo, max_linhas)
+                        self.assertEqual(obtido, self.linear(self.TEXTO, tamanho, largura, minimo, max_linhas))
+
+
+class ModeloPdfTests(TestCase):
+    """O fundo é um XObject pré-compilado inserido sem drawImage: o PDF precisa continuar íntegro."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.modelo = ModeloCertificado.objects.create(
+            nome='Outro fundo', imagem_fundo='certificados/img/certificado_base_3.png',
+            blocos=[{'texto': '{nome}', 'y': 330, 'tamanho': 30}, {'texto': 'Código {codigo}', 'y': 60, 'tamanho': 8}])
+        cliente = Cliente.objects.create(cpf='52998224725', nome='Ana Souza', email='ana@example.com',
+                                         data_nascimento=date(1990, 1, 1), empresa='Empresa')
+        cls.padrao = Certificado.objects.create(cliente=cliente, curso=Curso.objects.create(nome='Padrão'))
+        cls.personalizado = Certificado.objects.create(
+            cliente=cliente, curso=Curso.objects.create(nome='Personalizado', modelo_certificado=cls.modelo))
+
+    def verificar(self, certificado):
+        objetos = objetos_pdf(gerar_certificado_pdf_bytes(certificado))
+        paginas = [dicionario for dicionario, _ in objetos.values() if re.search(rb'/Type /Page\b(?!s)', dicionario)]
+        self.assertEqual(len(paginas), 1)
+        nome, ref = re.search(rb'/(FormXob\.fundo\w+) (\d+) 0 R', paginas[0]).groups()
+        imagem, pixels = objetos[int(ref)]
+        self.assertIn(b'/Subtype /Image', imagem)
+        largura, altura = (int(re.search(rb'/%s (\d+)' % campo, imagem).group(1)) for campo in (b'Width', b'Height'))
+        if b'DCTDecode' not in imagem:
+            self.assertEqual(len(pixels), largura * altura * 3)
+        smask = re.search(rb'/SMask (\d+) 0 R', imagem)
+        if smask:
+            self.assertIn(b'/Subtype /Image', objetos[int(smask.group(1))][0])
+
+        conteudo = objetos[int(re.search(rb'/Contents (\d+) 0 R', paginas[0]).group(1))][1]
+        self.assertIn(b'/' + nome + b' Do', conteudo)
+        self.assertIn(b'(Ana Souza) Tj', conteudo)
+        return nome
+
+    def test_modelo_padrao_e_personalizado(self):
+        for otimizado in (False, True):
+            with self.subTest(otimizado=otimizado), override_settings(CERTIFICADOS_PDF_OTIMIZADO=otimizado):
+                # Duas vezes: o segundo documento reaproveita o XObject em cache
+                fundos = [self.verificar(certificado) for certificado in (self.padrao, self.personalizado) * 2]
+                self.assertEqual(len(set(fundos)), 2)
+
+    def test_fundo_fora_de_static(self):
+        for nome in ('../settings.py', 'certificados/img/../../../../manage.py', '/etc/passwd', 'C:/Windows/win.ini',
+                     'certificados\\..\\..\\modelos.py'):
+            with self.subTest(nome=nome):
+                with self.assertRaises(ValueError):
+                    caminho_estatico(nome)
+                with self.assertRaises(ValidationError):
+                    ModeloCertificado(nome='X', imagem_fundo=nome, blocos=self.modelo.blocos).clean()
+        self.assertTrue(caminho_estatico('certificados/img/certificado_base_3.png').endswith('certificado_base_3.png'))
+
+
+class MesclarDuplicadosTests(TransactionTestCase):
+    """Duplicados só existem antes da 0015: o teste volta o banco para a 0014."""
+    ANTES = [('certificados', '0014_resposta_respondido_idx')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.ultimas = executor.loader.graph.leaf_nodes('certificados')
+        executor.migrate(self.ANTES)
+
+    def tearDown(self):
+        Cliente.objects.all().delete()
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.ultimas)
+
+    def criar_cliente(self, nome, cpf='123.456.789-09'):
+        return Cliente.objects.create(cpf=cpf, nome=nome, email=f'{len(nome)}@example.com',
+                                      data_nascimento=date(1990, 1, 1), empresa='Empresa')
+
+    def comando(self, *args):
+        saida = StringIO()
+        call_command('mesclar_clientes_duplicados', *args, stdout=saida)
+        return saida.getvalue()
+
+    def test_relatorio_nao_altera_e_aplicar_mescla(self):
+        curso = Curso.objects.create(nome='Curso')
+        agendamentos = [CursoAgendamento.objects.create(curso=curso, data=date(2025, 1, d)) for d in (1, 2)]
+        mantido = self.criar_cliente('Ana Souza')
+        outro = self.criar_cliente('ANA  SOUZA', cpf='12345678909')
+        Inscricao.objects.create(agendamento=agendamentos[0], cliente=mantido)
+        Inscricao.objects.create(agendamento=agendamentos[0], cliente=outro)
+        certificado = Certificado.objects.create(cliente=outro, curso=curso, agendamento=agendamentos[1])
+        EnvioCertificado.objects.create(certificado=certificado, chave_idempotencia='k')
+        questionario = Questionario.objects.create(titulo='Q', curso=curso)
+        RespostaUsuario.objects.create(questionario=questionario, cliente=outro, certificado=certificado)
+
+        saida = self.comando()
+        self.assertIn('mesclável', saida)
+        self.assertIn('Nada foi alterado', saida)
+        self.assertEqual(Cliente.objects.count(), 2)
+
+        self.comando('--aplicar')
+        self.assertEqual(list(Cliente.objects.values_list('pk', flat=True)), [mantido.pk])
+        certificado.refresh_from_db()
+        self.assertEqual(certificado.cliente_id, mantido.pk)
+        self.assertEqual(certificado.envios.count(), 1)
+        self.assertEqual(RespostaUsuario.objects.get().cliente_id, mantido.pk)
+        self.assertEqual(Inscricao.objects.filter(cliente=mantido).count(), 1)
+
+        MigrationExecutor(connection).migrate(self.ultimas)
+
+    def test_conflitos_ficam_para_revisao_manual(self):
+        curso = Curso.objects.create(nome='Curso')
+        agendamento = CursoAgendamento.objects.create(curso=curso, data=date(2025, 1, 1))
+        ana = self.criar_cliente('Ana Souza')
+        bia = self.criar_cliente('Beatriz Lima')
+        carla = self.criar_cliente('Carla Dias', cpf='98765432100')
+        carla2 = self.criar_cliente('Carla Dias', cpf='987.654.321-00')
+        for cliente in (carla, carla2):
+            Certificado.objects.create(cliente=cliente, curso=curso, agendamento=agendamento)
+
+        saida = self.comando('--aplicar')
+        self.assertIn('nomes diferentes', saida)
+        self.assertIn('certificados do mesmo curso/agendamento', saida)
+        self.assertEqual(Cliente.objects.count(), 4)
+        self.assertEqual(Certificado.objects.count(), 2)
+
+        # A constraint não é criada enquanto houver repetidos
+        with self.assertRaisesMessage(RuntimeError, 'mesclar_clientes_duplicados'):
+            MigrationExecutor(connection).migrate(self.ultimas)
+
+        self.comando('--aplicar', '--cpf', ana.cpf, '--aceitar-nomes-diferentes')
+        self.assertFalse(Cliente.objects.filter(pk=bia.pk).exists())
+        Certificado.objects.filter(cliente=carla2).delete()
+        carla2.delete()
+        MigrationExecutor(connection).migrate(self.ultimas)
+
+
+class EnviosAnterioresTests(TransactionTestCase):
+    """Certificados respondidos antes de EnvioCertificado não voltam a ser enviados (migração 0016)."""
+
+    def test_respondidos_ficam_enviados(self):
+        executor = MigrationExecutor(connection)
+        ultimas = executor.loader.graph.leaf_nodes('certificados')
+        executor.migrate([('certificados', '0015_cliente_cpf_unico')])
+
+        curso = Curso.objects.create(nome='Curso')
+        questionario = Questionario.objects.create(titulo='Q', curso=curso)
+        respondido, sem_resposta = [
+            Certificado.objects.create(curso=curso, cliente=Cliente.objects.create(
+                cpf=cpf, nome='Aluno', email='a@example.com', data_nascimento=date(1990, 1, 1), empresa='E'))
+            for cpf in ('11144477735', '52998224725')
+        ]
+        RespostaUsuario.objects.create(questionario=questionario, cliente=respondido.cliente, certificado=respondido)
+        self.assertEqual(list(certificados_pendentes(72, 8)), [respondido])
+
+        MigrationExecutor(connection).migrate(ultimas)
+        envio = EnvioCertificado.objects.get()
+        self.assertEqual((envio.certificado_id, envio.status), (respondido.pk, EnvioCertificado.STATUS_ENVIADO))
+        self.assertEqual(envio.chave_idempotencia, chave_envio(respondido))
+        self.assertEqual(list(certificados_pendentes(72, 8)), [])
+        self.assertFalse(sem_resposta.envios.exists())
+
+
+@override_settings(CERTIFICADOS_TRANSPORTE_EMAIL='locmem', CERTIFICADOS_ENVIO_EXPIRA=60)
+class EnvioIdempotenteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.modelo = ModeloCertificado.objects.create(nome='Modelo', blocos=[{'texto': '{nome}', 'y': 330}])
+        curso = Curso.objects.create(nome='Curso', modelo_certificado=cls.modelo)
+        cliente = Cliente.objects.create(cpf='52998224725', nome='Ana', email='ana@example.com',
+                                         data_nascimento=date(1990, 1, 1), empresa='Empresa')
+        cls.certificado = Certificado.objects.create(cliente=cliente, curso=curso)
+
+    def enviar(self, certificado=None, transporte=None, reenvio=False):
+        _, enviado = enviar_certificado(certificado or self.certificado, lambda: b'%PDF', transporte, reenvio=reenvio)
+        return enviado
+
+    def test_post_repetido_do_questionario_envia_uma_vez(self):
+        Questionario.objects.create(titulo='Q', curso=self.certificado.curso)
+        url = reverse('certificados:responder_questionario', args=[self.certificado.pk])
+        for _ in range(2):
+            self.assertEqual(self.client.post(url).status_code, 302)
+        self.assertEqual(len(mail.outbox), 1)
+        envio = EnvioCertificado.objects.get()
+        self.assertEqual((envio.status, envio.tentativas), (EnvioCertificado.STATUS_ENVIADO, 1))
+
+    def test_reenvios_simultaneos_do_admin(self):
+        segundo = []
+        with obter_transporte() as transporte:
+            enviar = transporte.enviar
+
+            def enviar_durante_outro_clique(mensagem):
+                # O segundo clique chega enquanto o primeiro ainda está enviando
+                if not segundo:
+                    segundo.append(self.enviar(transporte=transporte, reenvio=True))
+                return enviar(mensagem)
+
+            with mock.patch.object(transporte, 'enviar', side_effect=enviar_durante_outro_clique):
+                self.assertTrue(self.enviar(transporte=transporte, reenvio=True))
+        self.assertEqual(segundo, [False])
+        self.assertEqual(len(mail.outbox), 1)
+
+        # Um clique depois do envio concluído é um reenvio novo
+        self.assertTrue(self.enviar(reenvio=True))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(sorted(self.certificado.envios.values_list('chave_idempotencia', flat=True)),
+                         [chave_envio(self.certificado), chave_envio(self.certificado, 1)])
+
+    def test_enviando_expirado_e_retomado(self):
+        envio = registrar_envio(self.certificado)
+        agora = datetime.now(timezone.utc)
+        EnvioCertificado.objects.filter(pk=envio.pk).update(
+            status=EnvioCertificado.STATUS_ENVIANDO, atualizado_em=agora - timedelta(seconds=30))
+        self.assertFalse(self.enviar())
+        self.assertEqual(mail.outbox, [])
+
+        EnvioCertificado.objects.filter(pk=envio.pk).update(atualizado_em=agora - timedelta(seconds=90))
+        self.assertTrue(self.enviar())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EnvioCertificado.objects.get().status, EnvioCertificado.STATUS_ENVIADO)
+
+    def test_modelo_alterado_gera_nova_chave(self):
+        self.assertTrue(self.enviar())
+        self.assertFalse(self.enviar())
+        chave_antiga = chave_envio(self.certificado)
+
+        ModeloCertificado.objects.filter(pk=self.modelo.pk).update(
+            atualizado_em=self.modelo.atualizado_em + timedelta(minutes=1))
+        certificado = Certificado.objects.select_related('curso__modelo_certificado').get(pk=self.certificado.pk)
+        self.assertNotEqual(chave_envio(certificado), chave_antiga)
+        self.assertTrue(self.enviar(certificado))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(certificado.envios.count(), 2)
+
+
+class TransporteLimitado(TransporteEmail):
+    nome = 'limitado'
+
+    def enviar(self, mensagem):
+        raise LimiteTransporte('Graph sendMail limitado: 429', espera=600)
+
+
+@override_settings(CERTIFICADOS_TRANSPORTE_EMAIL='locmem', CERTIFICADOS_ENVIO_BACKOFF=60,
+                   CERTIFICADOS_ENVIO_BACKOFF_MAXIMO=3600)
+class ReenviarPendentesTests(TransactionTestCase):
+    """Threads de envio usam suas próprias conexões: os dados precisam estar gravados."""
+
+    def setUp(self):
+        curso = Curso.objects.create(nome='Curso')
+        questionario = Questionario.objects.create(titulo='Q', curso=curso)
+        self.certificados = []
+        for i in range(5):
+            cliente = Cliente.objects.create(cpf=f'{i:011d}', nome=f'Aluno {i}', email=f'aluno{i}@example.com',
+                                             data_nascimento=date(1990, 1, 1), empresa='Empresa')
+            certificado = Certificado.objects.create(cliente=cliente, curso=curso)
+            RespostaUsuario.objects.create(questionario=questionario, cliente=cliente, certificado=certificado)
+            self.certificados.append(certificado)
+        self.lotes = []
+
+    def gerar_pdfs(self, certificados, pool=None):
+        certificados = list(certificados)
+        self.lotes.append([certificado.pk for certificado in certificados])
+        return [(certificado, lambda: b'%PDF') for certificado in certificados]
+
+    def test_espera_backoff(self):
+        self.assertEqual([espera_backoff(n) for n in (0, 1, 2, 3, 7, 8)], [60, 60, 120, 240, 3600, 3600])
+        self.assertEqual(espera_backoff(1, espera_minima=600), 600)
+        self.assertEqual(espera_backoff(3, espera_minima=None), 240)
+
+    def test_envia_em_lotes(self):
+        with mock.patch('certificados.renderizacao.gerar_pdfs', self.gerar_pdfs):
+            resultado = reenviar_pendentes(tamanho_lote=2, concorrencia=2)
+        pks = [certificado.pk for certificado in self.certificados]
+        self.assertEqual(self.lotes, [pks[0:2], pks[2:4], pks[4:]])
+        self.assertEqual((resultado.pendentes, resultado.enviados, resultado.falhas), (5, 5, 0))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(list(certificados_pendentes(72, 8)), [])
+
+        # Nada a reenviar na segunda execução
+        self.assertEqual(reenviar_pendentes(tamanho_lote=2).pendentes, 0)
+
+    def test_para_no_limite_do_transporte(self):
+        with mock.patch('certificados.renderizacao.gerar_pdfs', self.gerar_pdfs), \
+                mock.patch('certificados.envios.obter_transporte', TransporteLimitado), \
+                self.assertLogs('certificados.envios', 'WARNING'):
+            resultado = reenviar_pendentes(tamanho_lote=2, concorrencia=1)
+        self.assertEqual(len(self.lotes), 1)
+        self.assertIsInstance(resultado.limite, LimiteTransporte)
+        self.assertEqual((resultado.pendentes, resultado.enviados, resultado.falhas), (2, 0, 1))
+
+        envio = EnvioCertificado.objects.get()
+        self.assertEqual((envio.certificado_id, envio.status), (self.certificados[0].pk, EnvioCertificado.STATUS_FALHOU))
+        # O Retry-After (600 s) vale mais que o backoff da primeira falha (60 s)
+        espera = envio.proxima_tentativa - datetime.now(timezone.utc)
+        self.assertAlmostEqual(espera.total_seconds(), 600, delta=30)
+        self.assertEqual(list(certificados_pendentes(72, 8)), self.certificados[1:])
+
+
+class ImportacaoTests(TestCase):
+    CABECALHO = 'CPF;Nome;E-mail;Data de nascimento\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agendamento = CursoAgendamento.objects.create(curso=Curso.objects.create(nome='Curso'), data=date(2025, 3, 4))
+        cls.existente, cls.inscrito = [
+            Cliente.objects.create(cpf=cpf, nome=nome, email='x@example.com', data_nascimento=date(1990, 1, 1),
+                                   empresa='Empresa')
+            for cpf, nome in (('111.444.777-35', 'Existente'), ('529.982.247-25', 'Inscrito'))
+        ]
+        Inscricao.objects.create(agendamento=cls.agendamento, cliente=cls.inscrito)
+        Certificado.objects.create(cliente=cls.inscrito, curso=cls.agendamento.curso, agendamento=cls.agendamento)
+
+    def importar(self, *linhas):
+        arquivo = BytesIO((self.CABECALHO + ''.join(f'{linha}\n' for linha in linhas)).encode())
+        return importar_participantes(self.agendamento, ler_participantes(arquivo, 'lista.csv'), empresa_padrao='ACME')
+
+    def test_normalizar_cpf(self):
+        for valor, esperado in (('529.982.247-25', '52998224725'), (' 111 444 777 35 ', '11144477735'),
+                                (1234567890, '01234567890'), (1234567890.0, '01234567890')):
+            with self.subTest(valor=valor):
+                self.assertEqual(normalizar_cpf(valor), esperado)
+        for valor in ('529.982.247-24', '529.982.247-15', '111.111.111-11', '1234567890', '', None):
+            with self.subTest(valor=valor), self.assertRaises(ValidationError):
+                normalizar_cpf(valor)
+
+    def test_contagens(self):
+        resultado = self.importar(
+            '012.345.678-90;Nova Aluna;nova@example.com;04/03/1995',
+            '11144477735;Existente;x@example.com;1990-01-01',
+            '529.982.247-25;Inscrito;x@example.com;01/01/1990',
+            '01234567890;Nova Aluna;nova@example.com;04/03/1995',
+            '123.456.789-00;CPF errado;e@example.com;01/01/1990',
+            '00000000191;;sem-nome@example.com;01/01/1990',
+        )
+        self.assertEqual(resultado.linhas, 6)
+        self.assertEqual((resultado.clientes_criados, resultado.clientes_existentes), (1, 2))
+        self.assertEqual((resultado.inscricoes_criadas, resultado.ja_inscritos), (2, 1))
+        self.assertEqual(resultado.certificados_criados, 2)
+        self.assertEqual(resultado.duplicados, [(5, '01234567890')])
+        self.assertEqual([linha for linha, _ in resultado.invalidos], [6, 7])
+
+        nova = Cliente.objects.get(cpf_digitos='01234567890')
+        self.assertEqual((nova.nome_busca, nova.empresa), ('nova aluna', 'ACME'))
+        self.assertEqual(self.agendamento.inscricoes.count(), 3)
+        self.assertEqual(Certificado.objects.filter(agendamento=self.agendamento).count(), 3)
+
+        # Reimportar o mesmo arquivo não cria nada
+        resultado = self.importar('012.345.678-90;Nova Aluna;nova@example.com;04/03/1995')
+        self.assertEqual((resultado.clientes_criados, resultado.inscricoes_criadas, resultado.ja_inscritos), (0, 0, 1))
+
+    def test_aluno_gravado_durante_a_importacao(self):
+        leituras = []
+
+        def leitura_atrasada(cpfs, tamanho_lote):
+            # A primeira leitura acontece antes de a inscrição pública gravar o aluno
+            leituras.append(cpfs)
+            return {} if len(leituras) == 1 else _ids_existentes(cpfs, tamanho_lote)
+
+        with mock.patch('certificados.importacao._ids_existentes', side_effect=leitura_atrasada):
+            resultado = self.importar('111.444.777-35;Existente;x@example.com;01/01/1990',
+                                      '012.345.678-90;Nova Aluna;nova@example.com;04/03/1995')
+        self.assertEqual(len(leituras), 2)
+        self.assertEqual((resultado.clientes_criados, resultado.clientes_existentes), (1, 1))
+        self.assertEqual(Cliente.objects.filter(cpf_digitos='11144477735').count(), 1)
+        self.assertEqual(self.agendamento.inscricoes.count(), 3)
+
+        with mock.patch('certificados.importacao._ids_existentes', return_value={}), \
+                self.assertRaisesMessage(ValidationError, 'Importe o arquivo novamente'):
+            self.importar('111.444.777-35;Existente;x@example.com;01/01/1990')
+
+
+class AutocompleteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i, (nome, email) in enumerate([('Mariana Alves', 'mari@example.com'), ('Ana Maria Souza', 'ana@example.com'),
+                                           ('Bruno Lima', 'maria.b@example.com'), ('Maria Clara', 'mc@example.com')]):
+            Cliente.objects.create(cpf=f'5299822{i:04d}', nome=nome, email=email,
+                                   data_nascimento=date(1990, 1, 1), empresa='E')
+
+    def nomes(self, termo, **kwargs):
+        clientes, _ = buscar_clientes(termo, **kwargs)
+        return [cliente.nome for cliente in clientes]
+
+    def test_so_prefixo_por_padrao(self):
+        self.assertEqual(self.nomes('mari'), ['Maria Clara', 'Mariana Alves'])
+
+    @override_settings(CERTIFICADOS_AUTOCOMPLETE_CONTEM=True)
+    def test_contem_depois_dos_prefixos(self):
+        self.assertEqual(self.nomes('maria'), ['Maria Clara', 'Mariana Alves', 'Ana Maria Souza', 'Bruno Lima'])
+        # Termo curto: só o prefixo, mesmo ativado
+        self.assertEqual(self.nomes('mar'), ['Maria Clara', 'Mariana Alves'])
+
+    @override_settings(CERTIFICADOS_AUTOCOMPLETE_CONTEM=True)
+    def test_cursor_atravessa_as_fases(self):
+        primeira, apos = buscar_clientes('maria', limite=3)
+        segunda, fim = buscar_clientes('maria', apos=apos, limite=3)
+        self.assertEqual([c.nome for c in primeira + segunda],
+                         ['Maria Clara', 'Mariana Alves', 'Ana Maria Souza', 'Bruno Lima'])
+        self.assertIsNone(fim)
+
+    def test_cpf_por_prefixo(self):
+        self.assertEqual(self.nomes('529.982.200-01'), ['Ana Maria Souza'])
+
+
+class RegistrarInscricaoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agendamento = CursoAgendamento.objects.create(curso=Curso.objects.create(nome='Curso'), data=date(2025, 1, 1))
+        # Cadastro antigo sem CPF: não pode ser confundido com nenhuma inscrição
+        cls.sem_cpf = Cliente.objects.create(cpf='', nome='Sem CPF', email='sem@example.com',
+                                             data_nascimento=date(1980, 1, 1), empresa='E')
+
+    def dados(self, cpf, nome='Ana'):
+        return {'cpf': cpf, 'nome': nome, 'email': 'ana@example.com', 'data_nascimento': date(1990, 1, 1),
+                'telefone': '', 'empresa': 'E'}
+
+    def test_cpf_mascarado_atualiza_o_mesmo_aluno(self):
+        primeiro = registrar_inscricao(self.agendamento, self.dados('529.982.247-25'))
+        segundo = registrar_inscricao(self.agendamento, self.dados('52998224725', nome='Ana Souza'))
+        self.assertEqual(primeiro.pk, segundo.pk)
+        self.assertEqual(Cliente.objects.get(cpf_digitos='52998224725').nome, 'Ana Souza')
+        self.assertEqual(self.agendamento.inscricoes.count(), 1)
+
+    def test_cpf_vazio_ou_invalido_e_recusado(self):
+        for cpf in ('', '...-', '123.456.789-00', '111.111.111-11'):
+            with self.subTest(cpf=cpf):
+                with self.assertRaises(ValidationError):
+                    registrar_inscricao(self.agendamento, self.dados(cpf))
+                form = InscricaoPublicaForm(data={**self.dados(cpf), 'data_nascimento': '1990-01-01'})
+                self.assertIn('cpf', form.errors)
+        self.sem_cpf.refresh_from_db()
+        self.assertEqual(self.sem_cpf.nome, 'Sem CPF')
+        self.assertFalse(self.agendamento.inscricoes.exists())
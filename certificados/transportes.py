@@ -0,0 +1,360 @@
+"""
+Transportes de e-mail dos certificados, escolhidos por
+CERTIFICADOS_TRANSPORTE_EMAIL:
+
+- "graph" (padrão): Microsoft Graph (sendMail; upload session para anexos
+  grandes), com a mesma sessão HTTP em todo o lote;
+- "smtp": backend SMTP do Django (EMAIL_HOST, EMAIL_USE_TLS...), com uma
+  única conexão autenticada aberta durante o lote;
+- "locmem" / "arquivo" / "console": backends do Django para testes e
+  benchmarks (mail.outbox, EMAIL_FILE_PATH, stdout);
+- ou o caminho de uma classe TransporteEmail.
+
+Uso em lote:
+
+    with obter_transporte() as transporte:
+        for certificado, pdf in ...:
+            transporte.enviar(mensagem_certificado(certificado, pdf))
+
+enviar() devolve o id da mensagem no provedor (Message-ID no SMTP,
+request-id/id do rascunho no Graph), registrado em EnvioCertificado.
+"""
+import base64
+import logging
+import math
+import smtplib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+
+import msal
+import requests
+from django.conf import settings
+from django.core import mail
+from django.core.mail import make_msgid
+from django.utils.module_loading import import_string
+
+from core.instrumentacao import span
+
+logger = logging.getLogger(__name__)
+
+# Acima disto o PDF vai por upload session: o sendMail aceita ~3 MB por
+# requisição, contando o base64 (+33%)
+LIMITE_ANEXO_INLINE = 2 * 1024 * 1024
+# Partes do upload session: múltiplos de 320 KiB, no máximo 4 MiB
+TAMANHO_PARTE_UPLOAD = 10 * 320 * 1024
+
+# Respostas SMTP de limite/sobrecarga temporária do servidor (421, 451)
+CODIGOS_LIMITE_SMTP = (421, 451)
+
+BACKENDS_DJANGO = {
+    'smtp': 'django.core.mail.backends.smtp.EmailBackend',
+    'locmem': 'django.core.mail.backends.locmem.EmailBackend',
+    'arquivo': 'django.core.mail.backends.filebased.EmailBackend',
+    'console': 'django.core.mail.backends.console.EmailBackend',
+}
+
+
+class LimiteTransporte(RuntimeError):
+    """O provedor recusou o envio por limite de taxa (429/503 no Graph, 421/451 no SMTP)."""
+
+    def __init__(self, mensagem, espera=None):
+        super().__init__(mensagem)
+        self.espera = espera
+
+
+@dataclass(frozen=True)
+class Mensagem:
+    certificado_id: object
+    destinatario: str
+    assunto: str
+    corpo: str
+    nome_anexo: str
+    anexo: bytes
+
+
+def remetente_padrao():
+    sender = getattr(settings, "MS_GRAPH_SENDER", None) or getattr(settings, "DEFAULT_FROM_EMAIL", None)
+    if not sender:
+        raise RuntimeError("Configure MS_GRAPH_SENDER (ou DEFAULT_FROM_EMAIL) no settings.py")
+    return sender
+
+
+def mensagem_certificado(certificado, pdf_bytes) -> Mensagem:
+    cliente = certificado.cliente
+    curso = certificado.curso
+    return Mensagem(
+        certificado_id=certificado.pk,
+        destinatario=cliente.email,
+        assunto=f"Seu certificado - {curso.nome}",
+        corpo=(
+            f"Olá, {cliente.nome}!\n\n"
+            f"Segue em anexo o seu certificado do curso {curso.nome}.\n"
+        ),
+        nome_anexo=f"certificado_{certificado.codigo}.pdf",
+        anexo=pdf_bytes,
+    )
+
+
+class TransporteEmail:
+    """
+    Envia Mensagens. Como gerenciador de contexto, mantém os recursos do
+    transporte (conexão, sessão) abertos entre os envios de um lote.
+    """
+    nome = 'email'
+
+    def abrir(self):
+        pass
+
+    def fechar(self):
+        pass
+
+    def enviar(self, mensagem: Mensagem):
+        """Envia e devolve o id da mensagem no provedor (ou None)."""
+        raise NotImplementedError
+
+    def __enter__(self):
+        self.abrir()
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+class TransporteGraph(TransporteEmail):
+    nome = 'graph'
+
+    def __init__(self, remetente=None):
+        self.remetente = remetente
+        self._sessao = None
+
+    def abrir(self):
+        if self._sessao is None:
+            self._sessao = requests.Session()
+
+    def fechar(self):
+        if self._sessao is not None:
+            self._sessao.close()
+            self._sessao = None
+
+    def enviar(self, mensagem):
+        sender = self.remetente or remetente_padrao()
+        with span("graph.sendmail", certificado=mensagem.certificado_id, pdf_bytes=len(mensagem.anexo)) as atributos:
+            if self._sessao is None:
+                with self:
+                    return self._enviar(sender, mensagem, atributos)
+            return self._enviar(sender, mensagem, atributos)
+
+    def _enviar(self, sender, mensagem, atributos):
+        sessao = self._sessao
+        # Token do cache do MSAL na maior parte das chamadas
+        sessao.headers["Authorization"] = f"Bearer {_graph_get_token()}"
+        dados = {
+            "subject": mensagem.assunto,
+            "body": {
+                "contentType": "Text",
+                "content": mensagem.corpo,
+            },
+            "toRecipients": [
+                {"emailAddress": {"address": mensagem.destinatario}}
+            ],
+        }
+        base = f"https://graph.microsoft.com/v1.0/users/{sender}"
+        if len(mensagem.anexo) <= getattr(settings, "MS_GRAPH_LIMITE_ANEXO_INLINE", LIMITE_ANEXO_INLINE):
+            atributos["modo"] = "inline"
+            return _enviar_graph_inline(sessao, base, dados, mensagem.nome_anexo, mensagem.anexo, atributos)
+        else:
+            atributos["modo"] = "upload_session"
+            return _enviar_graph_upload(sessao, base, dados, mensagem.nome_anexo, mensagem.anexo, atributos)
+
+
+class TransporteDjango(TransporteEmail):
+    """Backends de e-mail do Django; a conexão fica aberta durante o lote."""
+
+    def __init__(self, backend=None, remetente=None, nome=None):
+        self.backend = backend
+        self.remetente = remetente
+        self.nome = nome or backend or 'django'
+        self._conexao = None
+
+    def abrir(self):
+        if self._conexao is None:
+            self._conexao = mail.get_connection(self.backend)
+            self._conexao.open()
+
+    def fechar(self):
+        if self._conexao is not None:
+            self._conexao.close()
+            self._conexao = None
+
+    def enviar(self, mensagem):
+        with span("email.send", certificado=mensagem.certificado_id, pdf_bytes=len(mensagem.anexo),
+                  backend=self.backend or settings.EMAIL_BACKEND):
+            email = mail.EmailMessage(
+                subject=mensagem.assunto,
+                body=mensagem.corpo,
+                from_email=self.remetente or remetente_padrao(),
+                to=[mensagem.destinatario],
+                headers={"Message-ID": make_msgid()},
+            )
+            email.attach(mensagem.nome_anexo, mensagem.anexo, "application/pdf")
+            try:
+                if self._conexao is None:
+                    with self:
+                        self._conexao.send_messages([email])
+                else:
+                    self._conexao.send_messages([email])
+            except smtplib.SMTPResponseException as exc:
+                if exc.smtp_code in CODIGOS_LIMITE_SMTP:
+                    raise LimiteTransporte(f"SMTP {exc.smtp_code}: {exc.smtp_error!r}") from exc
+                raise
+        return email.extra_headers["Message-ID"]
+
+
+def obter_transporte(nome=None) -> TransporteEmail:
+    nome = nome or getattr(settings, "CERTIFICADOS_TRANSPORTE_EMAIL", "graph")
+    if nome == "graph":
+        return TransporteGraph()
+    if nome in BACKENDS_DJANGO:
+        return TransporteDjango(BACKENDS_DJANGO[nome], nome=nome)
+    return import_string(nome)()
+
+
+@lru_cache(maxsize=4)
+def _graph_app(tenant_id, client_id, client_secret):
+    # Uma instância por credencial: o cache de tokens do MSAL fica em memória
+    # e o token vale para todos os envios até expirar
+    return msal.ConfidentialClientApplication(
+        client_id=client_id,
+        authority=f"https://login.microsoftonline.com/{tenant_id}",
+        client_credential=client_secret,
+    )
+
+
+def _graph_get_token() -> str:
+    tenant_id = getattr(settings, "MS_GRAPH_TENANT_ID", None)
+    client_id = getattr(settings, "MS_GRAPH_CLIENT_ID", None)
+    client_secret = getattr(settings, "MS_GRAPH_CLIENT_SECRET", None)
+
+    if not all([tenant_id, client_id, client_secret]):
+        raise RuntimeError(
+            "Configure MS_GRAPH_TENANT_ID, MS_GRAPH_CLIENT_ID, MS_GRAPH_CLIENT_SECRET no settings.py"
+        )
+
+    with span("graph.token") as atributos:
+        result = _graph_app(tenant_id, client_id, client_secret).acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
+        atributos["origem"] = result.get("token_source", "identity_provider")
+        if "access_token" not in result:
+            raise RuntimeError(f"Erro ao obter token Graph: {result.get('error')} - {result.get('error_description')}")
+    return result["access_token"]
+
+
+def _retry_after(valor):
+    """Segundos do header Retry-After (número ou data HTTP); None se ausente ou inválido."""
+    if not valor:
+        return None
+    try:
+        segundos = float(valor)
+    except ValueError:
+        try:
+            data = parsedate_to_datetime(valor)
+        except (TypeError, ValueError):
+            return None
+        if data.tzinfo is None:
+            data = data.replace(tzinfo=timezone.utc)
+        segundos = (data - datetime.now(timezone.utc)).total_seconds()
+    return max(segundos, 0.0) if math.isfinite(segundos) else None
+
+
+def _graph_chamada(sessao, metodo, url, atributos, esperados, descricao, **kwargs):
+    """
+    Uma requisição ao Graph. Em 429/503 levanta LimiteTransporte com o
+    Retry-After, sem esperar: o envio fica "falhou" com proxima_tentativa e
+    o comando reenviar_certificados_pendentes tenta de novo.
+    """
+    atributos["requisicoes"] = atributos.get("requisicoes", 0) + 1
+    r = sessao.request(metodo, url, timeout=30, **kwargs)
+    atributos["http_status"] = r.status_code
+
+    if r.status_code in (429, 503) and r.status_code not in esperados:
+        espera = _retry_after(r.headers.get("Retry-After"))
+        atributos["retry_after"] = espera
+        raise LimiteTransporte(f"Graph {descricao} limitado: {r.status_code} - {r.text}", espera=espera)
+    if r.status_code not in esperados:
+        raise RuntimeError(f"Graph {descricao} falhou: {r.status_code} - {r.text}")
+    return r
+
+
+def _enviar_graph_inline(sessao, base, mensagem, filename, pdf_bytes, atributos):
+    # Graph sendMail exige anexos em base64
+    attachment_b64 = base64.b64encode(pdf_bytes).decode("utf-8")
+    atributos["anexo_base64_bytes"] = len(attachment_b64)
+
+    payload = {
+        "message": {
+            **mensagem,
+            "attachments": [
+                {
+                    "@odata.type": "#microsoft.graph.fileAttachment",
+                    "name": filename,
+                    "contentType": "application/pdf",
+                    "contentBytes": attachment_b64,
+                }
+            ],
+        },
+        "saveToSentItems": True,
+    }
+    # 202 = OK (Accepted), sem corpo: o request-id é o que o suporte do Graph rastreia
+    r = _graph_chamada(sessao, "POST", f"{base}/sendMail", atributos, (202,), "sendMail", json=payload)
+    return r.headers.get("request-id")
+
+
+def _enviar_graph_upload(sessao, base, mensagem, filename, pdf_bytes, atributos) -> str:
+    """
+    Anexos acima do limite do sendMail (~3 MB): rascunho + upload session
+    com o PDF em partes binárias (sem base64) + send. O rascunho é apagado
+    se algo falhar antes do envio.
+    """
+    rascunho = _graph_chamada(sessao, "POST", f"{base}/messages", atributos, (201,), "criação do rascunho",
+                              json=mensagem).json()
+    url_mensagem = f"{base}/messages/{rascunho['id']}"
+    try:
+        sessao_upload = _graph_chamada(
+            sessao, "POST", f"{url_mensagem}/attachments/createUploadSession", atributos, (201,),
+            "createUploadSession",
+            json={"AttachmentItem": {
+                "attachmentType": "file",
+                "name": filename,
+                "size": len(pdf_bytes),
+                "contentType": "application/pdf",
+            }},
+        ).json()
+
+        total = len(pdf_bytes)
+        dados = memoryview(pdf_bytes)
+        tamanho_parte = getattr(settings, "MS_GRAPH_TAMANHO_PARTE_UPLOAD", TAMANHO_PARTE_UPLOAD)
+        for inicio in range(0, total, tamanho_parte):
+            parte = dados[inicio:inicio + tamanho_parte]
+            fim = inicio + len(parte) - 1
+            atributos["partes"] = atributos.get("partes", 0) + 1
+            # A uploadUrl já é autenticada: o Graph recusa o header Authorization nela
+            _graph_chamada(
+                sessao, "PUT", sessao_upload["uploadUrl"], atributos, (200, 201), "upload do anexo",
+                data=parte.tobytes(),
+                headers={
+                    "Authorization": None,
+                    "Content-Type": "application/octet-stream",
+                    "Content-Range": f"bytes {inicio}-{fim}/{total}",
+                },
+            )
+
+        _graph_chamada(sessao, "POST", f"{url_mensagem}/send", atributos, (202,), "send")
+    except Exception:
+        try:
+            sessao.delete(url_mensagem, timeout=30)
+        except requests.RequestException:
+            logger.warning("Não foi possível apagar o rascunho %s", rascunho["id"], exc_info=True)
+        raise
+    return rascunho.get("internetMessageId") or rascunho["id"]
+
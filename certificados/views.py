@@ -1,11 +1,15 @@
+import logging
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.views.decorators.http import require_http_methods
-from django.urls import reverse
 from .models import (Certificado, CursoAgendamento, Inscricao, Cliente, 
                      Questionario, RespostaUsuario, ItemRespostaUsuario)
 from .forms import CertificadoForm, InscricaoPublicaForm, QuestionarioForm
-from .services import gerar_certificado_pdf_bytes, enviar_certificado_email
+from .services import gerar_certificado_pdf_bytes, registrar_inscricao
+from .envios import enviar_certificado, status_email
+
+logger = logging.getLogger(__name__)
 
 
 def criar_certificado(request):
@@ -71,29 +75,8 @@ def inscricao_publica(request):
                 {'form': form, 'agendamento': agendamento, 'agendamento_id': agendamento_id}
             )
 
-        cpf = form.cleaned_data['cpf']
-        email = form.cleaned_data['email']
-
-        # 4) criar ou atualizar cliente corretamente
-        cliente, created = Cliente.objects.update_or_create(
-            cpf=cpf,
-            defaults={
-                'nome': form.cleaned_data['nome'],
-                'email': email,
-                'data_nascimento': form.cleaned_data['data_nascimento'],
-                'telefone': form.cleaned_data.get('telefone', ''),
-                'endereco': form.cleaned_data.get('endereco', ''),
-                'empresa': form.cleaned_data.get('empresa', ''),
-            }
-        )
-
-        Inscricao.objects.get_or_create(agendamento=agendamento, cliente=cliente)
-
-        certificado, _ = Certificado.objects.get_or_create(
-            cliente=cliente,
-            curso=agendamento.curso,
-            agendamento=agendamento,
-        )
+        # 4) cliente, inscrição e certificado numa única transação
+        certificado = registrar_inscricao(agendamento, form.cleaned_data)
 
         # Após gravar a inscrição, o próximo passo obrigatório é o questionário.
         return redirect('certificados:responder_questionario', certificado_id=certificado.id)
@@ -111,7 +94,7 @@ def inscricao_publica(request):
 def responder_questionario(request, certificado_id):
     """View para responder o questionário após emissão do certificado"""
     certificado = get_object_or_404(
-        Certificado.objects.select_related('cliente', 'curso', 'agendamento'),
+        Certificado.objects.select_related('cliente', 'curso__modelo_certificado', 'agendamento'),
         pk=certificado_id
     )
     
@@ -189,17 +172,14 @@ def responder_questionario(request, certificado_id):
                         }
                     )
 
-            # O certificado é enviado somente após o questionário respondido.
-            email_status = 'enviado'
+            # O certificado é enviado somente após o questionário respondido;
+            # um POST repetido reutiliza o mesmo EnvioCertificado e não reenvia.
             try:
-                pdf_bytes = gerar_certificado_pdf_bytes(certificado)
-                enviar_certificado_email(certificado, pdf_bytes)
-            except Exception as e:
-                print("ERRO AO GERAR/ENVIAR CERTIFICADO:", repr(e))
-                email_status = 'pendente'
-
-            agradecimento_url = reverse('certificados:agradecimento_questionario', args=[certificado_id])
-            return redirect(f'{agradecimento_url}?email_status={email_status}')
+                enviar_certificado(certificado, lambda: gerar_certificado_pdf_bytes(certificado))
+            except Exception:
+                logger.exception("Erro ao gerar/enviar certificado %s", certificado.pk)
+
+            return redirect('certificados:agradecimento_questionario', certificado_id=certificado_id)
     else:
         form = QuestionarioForm(questionario)
     
@@ -218,7 +198,7 @@ def agradecimento_questionario(request, certificado_id):
         Certificado.objects.select_related('cliente', 'curso', 'agendamento'),
         pk=certificado_id
     )
-    email_status = request.GET.get('email_status')
+    email_status = status_email(certificado)
     
     return render(request, 'certificados/agradecimento_questionario.html', {
         'certificado': certificado,
@@ -1,21 +1,65 @@
 
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db.models import Max, Min, Q
+from django.http import HttpResponseRedirect, JsonResponse
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
 from django.utils.translation import gettext_lazy as _
 from . import models
+from .capacidade import (aplicar_alteracoes_carga, grade_carga_projeto, ler_alteracoes, matriz_utilizacao,
+                         semanas_do_periodo)
+from .forms import EditorCargaForm, PeriodoEquipeForm
+from .previsao import JANELA_PADRAO, celulas_exibicao, prever_saturacao
+from .services import chave_cache_anos
 import datetime
 
+ANOS_CACHE_SEGUNDOS = 600
+
 # --- Filtres personnalisés ---
 
+def anos_disponiveis(model_admin, request):
+    """Années distinctes de data_inicio_semana, calculées en base et mises en cache."""
+    chave = chave_cache_anos(model_admin.model)
+    anos = cache.get(chave)
+    if anos is None:
+        qs = model_admin.get_queryset(request).order_by()
+        anos = [d.year for d in qs.dates('data_inicio_semana', 'year')]
+        cache.set(chave, anos, timeout=ANOS_CACHE_SEGUNDOS)
+    return anos
+
+def limites_datas(queryset):
+    """Première et dernière data_inicio_semana, sans cache: une année écrite par le système amont entre tout de suite."""
+    limites = queryset.order_by().aggregate(primeira=Min('data_inicio_semana'), ultima=Max('data_inicio_semana'))
+    return limites['primeira'], limites['ultima']
+
+def intervalo_ano(ano):
+    return Q(data_inicio_semana__gte=datetime.date(ano, 1, 1), data_inicio_semana__lt=datetime.date(ano + 1, 1, 1))
+
+def intervalo_mes(ano, mes):
+    inicio = datetime.date(ano, mes, 1)
+    fim = datetime.date(ano + (mes == 12), mes % 12 + 1, 1)
+    return Q(data_inicio_semana__gte=inicio, data_inicio_semana__lt=fim)
+
+def intervalo_semana_iso(ano_iso, semana):
+    """Semaine ISO (année ISO, numéro) -> plage [lundi, lundi + 7 jours), ou None si elle n'existe pas."""
+    try:
+        inicio = datetime.date.fromisocalendar(ano_iso, semana, 1)
+    except ValueError:
+        return None
+    return Q(data_inicio_semana__gte=inicio, data_inicio_semana__lt=inicio + datetime.timedelta(days=7))
+
 class YearListFilter(admin.SimpleListFilter):
     title = _('Ano')
     parameter_name = 'annee'
     def lookups(self, request, model_admin):
-        qs = model_admin.get_queryset(request)
-        years = sorted({d.year for d in qs.values_list('data_inicio_semana', flat=True) if d})
-        return [(y, str(y)) for y in years]
+        return [(y, str(y)) for y in anos_disponiveis(model_admin, request)]
     def queryset(self, request, queryset):
-        if self.value():
-            return queryset.filter(data_inicio_semana__year=int(self.value()))
+        # avec une semaine choisie, l'année est l'année ISO (cf. IsoWeekListFilter)
+        if self.value() and IsoWeekListFilter.parameter_name not in request.GET:
+            # intervalle de dates (sargable) au lieu de YEAR(col) = x
+            return queryset.filter(intervalo_ano(int(self.value())))
         return queryset
 
 class MonthListFilter(admin.SimpleListFilter):
@@ -25,7 +69,18 @@ class MonthListFilter(admin.SimpleListFilter):
         return [(i, datetime.date(2000, i, 1).strftime('%b')) for i in range(1,13)]
     def queryset(self, request, queryset):
         if self.value():
-            return queryset.filter(data_inicio_semana__month=int(self.value()))
+            mes = int(self.value())
+            ano = request.GET.get(YearListFilter.parameter_name)
+            if ano:
+                anos = [int(ano)]
+            else:
+                primeira, ultima = limites_datas(queryset)
+                anos = range(primeira.year, ultima.year + 1) if primeira else []
+            # un intervalle par année: OR de plages indexables au lieu de MONTH(col) = x
+            filtro = Q(pk__in=[])
+            for a in anos:
+                filtro |= intervalo_mes(a, mes)
+            return queryset.filter(filtro)
         return queryset
 
 class IsoWeekListFilter(admin.SimpleListFilter):
@@ -36,9 +91,20 @@ class IsoWeekListFilter(admin.SimpleListFilter):
         return [(i, f"S{i:02d}") for i in range(1,54)]
     def queryset(self, request, queryset):
         if self.value():
-            # Django 4.2: use ExtractWeek/ExtractIsoWeek? We'll use iso week via extra or week
-            from django.db.models.functions import ExtractWeek
-            return queryset.annotate(week=ExtractWeek('data_inicio_semana')).filter(week=int(self.value()))
+            semana = int(self.value())
+            ano = request.GET.get(YearListFilter.parameter_name)
+            if ano:
+                anos_iso = [int(ano)]
+            else:
+                # une date de fin décembre / début janvier peut appartenir à l'année ISO voisine
+                primeira, ultima = limites_datas(queryset)
+                anos_iso = range(primeira.isocalendar()[0], ultima.isocalendar()[0] + 1) if primeira else []
+            filtro = Q(pk__in=[])
+            for a in anos_iso:
+                intervalo = intervalo_semana_iso(a, semana)
+                if intervalo is not None:
+                    filtro |= intervalo
+            return queryset.filter(filtro)
         return queryset
 
 # --- Admins ---
@@ -51,6 +117,7 @@ class EquipeAdmin(admin.ModelAdmin):
 @admin.register(models.Consultor)
 class ConsultorAdmin(admin.ModelAdmin):
     list_display = ('id_consultor','nome','id_equipe')
+    list_select_related = ('id_equipe',)
     list_filter = ('id_equipe',)
     search_fields = ('nome',)
 
@@ -62,10 +129,131 @@ class ProjetoAdmin(admin.ModelAdmin):
 @admin.register(models.CargaSemanalPotencial)
 class CargaAdmin(admin.ModelAdmin):
     list_display = ('id_carga','id_consultor','id_projeto','data_inicio_semana','tipo','dias')
+    list_select_related = ('id_consultor','id_projeto')
     list_filter = (YearListFilter, MonthListFilter, IsoWeekListFilter, 'id_consultor','id_projeto','tipo')
     search_fields = ('id_consultor__nome','id_projeto__nome')
-    
-    
+    change_list_template = 'admin/core/cargasemanalpotencial/change_list.html'
+
+    def get_urls(self):
+        custom_urls = [
+            path('utilizacao/', self.admin_site.admin_view(self.utilizacao_view),
+                 name='core_cargasemanalpotencial_utilizacao'),
+            path('editor/', self.admin_site.admin_view(self.editor_view),
+                 name='core_cargasemanalpotencial_editor'),
+            path('previsao/', self.admin_site.admin_view(self.previsao_view),
+                 name='core_cargasemanalpotencial_previsao'),
+            path('previsao.json', self.admin_site.admin_view(self.previsao_json_view),
+                 name='core_cargasemanalpotencial_previsao_json'),
+        ]
+        return custom_urls + super().get_urls()
+
+    def utilizacao_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        form = PeriodoEquipeForm(request.GET or None)
+        matriz = None
+        if form.is_valid():
+            equipe = form.cleaned_data['equipe']
+            matriz = matriz_utilizacao(form.cleaned_data['inicio'], form.cleaned_data['fim'],
+                                       equipe.pk if equipe else None)
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Capacidade x carga por semana',
+            'opts': self.model._meta,
+            'form': form,
+            'matriz': matriz,
+        }
+        return TemplateResponse(request, 'admin/core/utilizacao.html', context)
+
+    def editor_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        form = EditorCargaForm(request.GET or None)
+        semanas, linhas = [], []
+        if form.is_valid():
+            projeto = form.cleaned_data['projeto']
+            equipe = form.cleaned_data['equipe']
+            inicio, fim = form.cleaned_data['inicio'], form.cleaned_data['fim']
+            equipe_id = equipe.pk if equipe else None
+
+            if request.method == 'POST':
+                if not self.has_change_permission(request):
+                    raise PermissionDenied
+                consultores = models.Consultor.objects.all()
+                if equipe_id:
+                    consultores = consultores.filter(id_equipe=equipe_id)
+                consultores = set(consultores.values_list('pk', flat=True))
+                try:
+                    alteracoes = ler_alteracoes(request.POST.get('alteracoes', '{}'), consultores,
+                                                set(semanas_do_periodo(inicio, fim)))
+                except ValueError as exc:
+                    messages.error(request, f'Alterações inválidas: {exc}')
+                else:
+                    criadas, atualizadas, removidas = aplicar_alteracoes_carga(projeto.pk, alteracoes)
+                    messages.success(request, f'{criadas} criada(s), {atualizadas} atualizada(s), {removidas} removida(s).')
+                    return HttpResponseRedirect(request.get_full_path())
+
+            semanas, linhas = grade_carga_projeto(projeto.pk, inicio, fim, equipe_id)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Editor de carga semanal por projeto',
+            'opts': self.model._meta,
+            'form': form,
+            'semanas': semanas,
+            'linhas': linhas,
+            'pode_editar': self.has_change_permission(request),
+        }
+        return TemplateResponse(request, 'admin/core/editor_carga.html', context)
+
+    def _previsao(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        form = PeriodoEquipeForm(request.GET or None)
+        try:
+            janela = min(max(int(request.GET.get('janela', JANELA_PADRAO)), 1), 26)
+        except ValueError:
+            janela = JANELA_PADRAO
+        if not form.is_valid():
+            return form, None
+        equipe = form.cleaned_data['equipe']
+        return form, prever_saturacao(form.cleaned_data['inicio'], form.cleaned_data['fim'],
+                                      equipe.pk if equipe else None, janela)
+
+    def previsao_view(self, request):
+        form, previsao = self._previsao(request)
+        equipes = []
+        if previsao:
+            equipes = [
+                {
+                    'nome': equipe['nome'],
+                    'celulas': celulas_exibicao(equipe),
+                    'semanas_saturadas': equipe['semanas_saturadas'],
+                    'consultores': [
+                        {'nome': c['consultor'], 'celulas': celulas_exibicao(c), 'semanas_saturadas': c['semanas_saturadas']}
+                        for c in equipe['consultores']
+                    ],
+                }
+                for equipe in previsao['equipes']
+            ]
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Previsão de saturação',
+            'opts': self.model._meta,
+            'form': form,
+            'previsao': previsao,
+            'equipes': equipes,
+            'json_url': reverse('admin:core_cargasemanalpotencial_previsao_json') + '?' + request.GET.urlencode(),
+        }
+        return TemplateResponse(request, 'admin/core/previsao.html', context)
+
+    def previsao_json_view(self, request):
+        form, previsao = self._previsao(request)
+        if previsao is None:
+            return JsonResponse({'errors': form.errors}, status=400)
+        return JsonResponse(previsao)
+
+
 admin.site.site_header = "Lean Way Consulting — Administração"
 admin.site.site_title = "Lean Way Consulting"
 admin.site.index_title = "Painel de Gestão"
@@ -0,0 +1,252 @@
+"""
+Matriz semanal de utilização (consultores x semanas).
+
+Capacidade e carga vêm de duas consultas agregadas (GROUP BY consultor,
+semana) e são pivotadas em Python; o resultado fica em cache por
+(équipe, período, versão dos dados).
+"""
+import datetime
+import json
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from .db_router import leitura_replica
+from .models import CargaSemanalPotencial, Consultor
+from .services import incrementar_versao_capacidade, invalidar_cache_anos, versao_dados_capacidade
+from .snapshot import modelos_relatorio
+
+CACHE_SEGUNDOS = 300
+SEM_EQUIPE = 'Sem équipe'
+# O editor em lote só mexe nas linhas do tipo padrão do modelo ('Real')
+TIPO_CARGA_EDITOR = CargaSemanalPotencial._meta.get_field('tipo').default
+# Dias é DECIMAL(5, 0)
+LIMITE_DIAS = 99999
+
+
+def inicio_da_semana(data: datetime.date) -> datetime.date:
+    return data - datetime.timedelta(days=data.weekday())
+
+
+def semanas_do_periodo(inicio, fim):
+    """Segundas-feiras de inicio até fim (inclusive)."""
+    semana = inicio_da_semana(inicio)
+    semanas = []
+    while semana <= fim:
+        semanas.append(semana)
+        semana += datetime.timedelta(days=7)
+    return semanas
+
+
+def totais_por_consultor_semana(model, campo, inicio, fim, equipe_id=None):
+    """{(id_consultor, semana): total} numa única consulta agregada (model pode ser um queryset)."""
+    qs = model.objects.all() if hasattr(model, 'objects') else model
+    # Até o fim da semana de `fim`: linhas fora da segunda-feira caem na semana delas
+    fim_semana = inicio_da_semana(fim) + datetime.timedelta(days=6)
+    qs = qs.filter(data_inicio_semana__gte=inicio, data_inicio_semana__lte=fim_semana)
+    if equipe_id:
+        qs = qs.filter(id_consultor__id_equipe=equipe_id)
+    linhas = (
+        qs.order_by()
+        .values_list('id_consultor', 'data_inicio_semana')
+        .annotate(total=Sum(campo))
+    )
+    totais = defaultdict(Decimal)
+    for consultor, semana, total in linhas:
+        totais[(consultor, inicio_da_semana(semana))] += total or 0
+    return totais
+
+
+def _celula(capacidade, carga):
+    capacidade = capacidade or Decimal(0)
+    carga = carga or Decimal(0)
+    utilizacao = float(carga / capacidade) if capacidade else None
+    if carga > capacidade:
+        classe = 'sobrecarga'
+    elif utilizacao is not None and utilizacao >= 0.9:
+        classe = 'cheio'
+    elif not capacidade and not carga:
+        classe = 'vazio'
+    else:
+        classe = ''
+    return {
+        'capacidade': capacidade,
+        'carga': carga,
+        'utilizacao': utilizacao,
+        'classe': classe,
+        # Texto pronto: evita filtros de template em ~20 mil células
+        'texto': '' if classe == 'vazio' else f'{carga.normalize():f}/{capacidade.normalize():f}',
+    }
+
+
+def matriz_utilizacao(inicio, fim, equipe_id=None):
+    """
+    Retorna {'semanas': [...], 'equipes': [{'nome', 'consultores': [
+    {'consultor', 'celulas', 'sobrecargas'}], 'celulas'}]}.
+    """
+    inicio = inicio_da_semana(inicio)
+    chave = f'core:utilizacao:{versao_dados_capacidade()}:{equipe_id or "todas"}:{inicio}:{fim}'
+    matriz = cache.get(chave)
+    if matriz is not None:
+        return matriz
+
+    modelo_capacidade, modelo_carga, modelo_consultor = modelos_relatorio()
+    with leitura_replica():
+        semanas = semanas_do_periodo(inicio, fim)
+        capacidades = totais_por_consultor_semana(modelo_capacidade, 'dias_disponiveis', inicio, fim, equipe_id)
+        cargas = totais_por_consultor_semana(modelo_carga, 'dias', inicio, fim, equipe_id)
+
+        consultores = modelo_consultor.objects.select_related('id_equipe').order_by('id_equipe__nome', 'nome')
+        if equipe_id:
+            consultores = consultores.filter(id_equipe=equipe_id)
+        consultores = list(consultores)
+
+    por_equipe = defaultdict(list)
+    for consultor in consultores:
+        celulas = [
+            _celula(capacidades.get((consultor.pk, s)), cargas.get((consultor.pk, s)))
+            for s in semanas
+        ]
+        por_equipe[consultor.id_equipe.nome if consultor.id_equipe else SEM_EQUIPE].append({
+            'consultor': consultor.nome,
+            'celulas': celulas,
+            'sobrecargas': sum(1 for c in celulas if c['classe'] == 'sobrecarga'),
+        })
+
+    equipes = []
+    for nome, linhas in por_equipe.items():
+        # Total da équipe por semana (soma das colunas)
+        totais = [
+            _celula(
+                sum((linha['celulas'][i]['capacidade'] for linha in linhas), Decimal(0)),
+                sum((linha['celulas'][i]['carga'] for linha in linhas), Decimal(0)),
+            )
+            for i in range(len(semanas))
+        ]
+        equipes.append({'nome': nome, 'consultores': linhas, 'celulas': totais})
+
+    matriz = {'semanas': semanas, 'equipes': equipes}
+    cache.set(chave, matriz, timeout=CACHE_SEGUNDOS)
+    return matriz
+
+
+def grade_carga_projeto(projeto_id, inicio, fim, equipe_id=None):
+    """
+    Grade consultor x semana com os dias de carga de um projeto, para o
+    editor em lote. Retorna (semanas, [{'consultor', 'valores'}]).
+    """
+    semanas = semanas_do_periodo(inicio, fim)
+    cargas = totais_por_consultor_semana(
+        CargaSemanalPotencial.objects.filter(id_projeto=projeto_id, tipo=TIPO_CARGA_EDITOR),
+        'dias', semanas[0], fim, equipe_id,
+    )
+    consultores = Consultor.objects.select_related('id_equipe').order_by('id_equipe__nome', 'nome')
+    if equipe_id:
+        consultores = consultores.filter(id_equipe=equipe_id)
+    linhas = [
+        {
+            'consultor': consultor,
+            'valores': [
+                (semana, cargas.get((consultor.pk, semana)))
+                for semana in semanas
+            ],
+        }
+        for consultor in consultores
+    ]
+    return semanas, linhas
+
+
+def _dias(valor) -> int:
+    """Inteiro (não bool) ou texto só com dígitos; vazio/null é 0. Frações são recusadas, não truncadas."""
+    if valor is None or valor == '':
+        return 0
+    if isinstance(valor, int) and not isinstance(valor, bool):
+        return valor
+    if isinstance(valor, str) and valor.strip().isascii() and valor.strip().isdigit():
+        return int(valor)
+    raise ValueError(valor)
+
+
+def ler_alteracoes(texto_json, consultores_validos, semanas_validas):
+    """
+    Converte o JSON enviado pela grade ({"<id_consultor>|<AAAA-MM-DD>": "<dias>"})
+    em {(id_consultor, semana): dias}. Levanta ValueError se algo for inválido.
+    """
+    dados = json.loads(texto_json or '{}')
+    if not isinstance(dados, dict):
+        raise ValueError('formato inesperado')
+
+    alteracoes = {}
+    for chave, valor in dados.items():
+        consultor, _, semana = str(chave).partition('|')
+        try:
+            consultor = int(consultor)
+            semana = datetime.date.fromisoformat(semana)
+            dias = _dias(valor)
+        except (TypeError, ValueError):
+            raise ValueError(f'valor inválido em {chave}: {valor!r}') from None
+        if consultor not in consultores_validos or semana not in semanas_validas:
+            raise ValueError(f'célula fora da grade: {chave}')
+        if not 0 <= dias <= LIMITE_DIAS:
+            raise ValueError(f'valor fora do intervalo em {chave}: {valor}')
+        alteracoes[(consultor, semana)] = dias
+    return alteracoes
+
+
+def aplicar_alteracoes_carga(projeto_id, alteracoes, tamanho_lote=500):
+    """
+    Aplica {(id_consultor, semana): dias} à CargaSemanalPotencial do projeto.
+
+    O estado atual das células alteradas é lido numa consulta; o diff vira
+    bulk_create / bulk_update / delete dentro de uma única transação.
+    dias = 0 remove a linha. Retorna (criadas, atualizadas, removidas).
+    """
+    if not alteracoes:
+        return 0, 0, 0
+
+    consultores = {consultor for consultor, _ in alteracoes}
+    semanas = [semana for _, semana in alteracoes]
+    novas, atualizar, remover = [], [], []
+
+    with transaction.atomic():
+        atuais = defaultdict(list)
+        existentes = CargaSemanalPotencial.objects.filter(
+            id_projeto=projeto_id,
+            tipo=TIPO_CARGA_EDITOR,
+            id_consultor__in=consultores,
+            data_inicio_semana__gte=min(semanas),
+            data_inicio_semana__lt=max(semanas) + datetime.timedelta(days=7),
+        ).order_by('pk')
+        for carga in existentes:
+            atuais[(carga.id_consultor_id, inicio_da_semana(carga.data_inicio_semana))].append(carga)
+
+        for (consultor, semana), dias in alteracoes.items():
+            linhas = atuais.get((consultor, semana), [])
+            if not dias:
+                remover.extend(linha.pk for linha in linhas)
+                continue
+            if not linhas:
+                novas.append(CargaSemanalPotencial(
+                    id_consultor_id=consultor, id_projeto_id=projeto_id,
+                    data_inicio_semana=semana, dias=dias,
+                ))
+                continue
+            # Linhas duplicadas para a mesma célula são consolidadas na primeira
+            primeira, *extras = linhas
+            remover.extend(linha.pk for linha in extras)
+            if primeira.dias != dias or extras:
+                primeira.dias = dias
+                atualizar.append(primeira)
+
+        CargaSemanalPotencial.objects.bulk_create(novas, batch_size=tamanho_lote)
+        CargaSemanalPotencial.objects.bulk_update(atualizar, ['dias'], batch_size=tamanho_lote)
+        for inicio in range(0, len(remover), tamanho_lote):
+            CargaSemanalPotencial.objects.filter(pk__in=remover[inicio:inicio + tamanho_lote]).delete()
+
+    # Operações em lote não disparam post_save/post_delete
+    invalidar_cache_anos(CargaSemanalPotencial)
+    incrementar_versao_capacidade()
+    return len(novas), len(atualizar), len(remover)
@@ -0,0 +1,108 @@
+"""
+Roteamento de leitura para réplica (opcional).
+
+Somente as consultas marcadas com `leitura_replica` (dashboards, exportações,
+API de CPF) vão para o alias `replica`. Sem réplica configurada, tudo segue
+no `default`.
+
+Dentro de um `escopo_escrita` (o ReplicaStickyMiddleware abre um por
+request), a primeira escrita fixa as leituras seguintes do escopo no
+primário. Fora dele (comandos, threads) escrever não muda o roteamento.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = 'replica'
+
+_ler_da_replica = ContextVar('ler_da_replica', default=False)
+_fixar_primario = ContextVar('fixar_primario', default=False)
+_escopo_escrita = ContextVar('escopo_escrita', default=None)
+
+
+class EscopoEscrita:
+    """Estado de um escopo_escrita: `escreveu` fica True na primeira escrita."""
+    __slots__ = ('escreveu',)
+
+    def __init__(self):
+        self.escreveu = False
+
+
+def replica_configurada() -> bool:
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def leitura_replica():
+    """Permite que as leituras do bloco sejam atendidas pela réplica."""
+    token = _ler_da_replica.set(True)
+    try:
+        yield
+    finally:
+        _ler_da_replica.reset(token)
+
+
+def usar_replica(view_func):
+    """Decorator para views somente-leitura (analytics)."""
+    @wraps(view_func)
+    def _wrapped(*args, **kwargs):
+        with leitura_replica():
+            return view_func(*args, **kwargs)
+    return _wrapped
+
+
+@contextmanager
+def fixar_primario():
+    """Força leituras no primário (ex.: logo após uma escrita do usuário)."""
+    token = _fixar_primario.set(True)
+    try:
+        yield
+    finally:
+        _fixar_primario.reset(token)
+
+
+@contextmanager
+def escopo_escrita():
+    """Leituras após uma escrita no bloco vão para o primário (read-your-writes)."""
+    escopo = EscopoEscrita()
+    token = _escopo_escrita.set(escopo)
+    try:
+        yield escopo
+    finally:
+        _escopo_escrita.reset(token)
+
+
+class ReplicaRouter:
+    """Envia leituras marcadas para a réplica; escritas sempre no default."""
+
+    def db_for_read(self, model, **hints):
+        # DatabaseCache, se configurado: cache e limite de taxa nunca leem da réplica atrasada
+        if model._meta.app_label == 'django_cache':
+            return None
+        if _fixar_primario.get() or not _ler_da_replica.get():
+            return None
+        escopo = _escopo_escrita.get()
+        if escopo is not None and escopo.escreveu:
+            return None
+        if not replica_configurada():
+            return None
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Depois de escrever, o restante do escopo (request) lê do primário
+        escopo = _escopo_escrita.get()
+        if escopo is not None:
+            escopo.escreveu = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e primário têm o mesmo conteúdo
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
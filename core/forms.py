@@ -0,0 +1,45 @@
+import datetime
+
+from django import forms
+
+from .models import Equipe, Projeto
+
+
+class PeriodoEquipeForm(forms.Form):
+    """Filtro (équipe, período) das telas de capacidade"""
+    equipe = forms.ModelChoiceField(Equipe.objects.order_by('nome'), required=False, empty_label='Todas')
+    inicio = forms.DateField(label='De', widget=forms.DateInput(attrs={'type': 'date'}))
+    fim = forms.DateField(label='Até', widget=forms.DateInput(attrs={'type': 'date'}))
+
+    MAX_SEMANAS = 156
+
+    def __init__(self, data=None, *args, semanas_padrao=26, **kwargs):
+        hoje = datetime.date.today()
+        inicio = hoje - datetime.timedelta(days=hoje.weekday())
+        padrao = {
+            'inicio': inicio.isoformat(),
+            'fim': (inicio + datetime.timedelta(weeks=semanas_padrao) - datetime.timedelta(days=1)).isoformat(),
+        }
+        data = {**padrao, **{k: v for k, v in (data or {}).items() if v}}
+        super().__init__(data, *args, **kwargs)
+
+    def clean(self):
+        dados = super().clean()
+        inicio, fim = dados.get('inicio'), dados.get('fim')
+        if inicio and fim:
+            if fim < inicio:
+                raise forms.ValidationError('A data final deve ser posterior à inicial.')
+            if (fim - inicio).days > self.MAX_SEMANAS * 7:
+                raise forms.ValidationError(f'Período máximo: {self.MAX_SEMANAS} semanas.')
+        return dados
+
+
+class EditorCargaForm(PeriodoEquipeForm):
+    """Projeto + período do editor em lote de CargaSemanalPotencial"""
+    projeto = forms.ModelChoiceField(Projeto.objects.order_by('nome'))
+
+    MAX_SEMANAS = 53
+
+    def __init__(self, data=None, *args, **kwargs):
+        kwargs.setdefault('semanas_padrao', 12)
+        super().__init__(data, *args, **kwargs)
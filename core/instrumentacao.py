@@ -0,0 +1,152 @@
+"""
+Métricas por requisição (consultas SQL, tempo de banco, de renderização e
+total), agregadas por endpoint em memória, e spans de etapas internas
+(PDF, token, envio) emitidos como log JSON.
+
+As amostras ficam numa janela circular por endpoint, dentro do processo:
+com vários workers cada um tem a sua. Alimentado pelo
+InstrumentacaoMiddleware (core.middleware).
+"""
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # opcional
+    otel_trace = None
+
+AMOSTRAS_PADRAO = 1000
+
+
+class Medicao:
+    """Acumula consultas e tempo de banco de uma requisição (execute_wrapper)."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tempo_db = 0.0
+        self.tempo_render = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo_db += time.perf_counter() - inicio
+            self.consultas += 1
+
+    @property
+    def tempo_total(self):
+        return time.perf_counter() - self.inicio
+
+
+def percentil(valores_ordenados, p):
+    """Percentil por posição (nearest-rank) de uma lista já ordenada."""
+    if not valores_ordenados:
+        return 0.0
+    posicao = max(1, math.ceil(p / 100 * len(valores_ordenados)))
+    return valores_ordenados[posicao - 1]
+
+
+class RegistroMetricas:
+    def __init__(self, amostras=None):
+        self._amostras = amostras
+        self._lock = threading.Lock()
+        self._por_endpoint = {}
+
+    @property
+    def tamanho_janela(self):
+        return self._amostras or getattr(settings, 'INSTRUMENTACAO_AMOSTRAS', AMOSTRAS_PADRAO)
+
+    def registrar(self, endpoint, total, db, render, consultas):
+        with self._lock:
+            dados = self._por_endpoint.get(endpoint)
+            if dados is None:
+                dados = self._por_endpoint[endpoint] = {
+                    'requisicoes': 0,
+                    'amostras': deque(maxlen=self.tamanho_janela),
+                }
+            dados['requisicoes'] += 1
+            dados['amostras'].append((total, db, render, consultas))
+
+    def resumo(self):
+        """Lista de dicts por endpoint (tempos em ms), do maior p95 para o menor."""
+        with self._lock:
+            copia = {
+                endpoint: (dados['requisicoes'], list(dados['amostras']))
+                for endpoint, dados in self._por_endpoint.items()
+            }
+
+        linhas = []
+        for endpoint, (requisicoes, amostras) in copia.items():
+            totais = sorted(a[0] for a in amostras)
+            dbs = sorted(a[1] for a in amostras)
+            renders = sorted(a[2] for a in amostras)
+            consultas = sorted(a[3] for a in amostras)
+            linhas.append({
+                'endpoint': endpoint,
+                'requisicoes': requisicoes,
+                'amostras': len(amostras),
+                'total_p50': percentil(totais, 50) * 1000,
+                'total_p95': percentil(totais, 95) * 1000,
+                'total_p99': percentil(totais, 99) * 1000,
+                'db_p50': percentil(dbs, 50) * 1000,
+                'db_p95': percentil(dbs, 95) * 1000,
+                'render_p95': percentil(renders, 95) * 1000,
+                'consultas_p50': percentil(consultas, 50),
+                'consultas_max': consultas[-1] if consultas else 0,
+            })
+        linhas.sort(key=lambda linha: linha['total_p95'], reverse=True)
+        return linhas
+
+    def limpar(self):
+        with self._lock:
+            self._por_endpoint.clear()
+
+
+registro = RegistroMetricas()
+
+
+logger_spans = logging.getLogger('core.instrumentacao.spans')
+
+
+def _atributo_otel(valor):
+    return valor if isinstance(valor, (str, bool, int, float)) else str(valor)
+
+
+@contextmanager
+def span(nome, **atributos):
+    """
+    Mede um trecho e emite {'span', 'status', 'duracao_ms', **atributos} no
+    logger core.instrumentacao.spans. O dict de atributos é devolvido para
+    ser completado dentro do bloco (tamanho, status HTTP, tentativas...).
+    Com INSTRUMENTACAO_OTEL = True e opentelemetry instalado, também abre um
+    span OpenTelemetry com os mesmos atributos.
+    """
+    with ExitStack() as pilha:
+        span_otel = None
+        if otel_trace is not None and getattr(settings, 'INSTRUMENTACAO_OTEL', False):
+            span_otel = pilha.enter_context(otel_trace.get_tracer('certificados').start_as_current_span(nome))
+
+        inicio = time.perf_counter()
+        status = 'ok'
+        try:
+            yield atributos
+        except Exception as exc:
+            status = 'erro'
+            atributos['erro'] = repr(exc)
+            raise
+        finally:
+            duracao_ms = round((time.perf_counter() - inicio) * 1000, 1)
+            logger_spans.info(json.dumps(
+                {'span': nome, 'status': status, 'duracao_ms': duracao_ms, **atributos}, default=str,
+            ))
+            if span_otel is not None:
+                span_otel.set_attributes({k: _atributo_otel(v) for k, v in atributos.items()})
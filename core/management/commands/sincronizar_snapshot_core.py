@@ -0,0 +1,39 @@
+"""
+Copia as tabelas do core (Equipe, Consultor, Projeto, CapacidadeSemanal,
+CargaSemanalPotencial) para as tabelas *_snapshot locais, só com o que mudou.
+Execute com: python manage.py sincronizar_snapshot_core [--apenas-novos]
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.snapshot import TABELAS, TAMANHO_LOTE, sincronizar_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Sincroniza incrementalmente as cópias locais das tabelas do core'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tabelas', nargs='*', help='Tabelas a sincronizar (padrão: todas)')
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help='Linhas lidas da origem por consulta')
+        parser.add_argument('--apenas-novos', action='store_true',
+                            help='Só copia ids acima do maior já copiado (não detecta alterações nem remoções)')
+
+    def handle(self, *args, **options):
+        conhecidas = {origem._meta.db_table for origem, _ in TABELAS}
+        desconhecidas = set(options['tabelas']) - conhecidas
+        if desconhecidas:
+            raise CommandError(f"Tabela(s) desconhecida(s): {', '.join(sorted(desconhecidas))}")
+
+        inicio = time.perf_counter()
+        resultados = sincronizar_snapshot(
+            tamanho_lote=options['lote'],
+            apenas_novos=options['apenas_novos'],
+            tabelas=options['tabelas'],
+        )
+        for r in resultados:
+            self.stdout.write(
+                f'{r.tabela}: {r.lidas} lida(s), {r.criadas} nova(s), '
+                f'{r.atualizadas} alterada(s), {r.removidas} removida(s)'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Sincronização concluída em {time.perf_counter() - inicio:.2f}s'))
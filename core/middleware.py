@@ -0,0 +1,107 @@
+import json
+import logging
+import time
+from contextlib import ExitStack, nullcontext
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .db_router import escopo_escrita, fixar_primario
+from .instrumentacao import Medicao, registro
+
+logger = logging.getLogger('core.instrumentacao')
+
+
+REPLICA_STICKY_COOKIE = 'ler_primario'
+
+
+class ReplicaStickyMiddleware:
+    """
+    Após um POST bem-sucedido (ex.: inscrição), fixa as leituras do mesmo
+    navegador no primário por alguns segundos, para não ler dados atrasados
+    da réplica.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sticky = REPLICA_STICKY_COOKIE in request.COOKIES
+        with escopo_escrita() as escopo, (fixar_primario() if sticky else nullcontext()):
+            response = self.get_response(request)
+
+        if escopo.escreveu and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            response.set_cookie(
+                REPLICA_STICKY_COOKIE,
+                '1',
+                max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 15),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+def _expor_server_timing(request):
+    if settings.DEBUG:
+        return True
+    usuario = getattr(request, 'user', None)
+    return bool(usuario is not None and usuario.is_authenticated and usuario.is_staff)
+
+
+class InstrumentacaoMiddleware:
+    """
+    Mede cada requisição (consultas SQL, tempo de banco, renderização e total),
+    registra uma linha de log JSON e agrega percentis por endpoint (view_name)
+    em core.instrumentacao.registro. O cabeçalho Server-Timing (que expõe os
+    tempos de banco) só vai para usuários staff ou com DEBUG.
+    Só é ativado com INSTRUMENTACAO_ATIVA = True.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTACAO_ATIVA', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicao = Medicao()
+        request._medicao = medicao
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(medicao))
+            response = self.get_response(request)
+
+        total = medicao.tempo_total
+        match = getattr(request, 'resolver_match', None)
+        # Rotas não resolvidas (404) ficam num único balde
+        endpoint = match.view_name if match else '<sem rota>'
+        registro.registrar(endpoint, total, medicao.tempo_db, medicao.tempo_render, medicao.consultas)
+
+        if _expor_server_timing(request):
+            response['Server-Timing'] = (
+                f'db;dur={medicao.tempo_db * 1000:.1f};desc="{medicao.consultas} consultas", '
+                f'render;dur={medicao.tempo_render * 1000:.1f}, '
+                f'total;dur={total * 1000:.1f}'
+            )
+        logger.info(json.dumps({
+            'endpoint': endpoint,
+            'metodo': request.method,
+            'status': response.status_code,
+            'consultas': medicao.consultas,
+            'db_ms': round(medicao.tempo_db * 1000, 1),
+            'render_ms': round(medicao.tempo_render * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+        }))
+        return response
+
+    def process_template_response(self, request, response):
+        # Chamado logo antes de response.render(); o callback marca o fim
+        medicao = getattr(request, '_medicao', None)
+        if medicao is not None:
+            inicio = time.perf_counter()
+
+            def fim_render(resposta):
+                medicao.tempo_render += time.perf_counter() - inicio
+
+            response.add_post_render_callback(fim_render)
+        return response
@@ -0,0 +1,145 @@
+# Generated by Django 4.2.15 on 2026-10-19 16:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CapacidadeSemanal',
+            fields=[
+                ('id_capacidade', models.AutoField(db_column='IdCapacidade', primary_key=True, serialize=False)),
+                ('data_inicio_semana', models.DateField(db_column='DataInicioSemana')),
+                ('dias_disponiveis', models.DecimalField(db_column='DiasDisponiveis', decimal_places=2, max_digits=5)),
+            ],
+            options={
+                'verbose_name': 'Carga Semanal',
+                'verbose_name_plural': 'Cargas Semanais',
+                'db_table': 'CapacidadeSemanal',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CargaSemanalPotencial',
+            fields=[
+                ('id_carga', models.AutoField(db_column='IdCarga', primary_key=True, serialize=False)),
+                ('data_inicio_semana', models.DateField(db_column='DataInicioSemana')),
+                ('tipo', models.CharField(db_column='Tipo', default='Real', editable=False, max_length=20)),
+                ('dias', models.DecimalField(db_column='Dias', decimal_places=0, max_digits=5)),
+            ],
+            options={
+                'verbose_name': 'Carga Semanal',
+                'verbose_name_plural': 'Cargas Semanais',
+                'db_table': 'CargaSemanalPotencial',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Consultor',
+            fields=[
+                ('id_consultor', models.AutoField(db_column='IdConsultor', primary_key=True, serialize=False)),
+                ('nome', models.CharField(db_column='Nome', max_length=200)),
+            ],
+            options={
+                'verbose_name': 'Consultor',
+                'verbose_name_plural': 'Consultores',
+                'db_table': 'Consultor',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Equipe',
+            fields=[
+                ('id_equipe', models.AutoField(db_column='IdEquipe', primary_key=True, serialize=False)),
+                ('nome', models.CharField(db_column='Nome', max_length=200)),
+            ],
+            options={
+                'verbose_name': 'Équipe',
+                'verbose_name_plural': 'Équipes',
+                'db_table': 'Equipe',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Projeto',
+            fields=[
+                ('id_projeto', models.AutoField(db_column='IdProjeto', primary_key=True, serialize=False)),
+                ('nome', models.CharField(db_column='Nome', max_length=200)),
+            ],
+            options={
+                'verbose_name': 'Projeto',
+                'verbose_name_plural': 'Projetos',
+                'db_table': 'Projeto',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='EquipeSnapshot',
+            fields=[
+                ('hash_linha', models.CharField(editable=False, max_length=32)),
+                ('id_equipe', models.IntegerField(primary_key=True, serialize=False)),
+                ('nome', models.CharField(max_length=200)),
+            ],
+            options={
+                'db_table': 'core_snapshot_equipe',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProjetoSnapshot',
+            fields=[
+                ('hash_linha', models.CharField(editable=False, max_length=32)),
+                ('id_projeto', models.IntegerField(primary_key=True, serialize=False)),
+                ('nome', models.CharField(max_length=200)),
+            ],
+            options={
+                'db_table': 'core_snapshot_projeto',
+            },
+        ),
+        migrations.CreateModel(
+            name='ConsultorSnapshot',
+            fields=[
+                ('hash_linha', models.CharField(editable=False, max_length=32)),
+                ('id_consultor', models.IntegerField(primary_key=True, serialize=False)),
+                ('nome', models.CharField(max_length=200)),
+                ('id_equipe', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='core.equipesnapshot')),
+            ],
+            options={
+                'db_table': 'core_snapshot_consultor',
+            },
+        ),
+        migrations.CreateModel(
+            name='CargaSemanalPotencialSnapshot',
+            fields=[
+                ('hash_linha', models.CharField(editable=False, max_length=32)),
+                ('id_carga', models.IntegerField(primary_key=True, serialize=False)),
+                ('data_inicio_semana', models.DateField(db_index=True)),
+                ('tipo', models.CharField(default='Real', max_length=20)),
+                ('dias', models.DecimalField(decimal_places=0, max_digits=5)),
+                ('id_consultor', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='core.consultorsnapshot')),
+                ('id_projeto', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='core.projetosnapshot')),
+            ],
+            options={
+                'db_table': 'core_snapshot_carga_semanal_potencial',
+            },
+        ),
+        migrations.CreateModel(
+            name='CapacidadeSemanalSnapshot',
+            fields=[
+                ('hash_linha', models.CharField(editable=False, max_length=32)),
+                ('id_capacidade', models.IntegerField(primary_key=True, serialize=False)),
+                ('data_inicio_semana', models.DateField(db_index=True)),
+                ('dias_disponiveis', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('id_consultor', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='core.consultorsnapshot')),
+            ],
+            options={
+                'db_table': 'core_snapshot_capacidade_semanal',
+            },
+        ),
+    ]
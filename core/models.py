@@ -63,3 +63,62 @@ class CargaSemanalPotencial(models.Model):
         db_table = 'CargaSemanalPotencial'
         verbose_name = 'Carga Semanal'
         verbose_name_plural = 'Cargas Semanais'
+
+
+# Cópias locais (gerenciadas) das tabelas acima, alimentadas pelo comando
+# sincronizar_snapshot_core. Mesmos nomes de campos, para que os relatórios
+# possam trocar de fonte sem mudar as consultas. As chaves são os ids de
+# origem; as FKs não têm constraint porque a cópia é feita tabela a tabela.
+class SnapshotBase(models.Model):
+    hash_linha = models.CharField(max_length=32, editable=False)
+
+    class Meta:
+        abstract = True
+
+class EquipeSnapshot(SnapshotBase):
+    id_equipe = models.IntegerField(primary_key=True)
+    nome = models.CharField(max_length=200)
+
+    class Meta:
+        db_table = 'core_snapshot_equipe'
+
+    def __str__(self): return self.nome
+
+class ConsultorSnapshot(SnapshotBase):
+    id_consultor = models.IntegerField(primary_key=True)
+    nome = models.CharField(max_length=200)
+    id_equipe = models.ForeignKey(EquipeSnapshot, models.DO_NOTHING, null=True, blank=True, db_constraint=False)
+
+    class Meta:
+        db_table = 'core_snapshot_consultor'
+
+    def __str__(self): return self.nome
+
+class ProjetoSnapshot(SnapshotBase):
+    id_projeto = models.IntegerField(primary_key=True)
+    nome = models.CharField(max_length=200)
+
+    class Meta:
+        db_table = 'core_snapshot_projeto'
+
+    def __str__(self): return self.nome
+
+class CapacidadeSemanalSnapshot(SnapshotBase):
+    id_capacidade = models.IntegerField(primary_key=True)
+    id_consultor = models.ForeignKey(ConsultorSnapshot, models.DO_NOTHING, db_constraint=False)
+    data_inicio_semana = models.DateField(db_index=True)
+    dias_disponiveis = models.DecimalField(max_digits=5, decimal_places=2)
+
+    class Meta:
+        db_table = 'core_snapshot_capacidade_semanal'
+
+class CargaSemanalPotencialSnapshot(SnapshotBase):
+    id_carga = models.IntegerField(primary_key=True)
+    id_consultor = models.ForeignKey(ConsultorSnapshot, models.DO_NOTHING, db_constraint=False)
+    id_projeto = models.ForeignKey(ProjetoSnapshot, models.DO_NOTHING, db_constraint=False)
+    data_inicio_semana = models.DateField(db_index=True)
+    tipo = models.CharField(max_length=20, default='Real')
+    dias = models.DecimalField(max_digits=5, decimal_places=0)
+
+    class Meta:
+        db_table = 'core_snapshot_carga_semanal_potencial'
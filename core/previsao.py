@@ -0,0 +1,157 @@
+"""
+Previsão de saturação das équipes (capacidade x carga nos próximos meses).
+
+Capacidade e carga são carregadas como matrizes densas consultor x semana
+(duas consultas agregadas). Semanas futuras sem capacidade cadastrada usam a
+última capacidade conhecida do consultor. Sobre essas matrizes calculamos,
+por consultor e por équipe: folga (capacidade - carga), utilização semanal e
+utilização móvel numa janela de N semanas (somas acumuladas, O(semanas)).
+
+O resultado é memoizado pela versão dos dados de capacidade, como a matriz
+de utilização: alterações feitas por aqui (sinais) e sincronizações do
+snapshot a incrementam. Gravações do outro sistema aparecem quando a
+entrada expira (mesmo TTL da matriz).
+"""
+import datetime
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from .capacidade import CACHE_SEGUNDOS, SEM_EQUIPE, inicio_da_semana, semanas_do_periodo, totais_por_consultor_semana
+from .db_router import leitura_replica
+from .services import versao_dados_capacidade
+from .snapshot import modelos_relatorio
+
+JANELA_PADRAO = 4
+# Semanas de histórico lidas para estimar a capacidade futura
+SEMANAS_HISTORICO = 8
+LIMITE_SATURACAO = 1.0
+
+
+def _matriz(totais, consultores, semanas):
+    return [[float(totais.get((c.pk, s), 0)) for s in semanas] for c in consultores]
+
+
+def _preencher_capacidade(linha, conhecidas):
+    """Repete a última capacidade conhecida nas semanas sem cadastro."""
+    ultima = 0.0
+    estimadas = []
+    for j, valor in enumerate(linha):
+        if conhecidas[j]:
+            ultima = valor
+            estimadas.append(False)
+        else:
+            linha[j] = ultima
+            estimadas.append(bool(ultima))
+    return estimadas
+
+
+def _movel(numerador, denominador, janela):
+    """Razão das somas móveis de duas séries (soma acumulada)."""
+    resultado = []
+    acum_n = acum_d = 0.0
+    for j, (n, d) in enumerate(zip(numerador, denominador)):
+        acum_n += n
+        acum_d += d
+        if j >= janela:
+            acum_n -= numerador[j - janela]
+            acum_d -= denominador[j - janela]
+        resultado.append(round(acum_n / acum_d, 4) if acum_d > 0 else None)
+    return resultado
+
+
+def _serie(capacidade, carga, janela):
+    utilizacao = [round(c / k, 4) if k > 0 else None for c, k in zip(carga, capacidade)]
+    movel = _movel(carga, capacidade, janela)
+    saturadas = [j for j, u in enumerate(movel) if u is not None and u > LIMITE_SATURACAO]
+    return {
+        'capacidade': capacidade,
+        'carga': carga,
+        'folga': [round(k - c, 2) for k, c in zip(capacidade, carga)],
+        'utilizacao': utilizacao,
+        'utilizacao_movel': movel,
+        'semanas_saturadas': len(saturadas),
+        'primeira_saturacao': saturadas[0] if saturadas else None,
+    }
+
+
+def _somar_colunas(linhas):
+    return [sum(coluna) for coluna in zip(*linhas)] if linhas else []
+
+
+def prever_saturacao(inicio, fim, equipe_id=None, janela=JANELA_PADRAO):
+    """
+    Retorna {'semanas', 'janela', 'equipes': [{'nome', ...série...,
+    'consultores': [{'consultor', 'estimadas', ...série...}]}]}.
+    Os índices em 'primeira_saturacao' apontam para 'semanas'.
+    """
+    inicio = inicio_da_semana(inicio)
+    modelo_capacidade, modelo_carga, modelo_consultor = modelos_relatorio()
+    chave = f'core:previsao:{versao_dados_capacidade()}:{equipe_id or "todas"}:{inicio}:{fim}:{janela}'
+    resultado = cache.get(chave)
+    if resultado is not None:
+        return resultado
+
+    historico = inicio - datetime.timedelta(weeks=SEMANAS_HISTORICO)
+    semanas = semanas_do_periodo(historico, fim)
+    corte = SEMANAS_HISTORICO
+
+    with leitura_replica():
+        capacidades = totais_por_consultor_semana(modelo_capacidade, 'dias_disponiveis', historico, fim, equipe_id)
+        cargas = totais_por_consultor_semana(modelo_carga, 'dias', inicio, fim, equipe_id)
+        consultores = modelo_consultor.objects.select_related('id_equipe').order_by('id_equipe__nome', 'nome')
+        if equipe_id:
+            consultores = consultores.filter(id_equipe=equipe_id)
+        consultores = list(consultores)
+
+    cap = _matriz(capacidades, consultores, semanas)
+    carga = _matriz(cargas, consultores, semanas)
+
+    equipes = OrderedDict()
+    for i, consultor in enumerate(consultores):
+        conhecidas = [(consultor.pk, s) in capacidades for s in semanas]
+        estimadas = _preencher_capacidade(cap[i], conhecidas)
+        linha_cap, linha_carga = cap[i][corte:], carga[i][corte:]
+        nome_equipe = consultor.id_equipe.nome if consultor.id_equipe else SEM_EQUIPE
+        equipes.setdefault(nome_equipe, []).append({
+            'consultor': consultor.nome,
+            'id_consultor': consultor.pk,
+            'estimadas': estimadas[corte:],
+            **_serie(linha_cap, linha_carga, janela),
+        })
+
+    resultado = {
+        'semanas': semanas[corte:],
+        'janela': janela,
+        'equipes': [
+            {
+                'nome': nome,
+                'consultores': linhas,
+                **_serie(
+                    _somar_colunas([linha['capacidade'] for linha in linhas]),
+                    _somar_colunas([linha['carga'] for linha in linhas]),
+                    janela,
+                ),
+            }
+            for nome, linhas in equipes.items()
+        ],
+    }
+    cache.set(chave, resultado, timeout=CACHE_SEGUNDOS)
+    return resultado
+
+
+def celulas_exibicao(serie):
+    """Células (texto, classe, dica) da utilização móvel para a tela do admin."""
+    celulas = []
+    for movel, folga, estimada in zip(serie['utilizacao_movel'], serie['folga'],
+                                      serie.get('estimadas') or [False] * len(serie['folga'])):
+        if movel is None:
+            celulas.append({'texto': '', 'classe': 'vazio', 'dica': ''})
+            continue
+        classe = 'sobrecarga' if movel > LIMITE_SATURACAO else 'cheio' if movel >= 0.9 else ''
+        celulas.append({
+            'texto': f'{movel:.0%}',
+            'classe': f'{classe} estimada' if estimada else classe,
+            'dica': f'folga {folga:g} dia(s)' + (' - capacidade estimada' if estimada else ''),
+        })
+    return celulas
@@ -0,0 +1,79 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+
+
+CHAVE_VERSAO_CAPACIDADE = "core:capacidade:versao"
+
+
+def somente_digitos(valor) -> str:
+    return "".join(ch for ch in (valor or "") if ch.isdigit())
+
+
+def chave_cache_cpf(cpf) -> str:
+    # Nunca guardar o CPF em claro na chave do cache (LGPD)
+    digest = salted_hmac("core.aluno_por_cpf", somente_digitos(cpf), algorithm="sha256").hexdigest()
+    return f"aluno-por-cpf:{digest}"
+
+
+def consumir_token(identificador: str):
+    """
+    Limite por identificador (IP): `capacidade` consultas por janela fixa de
+    capacidade / recarga segundos. Contador com cache.add + cache.incr,
+    atômicos no Redis e no LocMem (sem ler e regravar o estado).
+    Retorna (permitido, segundos_até_a_próxima_janela).
+    """
+    capacidade = getattr(settings, "CPF_LOOKUP_BUCKET_CAPACITY", 10)
+    recarga_por_segundo = getattr(settings, "CPF_LOOKUP_BUCKET_REFILL_PER_SEC", 0.5)
+    janela = capacidade / recarga_por_segundo
+
+    agora = time.time()
+    numero = int(agora // janela)
+    chave = f"aluno-por-cpf:limite:{identificador}:{numero}"
+    expira_em = math.ceil(janela) + 1
+
+    cache.add(chave, 0, timeout=expira_em)
+    try:
+        usadas = cache.incr(chave)
+    except ValueError:
+        # A chave expirou entre o add e o incr
+        cache.add(chave, 1, timeout=expira_em)
+        usadas = 1
+
+    if usadas > capacidade:
+        return False, (numero + 1) * janela - agora
+    return True, 0
+
+
+def invalidar_cache_cpfs(cpfs) -> None:
+    cache.delete_many([chave_cache_cpf(cpf) for cpf in cpfs])
+
+
+def versao_dados_capacidade() -> int:
+    """
+    Versão dos dados de CapacidadeSemanal/CargaSemanalPotencial, usada como
+    parte das chaves de cache dos relatórios de capacidade.
+    """
+    versao = cache.get(CHAVE_VERSAO_CAPACIDADE)
+    if versao is None:
+        versao = 1
+        cache.add(CHAVE_VERSAO_CAPACIDADE, versao, timeout=None)
+    return versao
+
+
+def incrementar_versao_capacidade() -> None:
+    try:
+        cache.incr(CHAVE_VERSAO_CAPACIDADE)
+    except ValueError:
+        cache.set(CHAVE_VERSAO_CAPACIDADE, 2, timeout=None)
+
+
+def chave_cache_anos(model) -> str:
+    return f"core:anos:{model._meta.label_lower}"
+
+
+def invalidar_cache_anos(model) -> None:
+    cache.delete(chave_cache_anos(model))
@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from certificados.models import Cliente
+
+from .models import CapacidadeSemanal, CargaSemanalPotencial
+from .services import incrementar_versao_capacidade, invalidar_cache_anos, invalidar_cache_cpfs
+
+
+@receiver(post_init, sender=Cliente)
+def guardar_cpf_original(sender, instance, **kwargs):
+    # Se o CPF mudar, a chave do CPF antigo também precisa sair do cache
+    # (__dict__: não carregar o campo se ele foi adiado com only/defer)
+    instance._cpf_original = instance.__dict__.get('cpf')
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+def invalidar_aluno_por_cpf(sender, instance, **kwargs):
+    cpfs = {instance.cpf, getattr(instance, '_cpf_original', None)} - {None}
+    instance._cpf_original = instance.cpf
+    # Após o commit: antes dele uma leitura concorrente recolocaria o dado antigo no cache
+    transaction.on_commit(lambda: invalidar_cache_cpfs(cpfs))
+
+
+# As tabelas do core também são alteradas por outro sistema; o TTL do cache
+# cobre essas escritas, os sinais cobrem as feitas por aqui.
+@receiver(post_save, sender=CargaSemanalPotencial)
+@receiver(post_delete, sender=CargaSemanalPotencial)
+@receiver(post_save, sender=CapacidadeSemanal)
+@receiver(post_delete, sender=CapacidadeSemanal)
+def invalidar_caches_semana(sender, instance, **kwargs):
+    def invalidar():
+        invalidar_cache_anos(sender)
+        incrementar_versao_capacidade()
+
+    transaction.on_commit(invalidar)
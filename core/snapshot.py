@@ -0,0 +1,137 @@
+"""
+Cópia incremental das tabelas do core (gerenciadas por outro sistema) para
+as tabelas *_snapshot locais.
+
+Cada tabela é percorrida em lotes ordenados pela chave (keyset). Para cada
+lote comparamos um hash das colunas com o hash guardado na cópia e só
+gravamos o que mudou: linhas novas (bulk_create), alteradas (bulk_update) e
+ids que sumiram da origem (delete). No modo apenas_novos só lemos ids acima
+da maior chave já copiada (marca d'água), sem detectar alterações.
+
+A origem é lida com leitura_replica e as cópias são gravadas no `default`,
+junto com as tabelas do outro sistema. Com CORE_RELATORIOS_SNAPSHOT os
+relatórios passam a ler as cópias (com os índices locais), mas no mesmo
+banco: a carga só sai do `default` se a origem estiver numa réplica ou em
+outro servidor; caso contrário o ganho é apenas o das cópias indexadas.
+"""
+import hashlib
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+
+from .db_router import leitura_replica
+from .models import (
+    CapacidadeSemanal, CapacidadeSemanalSnapshot, CargaSemanalPotencial, CargaSemanalPotencialSnapshot,
+    Consultor, ConsultorSnapshot, Equipe, EquipeSnapshot, Projeto, ProjetoSnapshot,
+)
+from .services import incrementar_versao_capacidade
+
+TAMANHO_LOTE = 2000
+
+# (origem, cópia) na ordem de sincronização
+TABELAS = [
+    (Equipe, EquipeSnapshot),
+    (Consultor, ConsultorSnapshot),
+    (Projeto, ProjetoSnapshot),
+    (CapacidadeSemanal, CapacidadeSemanalSnapshot),
+    (CargaSemanalPotencial, CargaSemanalPotencialSnapshot),
+]
+
+
+@dataclass
+class ResultadoSincronizacao:
+    tabela: str
+    lidas: int = 0
+    criadas: int = 0
+    atualizadas: int = 0
+    removidas: int = 0
+
+    @property
+    def alterou(self):
+        return bool(self.criadas or self.atualizadas or self.removidas)
+
+
+def usar_snapshot() -> bool:
+    return getattr(settings, 'CORE_RELATORIOS_SNAPSHOT', False)
+
+
+def modelos_relatorio():
+    """(CapacidadeSemanal, CargaSemanalPotencial, Consultor) da fonte configurada para os relatórios."""
+    if usar_snapshot():
+        return CapacidadeSemanalSnapshot, CargaSemanalPotencialSnapshot, ConsultorSnapshot
+    return CapacidadeSemanal, CargaSemanalPotencial, Consultor
+
+
+def _campos(destino):
+    return [f.attname for f in destino._meta.concrete_fields if not f.primary_key and f.name != 'hash_linha']
+
+
+def hash_linha(valores) -> str:
+    return hashlib.blake2b(repr(tuple(valores)).encode(), digest_size=16).hexdigest()
+
+
+def sincronizar_tabela(origem, destino, tamanho_lote=TAMANHO_LOTE, apenas_novos=False):
+    resultado = ResultadoSincronizacao(origem._meta.db_table)
+    campos = _campos(destino)
+
+    ultimo = None
+    if apenas_novos:
+        ultimo = destino.objects.order_by('-pk').values_list('pk', flat=True).first()
+
+    while True:
+        with leitura_replica():
+            linhas = origem.objects.order_by('pk')
+            if ultimo is not None:
+                linhas = linhas.filter(pk__gt=ultimo)
+            linhas = list(linhas.values_list('pk', *campos)[:tamanho_lote])
+
+        copia = destino.objects.order_by()
+        if ultimo is not None:
+            copia = copia.filter(pk__gt=ultimo)
+        if not linhas:
+            # Tudo acima do último id lido sumiu da origem
+            if not apenas_novos:
+                resultado.removidas += copia.delete()[0]
+            break
+
+        fim = linhas[-1][0]
+        hashes = dict(copia.filter(pk__lte=fim).values_list('pk', 'hash_linha'))
+        novas, alteradas = [], []
+        for pk, *valores in linhas:
+            assinatura = hash_linha(valores)
+            atual = hashes.pop(pk, None)
+            if atual == assinatura:
+                continue
+            objeto = destino(pk=pk, hash_linha=assinatura, **dict(zip(campos, valores)))
+            (novas if atual is None else alteradas).append(objeto)
+
+        with transaction.atomic():
+            destino.objects.bulk_create(novas, batch_size=tamanho_lote)
+            destino.objects.bulk_update(alteradas, [*campos, 'hash_linha'], batch_size=tamanho_lote)
+            if hashes and not apenas_novos:
+                # Sobraram ids da cópia que não vieram da origem neste intervalo
+                removidas = list(hashes)
+                for i in range(0, len(removidas), tamanho_lote):
+                    destino.objects.filter(pk__in=removidas[i:i + tamanho_lote]).delete()
+                resultado.removidas += len(removidas)
+
+        resultado.lidas += len(linhas)
+        resultado.criadas += len(novas)
+        resultado.atualizadas += len(alteradas)
+        ultimo = fim
+
+    return resultado
+
+
+def sincronizar_snapshot(tamanho_lote=TAMANHO_LOTE, apenas_novos=False, tabelas=None):
+    """Sincroniza as tabelas (todas, ou os db_table em `tabelas`) e retorna a lista de resultados."""
+    resultados = [
+        sincronizar_tabela(origem, destino, tamanho_lote=tamanho_lote, apenas_novos=apenas_novos)
+        for origem, destino in TABELAS
+        if not tabelas or origem._meta.db_table in tabelas
+    ]
+    if usar_snapshot() and any(r.alterou for r in resultados):
+        # Relatórios lidos da cópia: descarta os caches calculados sobre a versão anterior
+        incrementar_versao_capacidade()
+    return resultados
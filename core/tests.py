@@ -0,0 +1,397 @@
+import datetime
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser, Group
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from certificados import models as certificados
+from . import models
+from .admin import intervalo_semana_iso
+from .capacidade import SEM_EQUIPE, ler_alteracoes, matriz_utilizacao
+from .middleware import InstrumentacaoMiddleware
+from .previsao import prever_saturacao
+from .services import consumir_token, versao_dados_capacidade
+from .snapshot import sincronizar_snapshot, sincronizar_tabela
+
+# Tabelas do outro sistema (managed = False): o banco de teste não as cria
+MODELOS_EXTERNOS = (models.Equipe, models.Consultor, models.Projeto, models.CapacidadeSemanal,
+                    models.CargaSemanalPotencial)
+
+
+class TabelasExternasMixin:
+    """Torna os modelos externos gerenciados e cria as tabelas deles no banco de teste."""
+
+    @classmethod
+    def setUpClass(cls):
+        for modelo in MODELOS_EXTERNOS:
+            modelo._meta.managed = True
+        with connection.schema_editor() as editor:
+            for modelo in MODELOS_EXTERNOS:
+                editor.create_model(modelo)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            for modelo in reversed(MODELOS_EXTERNOS):
+                editor.delete_model(modelo)
+        for modelo in MODELOS_EXTERNOS:
+            modelo._meta.managed = False
+
+
+class IntervaloSemanaIsoTests(TestCase):
+
+    def test_semana_53_atravessa_o_ano(self):
+        filtro = intervalo_semana_iso(2020, 53)
+        self.assertEqual(dict(filtro.children), {
+            'data_inicio_semana__gte': datetime.date(2020, 12, 28),
+            'data_inicio_semana__lt': datetime.date(2021, 1, 4),
+        })
+
+    def test_semana_1_comeca_no_ano_anterior(self):
+        filtro = intervalo_semana_iso(2025, 1)
+        self.assertEqual(dict(filtro.children)['data_inicio_semana__gte'], datetime.date(2024, 12, 30))
+
+    def test_semana_inexistente(self):
+        self.assertIsNone(intervalo_semana_iso(2021, 53))
+        self.assertIsNone(intervalo_semana_iso(2024, 54))
+
+
+class IsoWeekListFilterTests(TabelasExternasMixin, TestCase):
+    DATAS = (
+        datetime.date(2020, 12, 28),  # segunda-feira da 2020-W53
+        datetime.date(2021, 1, 3),    # domingo, ainda 2020-W53
+        datetime.date(2021, 1, 4),    # 2021-W01
+        datetime.date(2024, 12, 23),  # 2024-W52
+        datetime.date(2024, 12, 30),  # 2025-W01
+        datetime.date(2026, 12, 28),  # 2026-W53
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_superuser('admin', '', 'senha')
+        consultor = models.Consultor.objects.create(nome='Consultor')
+        projeto = models.Projeto.objects.create(nome='Projeto')
+        models.CargaSemanalPotencial.objects.bulk_create([
+            models.CargaSemanalPotencial(id_consultor=consultor, id_projeto=projeto, data_inicio_semana=data, dias=1)
+            for data in cls.DATAS
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def datas_filtradas(self, **params):
+        response = self.client.get(reverse('admin:core_cargasemanalpotencial_changelist'), params)
+        self.assertEqual(response.status_code, 200)
+        return {carga.data_inicio_semana for carga in response.context['cl'].queryset}
+
+    def test_matriz_semanas(self):
+        d = datetime.date
+        casos = [
+            ({'annee': 2020, 'semaine': 53}, {d(2020, 12, 28), d(2021, 1, 3)}),
+            ({'annee': 2021, 'semaine': 1}, {d(2021, 1, 4)}),
+            ({'annee': 2021, 'semaine': 53}, set()),
+            ({'annee': 2024, 'semaine': 52}, {d(2024, 12, 23)}),
+            ({'annee': 2024, 'semaine': 1}, set()),
+            ({'annee': 2025, 'semaine': 1}, {d(2024, 12, 30)}),
+            ({'annee': 2026, 'semaine': 53}, {d(2026, 12, 28)}),
+            # sem ano: todas as semanas com o número, em qualquer ano ISO
+            ({'semaine': 53}, {d(2020, 12, 28), d(2021, 1, 3), d(2026, 12, 28)}),
+            ({'semaine': 1}, {d(2021, 1, 4), d(2024, 12, 30)}),
+            # só o ano: ano civil
+            ({'annee': 2024}, {d(2024, 12, 23), d(2024, 12, 30)}),
+            ({'annee': 2021}, {d(2021, 1, 3), d(2021, 1, 4)}),
+        ]
+        for params, esperado in casos:
+            with self.subTest(**params):
+                self.assertEqual(self.datas_filtradas(**params), esperado)
+
+    def test_mes_sem_ano_inclui_ano_novo(self):
+        # Os anos em cache não podem esconder um ano gravado depois pelo outro sistema
+        self.datas_filtradas(mois=1)
+        carga = models.CargaSemanalPotencial.objects.first()
+        models.CargaSemanalPotencial.objects.create(
+            id_consultor_id=carga.id_consultor_id, id_projeto_id=carga.id_projeto_id,
+            data_inicio_semana=datetime.date(2031, 1, 6), dias=1,
+        )
+        self.assertEqual(self.datas_filtradas(mois=1), {datetime.date(2021, 1, 3), datetime.date(2021, 1, 4),
+                                                        datetime.date(2031, 1, 6)})
+
+
+class LerAlteracoesTests(TestCase):
+    SEMANA = datetime.date(2024, 1, 1)
+
+    def test_valores_validos(self):
+        self.assertEqual(ler_alteracoes('{"1|2024-01-01": "2", "2|2024-01-01": null}', {1, 2}, {self.SEMANA}),
+                         {(1, self.SEMANA): 2, (2, self.SEMANA): 0})
+        self.assertEqual(ler_alteracoes('{"1|2024-01-01": 3, "2|2024-01-01": " 07 "}', {1, 2}, {self.SEMANA}),
+                         {(1, self.SEMANA): 3, (2, self.SEMANA): 7})
+        self.assertEqual(ler_alteracoes('{"1|2024-01-01": ""}', {1}, {self.SEMANA}), {(1, self.SEMANA): 0})
+
+    def test_valores_invalidos_levantam_value_error(self):
+        for texto in ('{"1|2024-01-01": [1]}', '{"1|2024-01-01": {"dias": 1}}', '{"x|2024-01-01": 1}',
+                      '{"1|2024-13-01": 1}', '{"1|2024-01-01": -1}', '{"3|2024-01-01": 1}', '[]',
+                      # Frações eram truncadas e booleanos viravam 0/1
+                      '{"1|2024-01-01": 2.5}', '{"1|2024-01-01": 2.0}', '{"1|2024-01-01": "2.5"}',
+                      '{"1|2024-01-01": true}', '{"1|2024-01-01": false}', '{"1|2024-01-01": "-1"}',
+                      '{"1|2024-01-01": "1e3"}', '{"1|2024-01-01": "²"}', '{"1|2024-01-01": 100000}'):
+            with self.subTest(texto=texto), self.assertRaises(ValueError):
+                ler_alteracoes(texto, {1, 2}, {self.SEMANA})
+
+
+class MatrizUtilizacaoTests(TabelasExternasMixin, TestCase):
+    SEMANA = datetime.date(2030, 1, 7)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.equipe = models.Equipe.objects.create(nome='Alfa')
+        cls.ana = models.Consultor.objects.create(nome='Ana', id_equipe=cls.equipe)
+        cls.bruno = models.Consultor.objects.create(nome='Bruno', id_equipe=cls.equipe)
+        sem_equipe = models.Consultor.objects.create(nome='Carla')
+        projeto = models.Projeto.objects.create(nome='Projeto')
+        proxima = cls.SEMANA + datetime.timedelta(weeks=1)
+        for consultor, semana, dias in ((cls.ana, cls.SEMANA, 5), (cls.ana, proxima, 4), (cls.bruno, cls.SEMANA, 5),
+                                        (sem_equipe, proxima, 2)):
+            models.CapacidadeSemanal.objects.create(id_consultor=consultor, data_inicio_semana=semana,
+                                                    dias_disponiveis=dias)
+        # Duas cargas na mesma semana (uma gravada numa quarta-feira) somam na segunda
+        for consultor, semana, dias in ((cls.ana, cls.SEMANA, 3), (cls.ana, cls.SEMANA + datetime.timedelta(days=2), 3),
+                                        (cls.bruno, proxima, 1), (sem_equipe, proxima, 2)):
+            models.CargaSemanalPotencial.objects.create(id_consultor=consultor, id_projeto=projeto,
+                                                        data_inicio_semana=semana, dias=dias)
+
+    def setUp(self):
+        cache.clear()
+
+    def textos(self, celulas):
+        return [(celula['texto'], celula['classe']) for celula in celulas]
+
+    def test_pivo_por_equipe_e_semana(self):
+        # Início numa quinta-feira: a matriz começa na segunda da mesma semana
+        matriz = matriz_utilizacao(self.SEMANA + datetime.timedelta(days=3), self.SEMANA + datetime.timedelta(weeks=1))
+        self.assertEqual(matriz['semanas'], [self.SEMANA, self.SEMANA + datetime.timedelta(weeks=1)])
+        # Consultores sem équipe (NULL) vêm antes ou depois conforme o banco
+        equipes = {equipe['nome']: equipe for equipe in matriz['equipes']}
+        self.assertEqual(sorted(equipes), ['Alfa', SEM_EQUIPE])
+
+        alfa, sem_equipe = equipes['Alfa'], equipes[SEM_EQUIPE]
+        ana, bruno = alfa['consultores']
+        self.assertEqual((ana['consultor'], bruno['consultor']), ('Ana', 'Bruno'))
+        self.assertEqual(self.textos(ana['celulas']), [('6/5', 'sobrecarga'), ('0/4', '')])
+        self.assertEqual((ana['sobrecargas'], bruno['sobrecargas']), (1, 1))
+        self.assertEqual(self.textos(bruno['celulas']), [('0/5', ''), ('1/0', 'sobrecarga')])
+        self.assertEqual(self.textos(alfa['celulas']), [('6/10', ''), ('1/4', '')])
+        self.assertEqual(alfa['celulas'][0]['utilizacao'], 0.6)
+        self.assertEqual(self.textos(sem_equipe['consultores'][0]['celulas']), [('', 'vazio'), ('2/2', 'cheio')])
+
+        so_alfa = matriz_utilizacao(self.SEMANA, self.SEMANA, equipe_id=self.equipe.pk)
+        self.assertEqual([equipe['nome'] for equipe in so_alfa['equipes']], ['Alfa'])
+        self.assertEqual(self.textos(so_alfa['equipes'][0]['celulas']), [('6/10', '')])
+
+
+class PrevisaoCacheTests(TabelasExternasMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.consultor = models.Consultor.objects.create(nome='Consultor')
+        cls.projeto = models.Projeto.objects.create(nome='Projeto')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_alteracao_invalida_o_cache_apos_o_commit(self):
+        semana = datetime.date(2030, 1, 7)
+        with self.captureOnCommitCallbacks(execute=True):
+            models.CapacidadeSemanal.objects.create(id_consultor=self.consultor, data_inicio_semana=semana,
+                                                    dias_disponiveis=5)
+        antes = prever_saturacao(semana, semana)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            models.CargaSemanalPotencial.objects.create(
+                id_consultor=self.consultor, id_projeto=self.projeto, data_inicio_semana=semana, dias=3)
+        # Até o commit vale o cache, sem nenhuma consulta às tabelas
+        with self.assertNumQueries(0):
+            self.assertEqual(prever_saturacao(semana, semana), antes)
+        for callback in callbacks:
+            callback()
+
+        depois = prever_saturacao(semana, semana)
+        self.assertEqual(antes['equipes'][0]['carga'], [0.0])
+        self.assertEqual(depois['equipes'][0]['carga'], [3.0])
+
+
+class AdminConsultasTests(TabelasExternasMixin, TestCase):
+    """Cada changelist do admin faz o mesmo número de consultas com 1 ou 100 linhas por página."""
+    LINHAS = 100
+    LIMITE = 15
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_superuser('admin', '', 'senha')
+        data = datetime.date(2025, 1, 6)
+        for i in range(cls.LINHAS):
+            get_user_model().objects.create_user(f'usuario{i}')
+            Group.objects.create(name=f'grupo{i}')
+
+            equipe = models.Equipe.objects.create(nome=f'Equipe {i}')
+            consultor = models.Consultor.objects.create(nome=f'Consultor {i}', id_equipe=equipe)
+            projeto = models.Projeto.objects.create(nome=f'Projeto {i}')
+            models.CargaSemanalPotencial.objects.create(id_consultor=consultor, id_projeto=projeto,
+                                                        data_inicio_semana=data, dias=1)
+
+            modelo = certificados.ModeloCertificado.objects.create(nome=f'Modelo {i}')
+            curso = certificados.Curso.objects.create(nome=f'Curso {i}', modelo_certificado=modelo)
+            instrutor = certificados.Instrutor.objects.create(nome=f'Instrutor {i}')
+            agendamento = certificados.CursoAgendamento.objects.create(curso=curso, instrutor=instrutor, data=data)
+            cliente = certificados.Cliente.objects.create(
+                cpf=f'{i:011d}', nome=f'Aluno {i}', email=f'aluno{i}@example.com',
+                data_nascimento=datetime.date(1990, 1, 1), empresa='Empresa')
+            certificado = certificados.Certificado.objects.create(cliente=cliente, curso=curso,
+                                                                  agendamento=agendamento)
+            certificados.EnvioCertificado.objects.create(certificado=certificado, chave_idempotencia=f'envio-{i}')
+
+            questionario = certificados.Questionario.objects.create(titulo=f'Questionário {i}', curso=curso)
+            pergunta = certificados.Pergunta.objects.create(questionario=questionario, numero=1, texto='Pergunta',
+                                                            tipo=certificados.Pergunta.TIPO_ESCALA)
+            opcao = certificados.OpcaoResposta.objects.create(pergunta=pergunta, valor='otimo', rotulo='Ótimo',
+                                                              pontuacao=4)
+            resposta = certificados.RespostaUsuario.objects.create(questionario=questionario, cliente=cliente,
+                                                                   certificado=certificado, agendamento=agendamento)
+            certificados.ItemRespostaUsuario.objects.create(resposta_usuario=resposta, pergunta=pergunta,
+                                                            opcao_resposta=opcao)
+
+    def contar_consultas(self, model_admin, por_pagina):
+        """(consultas, linhas exibidas) de uma renderização da changelist."""
+        request = RequestFactory().get('/')
+        request.user = self.usuario
+        original = model_admin.list_per_page
+        model_admin.list_per_page = por_pagina
+        # Os filtros guardam os anos no cache: as duas medições partem do cache vazio
+        cache.clear()
+        try:
+            with CaptureQueriesContext(connection) as consultas:
+                response = model_admin.changelist_view(request)
+                response.render()
+        finally:
+            model_admin.list_per_page = original
+        return len(consultas), len(response.context_data['cl'].result_list)
+
+    def test_changelists_sem_n_mais_1(self):
+        for model, model_admin in sorted(admin.site._registry.items(), key=lambda item: item[0]._meta.label):
+            with self.subTest(model._meta.label):
+                base, _ = self.contar_consultas(model_admin, 1)
+                consultas, linhas = self.contar_consultas(model_admin, self.LINHAS)
+                self.assertGreaterEqual(linhas, self.LINHAS)
+                self.assertEqual(consultas, base)
+                self.assertLessEqual(consultas, self.LIMITE)
+
+
+class AlunoPorCpfTests(TestCase):
+    CPF = '52998224725'
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(CPF_LOOKUP_BUCKET_CAPACITY=3, CPF_LOOKUP_BUCKET_REFILL_PER_SEC=1)
+    def test_limite_por_ip(self):
+        # Janela de 3 s: 1000 está na janela [999, 1002)
+        with mock.patch('core.services.time.time', return_value=1000.0):
+            resultados = [consumir_token('10.0.0.1') for _ in range(4)]
+            self.assertTrue(consumir_token('10.0.0.2')[0])
+        self.assertEqual(resultados, [(True, 0)] * 3 + [(False, 2.0)])
+        with mock.patch('core.services.time.time', return_value=1002.0):
+            self.assertTrue(consumir_token('10.0.0.1')[0])
+
+    def test_cache_invalidado_apos_o_commit(self):
+        url = reverse('aluno_por_cpf')
+        self.assertEqual(self.client.get(url, {'cpf': self.CPF}).status_code, 404)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            cliente = certificados.Cliente.objects.create(
+                cpf='529.982.247-25', nome='Ana', email='ana@example.com',
+                data_nascimento=datetime.date(1990, 1, 1), empresa='Empresa')
+        # Antes do commit o "não encontrado" continua no cache
+        self.assertEqual(self.client.get(url, {'cpf': self.CPF}).status_code, 404)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(url, {'cpf': self.CPF}).json()['nome'], 'Ana')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cliente.cpf = '111.444.777-35'
+            cliente.save()
+        self.assertEqual(self.client.get(url, {'cpf': self.CPF}).status_code, 404)
+
+
+@override_settings(INSTRUMENTACAO_ATIVA=True, DEBUG=False)
+class InstrumentacaoMiddlewareTests(TestCase):
+    def _resposta(self, usuario):
+        request = RequestFactory().get('/')
+        request.user = usuario
+        with self.assertLogs('core.instrumentacao', 'INFO'):
+            return InstrumentacaoMiddleware(lambda request: HttpResponse('ok'))(request)
+
+    def test_server_timing_so_para_staff(self):
+        self.assertNotIn('Server-Timing', self._resposta(AnonymousUser()))
+        usuario = get_user_model()(username='aluno')
+        self.assertNotIn('Server-Timing', self._resposta(usuario))
+        usuario.is_staff = True
+        self.assertIn('db;dur=', self._resposta(usuario)['Server-Timing'])
+
+    @override_settings(DEBUG=True)
+    def test_server_timing_com_debug(self):
+        self.assertIn('Server-Timing', self._resposta(AnonymousUser()))
+
+
+class SnapshotTests(TabelasExternasMixin, TestCase):
+
+    def setUp(self):
+        self.equipes = [models.Equipe.objects.create(nome=f'Equipe {i}') for i in range(5)]
+
+    def copia(self):
+        return list(models.EquipeSnapshot.objects.order_by('pk').values_list('pk', 'nome'))
+
+    def origem(self):
+        return list(models.Equipe.objects.order_by('pk').values_list('pk', 'nome'))
+
+    def sincronizar(self, **kwargs):
+        resultado = sincronizar_tabela(models.Equipe, models.EquipeSnapshot, tamanho_lote=2, **kwargs)
+        return resultado.lidas, resultado.criadas, resultado.atualizadas, resultado.removidas
+
+    def test_sincroniza_em_lotes_so_o_que_mudou(self):
+        self.assertEqual(self.sincronizar(), (5, 5, 0, 0))
+        self.assertEqual(self.copia(), self.origem())
+        self.assertEqual(self.sincronizar(), (5, 0, 0, 0))
+
+        models.Equipe.objects.filter(pk=self.equipes[1].pk).update(nome='Renomeada')
+        # Uma no meio de um lote e a última (some depois do último id lido)
+        models.Equipe.objects.filter(pk__in=[self.equipes[2].pk, self.equipes[4].pk]).delete()
+        self.assertEqual(self.sincronizar(), (3, 0, 1, 2))
+        self.assertEqual(self.copia(), self.origem())
+
+    def test_apenas_novos(self):
+        self.sincronizar()
+        models.Equipe.objects.filter(pk=self.equipes[0].pk).update(nome='Renomeada')
+        models.Equipe.objects.filter(pk=self.equipes[1].pk).delete()
+        nova = models.Equipe.objects.create(nome='Nova')
+        self.assertEqual(self.sincronizar(apenas_novos=True), (1, 1, 0, 0))
+        self.assertEqual(self.copia()[:2], [(self.equipes[0].pk, 'Equipe 0'), (self.equipes[1].pk, 'Equipe 1')])
+        self.assertEqual(self.copia()[-1], (nova.pk, 'Nova'))
+
+    @override_settings(CORE_RELATORIOS_SNAPSHOT=True)
+    def test_versao_muda_so_quando_a_copia_muda(self):
+        cache.clear()
+        versao = versao_dados_capacidade()
+        sincronizar_snapshot(tabelas=['Equipe'])
+        self.assertGreater(versao_dados_capacidade(), versao)
+        versao = versao_dados_capacidade()
+        sincronizar_snapshot(tabelas=['Equipe'])
+        self.assertEqual(versao_dados_capacidade(), versao)
@@ -1,24 +1,79 @@
-from django.http import JsonResponse, HttpResponseBadRequest
-from django.views.decorators.http import require_GET
+import math
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.views.decorators.http import require_GET, require_http_methods
 from django.views.decorators.cache import never_cache
 
 from certificados.models import Cliente
 
+from .db_router import leitura_replica
+from .instrumentacao import registro
+from .services import chave_cache_cpf, consumir_token, somente_digitos
+
+
+def _ip_cliente(request):
+    # Atrás do nginx (proxy_add_x_forwarded_for) o último IP é o confiável
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    if forwarded:
+        return forwarded.split(",")[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
 @require_GET
 @never_cache
 def aluno_por_cpf(request):
-    cpf = (request.GET.get("cpf") or "").strip()
-    cpf_digits = "".join(ch for ch in cpf if ch.isdigit())
+    permitido, espera = consumir_token(_ip_cliente(request))
+    if not permitido:
+        response = JsonResponse({"detail": "too many requests"}, status=429)
+        response["Retry-After"] = str(math.ceil(espera))
+        return response
 
-    aluno = Cliente.objects.filter(cpf=cpf_digits).first()
-    if not aluno:
+    cpf_digits = somente_digitos((request.GET.get("cpf") or "").strip())
+    if len(cpf_digits) != 11:
+        return HttpResponseBadRequest("CPF inválido")
+
+    chave = chave_cache_cpf(cpf_digits)
+    dados = cache.get(chave)
+
+    if dados is None:
+        # Só o SELECT vai para a réplica; limite e cache ficam fora do roteamento
+        with leitura_replica():
+            aluno = Cliente.objects.filter(cpf_digitos=cpf_digits).first()
+        # Cache também do "não encontrado"; o save do Cliente invalida a chave
+        dados = {}
+        if aluno:
+            # ⚠️ LGPD: renvoyer uniquement ce qui est nécessaire au pré-remplissage
+            dados = {
+                "nome": aluno.nome,
+                "email": aluno.email,
+                "telefone": aluno.telefone,
+                "data_nascimento": aluno.data_nascimento.strftime("%Y-%m-%d") if aluno.data_nascimento else "",
+                "endereco": aluno.endereco,
+            }
+        cache.set(chave, dados, timeout=getattr(settings, "CPF_LOOKUP_CACHE_SECONDS", 60))
+
+    if not dados:
         return JsonResponse({"detail": "not found"}, status=404)
+    return JsonResponse(dados)
+
 
-    # ⚠️ LGPD: renvoyer uniquement ce qui est nécessaire au pré-remplissage
-    return JsonResponse({
-        "nome": aluno.nome,
-        "email": aluno.email,
-        "telefone": aluno.telefone,
-        "data_nascimento": aluno.data_nascimento.strftime("%Y-%m-%d") if aluno.data_nascimento else "",
-        "endereco": aluno.endereco,
-    })
+@staff_member_required
+@require_http_methods(["GET", "POST"])
+def metricas_requisicoes(request):
+    """Percentis por endpoint coletados pelo InstrumentacaoMiddleware (neste processo)."""
+    if request.method == "POST":
+        registro.limpar()
+        return HttpResponseRedirect(request.path)
+    context = {
+        **admin.site.each_context(request),
+        "title": "Métricas das requisições",
+        "ativa": getattr(settings, "INSTRUMENTACAO_ATIVA", False),
+        "linhas": registro.resumo(),
+        "janela": registro.tamanho_janela,
+    }
+    return TemplateResponse(request, "admin/core/metricas.html", context)
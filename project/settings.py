@@ -27,7 +27,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.InstrumentacaoMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaStickyMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,6 +81,73 @@ DATABASES = {
     }
 }
 
+# Réplica de leitura opcional (dashboards, exportações, API de CPF)
+if env('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': env('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': env('DB_REPLICA_HOST'),
+        'PORT': env('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+# Segundos em que o navegador lê do primário após uma escrita
+REPLICA_STICKY_SECONDS = int(env('DB_REPLICA_STICKY_SECONDS', '15'))
+
+# Cache: Redis (REDIS_URL) é compartilhado entre os workers do gunicorn.
+# Sem ele, LocMem em cada worker, com duas concessões:
+# - o limite da API de CPF vale por worker (capacidade x nº de workers);
+# - a invalidação por sinal (CPF, capacidade) só limpa o worker que gravou e
+#   os outros servem o dado antigo até o TTL (CPF_LOOKUP_CACHE_SECONDS; 300 s
+#   nos relatórios de capacidade).
+# Não use DatabaseCache: cada consulta à API de CPF faria várias idas ao banco
+# em vez do único SELECT que o cache evita.
+if env('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': env('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Autocomplete de alunos no admin: também nomes/e-mails que contêm o termo
+# (varredura da tabela; desligado), a partir de N caracteres
+CERTIFICADOS_AUTOCOMPLETE_CONTEM = env('CERTIFICADOS_AUTOCOMPLETE_CONTEM', '0').lower() in ('1', 'true', 'yes', 'on')
+CERTIFICADOS_AUTOCOMPLETE_CONTEM_MINIMO = int(env('CERTIFICADOS_AUTOCOMPLETE_CONTEM_MINIMO', '4'))
+
+# API de auto-preenchimento por CPF (cache + limite por IP: CAPACITY consultas
+# a cada CAPACITY / REFILL_PER_SEC segundos)
+CPF_LOOKUP_CACHE_SECONDS = int(env('CPF_LOOKUP_CACHE_SECONDS', '60'))
+CPF_LOOKUP_BUCKET_CAPACITY = int(env('CPF_LOOKUP_BUCKET_CAPACITY', '10'))
+CPF_LOOKUP_BUCKET_REFILL_PER_SEC = float(env('CPF_LOOKUP_BUCKET_REFILL_PER_SEC', '0.5'))
+
+# Consultas/tempo por requisição: Server-Timing, log JSON e /admin/metricas/
+INSTRUMENTACAO_ATIVA = env('INSTRUMENTACAO_ATIVA', '0').lower() in ('1', 'true', 'yes', 'on')
+INSTRUMENTACAO_AMOSTRAS = int(env('INSTRUMENTACAO_AMOSTRAS', '1000'))
+# Spans (PDF, token, envio) também como OpenTelemetry, se o pacote estiver instalado
+INSTRUMENTACAO_OTEL = env('INSTRUMENTACAO_OTEL', '0').lower() in ('1', 'true', 'yes', 'on')
+
+# Logs JSON da instrumentação e erros de envio de certificados no console
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {
+        'core.instrumentacao': {'handlers': ['console'], 'level': env('INSTRUMENTACAO_LOG_LEVEL', 'INFO')},
+        'certificados': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
+
+# Relatórios de capacidade lidos das cópias locais (manage.py sincronizar_snapshot_core)
+CORE_RELATORIOS_SNAPSHOT = env('CORE_RELATORIOS_SNAPSHOT', '0').lower() in ('1', 'true', 'yes', 'on')
+
 AUTH_PASSWORD_VALIDATORS = []
 
 LANGUAGE_CODE = 'pt-br'
@@ -88,6 +157,11 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# Nomes com hash (cache imutável no nginx) + variantes AVIF/WebP dos fundos de certificado
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'certificados.storage.CertificadoStaticStorage'},
+}
 
 # Media (optional)
 MEDIA_URL = '/media/'
@@ -95,6 +169,17 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Transporte dos certificados (certificados.transportes): graph, smtp (usa os
+# EMAIL_* abaixo, uma conexão por lote), locmem, arquivo ou console
+CERTIFICADOS_TRANSPORTE_EMAIL = env('CERTIFICADOS_TRANSPORTE_EMAIL', 'graph')
+# Segundos após os quais um envio preso em "enviando" (processo morto) pode
+# ser retomado (certificados.envios)
+CERTIFICADOS_ENVIO_EXPIRA = int(env('CERTIFICADOS_ENVIO_EXPIRA', str(15 * 60)))
+# Espera antes de repetir um envio falho: BACKOFF * 2^(tentativas - 1) segundos,
+# até BACKOFF_MAXIMO (ou o Retry-After do provedor, se maior)
+CERTIFICADOS_ENVIO_BACKOFF = int(env('CERTIFICADOS_ENVIO_BACKOFF', '60'))
+CERTIFICADOS_ENVIO_BACKOFF_MAXIMO = int(env('CERTIFICADOS_ENVIO_BACKOFF_MAXIMO', str(6 * 3600)))
+
 # EMAIL (SMTP)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = env('SMTP_HOST', '')
@@ -110,6 +195,21 @@ MS_GRAPH_CLIENT_ID = env('CLIENT', '')
 MS_GRAPH_CLIENT_SECRET = env('SECRET', '')
 
 MS_GRAPH_SENDER = "certificado@leanway.com.br"
+# PDFs maiores que isto (bytes) vão por rascunho + upload session em partes
+MS_GRAPH_LIMITE_ANEXO_INLINE = int(env('MS_GRAPH_LIMITE_ANEXO_INLINE', str(2 * 1024 * 1024)))
+
+# Pool de processos para PDFs em lote no processo web (ZIP do agendamento):
+# 0 = no próprio processo. Cada worker do gunicorn teria o seu pool, então
+# mantenha 0 ou um número pequeno; o comando reenviar_certificados_pendentes
+# usa o próprio pool (--processos)
+CERTIFICADOS_RENDER_PROCESSOS = int(env('CERTIFICADOS_RENDER_PROCESSOS', '0'))
+CERTIFICADOS_RENDER_MINIMO_LOTE = int(env('CERTIFICADOS_RENDER_MINIMO_LOTE', '4'))
+
+# 1 reduz o fundo do PDF a este DPI e o grava em JPEG/Flate (certificados.modelos),
+# com perdas; o padrão mantém a imagem original em Flate + ASCII85
+CERTIFICADOS_PDF_OTIMIZADO = env('CERTIFICADOS_PDF_OTIMIZADO', '0').lower() in ('1','true','yes','on')
+CERTIFICADOS_PDF_DPI = int(env('CERTIFICADOS_PDF_DPI', '150'))
+CERTIFICADOS_PDF_QUALIDADE_JPEG = int(env('CERTIFICADOS_PDF_QUALIDADE_JPEG', '85'))
 
 DEFAULT_FROM_EMAIL = "certificado@leanway.com.br"
 
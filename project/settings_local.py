@@ -24,7 +24,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.InstrumentacaoMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaStickyMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -61,6 +63,22 @@ DATABASES = {
     }
 }
 
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+# Consultas/tempo por requisição: Server-Timing, log JSON e /admin/metricas/.
+# Desligado por padrão para não encher a saída do manage.py test.
+INSTRUMENTACAO_ATIVA = os.environ.get('INSTRUMENTACAO_ATIVA', '0').lower() in ('1', 'true', 'yes', 'on')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {
+        'core.instrumentacao': {'handlers': ['console'], 'level': 'INFO' if INSTRUMENTACAO_ATIVA else 'WARNING'},
+        'certificados': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = []
 
 LANGUAGE_CODE = 'pt-br'
@@ -78,3 +96,5 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # EMAIL (SMTP) - Desabilitado para testes
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# Certificados ficam em memória (mail.outbox) em vez de irem ao Graph
+CERTIFICADOS_TRANSPORTE_EMAIL = 'locmem'
@@ -3,7 +3,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path, include
 
-from core.views import aluno_por_cpf
+from core.views import aluno_por_cpf, metricas_requisicoes
 from certificados.dashboard_admin import dashboard_admin_site
 from certificados.admin import (
     QuestionarioAdmin, PerguntaAdmin, OpcaoRespostaAdmin, 
@@ -19,6 +19,7 @@ dashboard_admin_site.register(RespostaUsuario, RespostaUsuarioAdmin)
 dashboard_admin_site.register(ItemRespostaUsuario, ItemRespostaUsuarioAdmin)
 
 urlpatterns = [
+    path('admin/metricas/', metricas_requisicoes, name='metricas_requisicoes'),
     path('admin/', admin.site.urls),
     path('admin/dashboard/', dashboard_admin_site.urls),
     path('certificados/', include('certificados.urls')),
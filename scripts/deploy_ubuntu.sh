@@ -88,8 +88,17 @@ server {
     ssl_certificate     $SSL_DIR/selfsigned.crt;
     ssl_certificate_key $SSL_DIR/selfsigned.key;
 
+    # Arquivos com hash no nome (ManifestStaticFilesStorage) nunca mudam
+    location ~ ^/static/(.+\.[0-9a-f]{12}\.[^/.]+)\$ {
+        alias $APP_CODE_DIR/staticfiles/\$1;
+        gzip_static on;
+        expires max;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
     location /static/ {
         alias $APP_CODE_DIR/staticfiles/;
+        gzip_static on;
     }
 
     location / {